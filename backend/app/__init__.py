@@ -1,7 +1,18 @@
-from flask import Flask
+from flask import Flask, jsonify
 from flask_cors import CORS
 from .config import Config
-from .db import close_db
+from .db import close_db, connect_inventory_dbs, ensure_schema, run_write, ShardRouter
+from .availability import AvailabilityIndex
+from .checkout import CheckoutQueue
+from .geo import StoreLocator
+from .health import HealthRefresher
+from .images import ImageStore
+from .reorder import ReorderPlanner
+from .reservations import release_expired, ReservationBook
+from .sales import refresh_sales_daily, TopSellerCache
+from .search import AutocompleteIndex, ProductSearchIndex
+from .snapshot import SnapshotRefresher
+from .writer import CommitSignal, WriteCoordinator, WriteQueueFull, WriterPool
 
 def create_app():
     app = Flask(__name__)
@@ -30,4 +41,155 @@ def create_app():
 
     app.teardown_appcontext(close_db)
 
+    ensure_schema(app.config["SQLITE_PATH"])
+
+    router = None
+    if app.config["SHARDING"]:
+        router = ShardRouter(
+            app.config["SQLITE_PATH"],
+            app.config["SHARD_DIR"],
+            group_size=app.config["SHARD_GROUP_SIZE"],
+        )
+        app.extensions["shard_router"] = router
+
+    # Woken after every commit of this process (inventory streams)
+    commit_signal = CommitSignal()
+    app.extensions["commit_signal"] = commit_signal
+
+    def make_writer(shard):
+        path, attach = app.config["SQLITE_PATH"], None
+        if shard is not None:
+            # Read-only, so shard writers do not lock the main file
+            path, attach = router.ensure_shard(shard), {"shared": router.shared_uri}
+        return WriteCoordinator(
+            path,
+            max_queue=app.config["WRITE_QUEUE_SIZE"],
+            batch_size=app.config["WRITE_BATCH_SIZE"],
+            wait_timeout=app.config["WRITE_WAIT_TIMEOUT"],
+            journal_mode=app.config["SQLITE_JOURNAL_MODE"],
+            attach=attach,
+            on_commit=commit_signal.notify,
+        )
+
+    writers = WriterPool(make_writer)
+    if app.config["WRITE_COORDINATOR"]:
+        app.extensions["writers"] = writers
+
+    def background_write(fn, shard=None):
+        # run_write for background threads: the writer thread when the
+        # coordinator is on, else inline on this app context's connection
+        with app.app_context():
+            return run_write(fn, shard=shard)
+
+    book = None
+    if app.config["STOCK_RESERVATIONS"]:
+        def sweep_reservations():
+            # Holds live next to Store_Inventory: the main file or every shard
+            rows = []
+            for shard in (router.shards() if router is not None else [None]):
+                rows.extend(background_write(release_expired, shard=shard))
+            return rows
+
+        book = ReservationBook(
+            app.config["RESERVATION_TTL"],
+            app.config["RESERVATION_SWEEP_INTERVAL"],
+            sweep_reservations,
+        )
+        app.extensions["reservation_book"] = book
+
+    if app.config["INVENTORY_HEALTH_INCREMENTAL"]:
+        app.extensions["health_refresher"] = HealthRefresher(
+            background_write,
+            lambda: router.shards() if router is not None else [None],
+            app.config["INVENTORY_LOW_STOCK"],
+            app.config["INVENTORY_OVERSTOCK"],
+            interval=app.config["INVENTORY_HEALTH_REFRESH_INTERVAL"],
+        )
+
+    # The only writer of sales_daily; the reorder planner reads it
+    top_seller_cache = TopSellerCache(
+        lambda shard: background_write(refresh_sales_daily, shard=shard),
+        lambda: router.shards() if router is not None else [None],
+        lambda: connect_inventory_dbs(app.config["SQLITE_PATH"], router),
+        interval=app.config["TOP_SELLERS_REFRESH_INTERVAL"],
+        size=app.config["TOP_SELLERS_CACHE_SIZE"],
+    )
+    # Builds the first rankings in the background; top-sellers uses SQL until then
+    top_seller_cache.start()
+    app.extensions["top_seller_cache"] = top_seller_cache
+    reorder_planner = ReorderPlanner(
+        top_seller_cache,
+        lambda: connect_inventory_dbs(app.config["SQLITE_PATH"], router),
+        days=app.config["REORDER_VELOCITY_DAYS"],
+        interval=app.config["REORDER_REFRESH_INTERVAL"],
+    )
+    # Loads after the first rankings; /api/stats/reorder answers 503 until then
+    reorder_planner.start()
+    app.extensions["reorder_planner"] = reorder_planner
+
+    if app.config["CHECKOUT_MODE"] == "async":
+        app.extensions["checkout_queue"] = CheckoutQueue(
+            writers,
+            ticket_ttl=app.config["CHECKOUT_TICKET_TTL"],
+            on_complete=(lambda result: book.release_order(result["order_id"])) if book else None,
+        )
+
+    # Built now so the first fuzzy search does not pay for it
+    search_index = ProductSearchIndex(
+        app.config["SQLITE_PATH"],
+        check_interval=app.config["SEARCH_INDEX_CHECK_INTERVAL"],
+    )
+    search_index.get()
+    app.extensions["product_search_index"] = search_index
+    app.extensions["autocomplete_index"] = AutocompleteIndex(
+        lambda: connect_inventory_dbs(app.config["SQLITE_PATH"], router),
+        search_index,
+        commit_signal=commit_signal,
+        check_interval=app.config["SEARCH_INDEX_CHECK_INTERVAL"],
+    )
+    app.extensions["availability_index"] = AvailabilityIndex(
+        lambda: connect_inventory_dbs(app.config["SQLITE_PATH"], router),
+        search_index,
+        commit_signal=commit_signal,
+        check_interval=app.config["SEARCH_INDEX_CHECK_INTERVAL"],
+    )
+
+    app.extensions["store_locator"] = StoreLocator(
+        app.config["SQLITE_PATH"],
+        check_interval=app.config["SEARCH_INDEX_CHECK_INTERVAL"],
+    )
+    app.extensions["image_store"] = ImageStore(app.config["IMAGE_CACHE_DIR"])
+
+    if app.config["ANALYTICS_ENGINE"]:
+        # NumPy is only needed with the columnar engine
+        try:
+            from .analytics import AnalyticsEngine
+        except ImportError as e:
+            raise RuntimeError(
+                "ANALYTICS_ENGINE=1 needs NumPy: pip install -r requirements.txt"
+            ) from e
+        engine = AnalyticsEngine(
+            lambda: connect_inventory_dbs(app.config["SQLITE_PATH"], router),
+            app.config["ANALYTICS_DIR"],
+            interval=app.config["ANALYTICS_EXPORT_INTERVAL"],
+        )
+        # Exports in the background; stats use SQL until the first one is done
+        engine.start()
+        app.extensions["analytics_engine"] = engine
+
+    if app.config["READ_SNAPSHOT_PATH"]:
+        app.extensions["snapshot_refresher"] = SnapshotRefresher(
+            app.config["SQLITE_PATH"],
+            app.config["READ_SNAPSHOT_PATH"],
+            interval=app.config["READ_SNAPSHOT_INTERVAL"],
+            pages=app.config["BACKUP_PAGES"],
+            sleep=app.config["BACKUP_SLEEP"],
+        )
+
+    @app.errorhandler(WriteQueueFull)
+    def write_queue_full(e):
+        response = jsonify({"error": str(e)})
+        response.headers["Retry-After"] = "1"
+        return response, 503
+
     return app
@@ -0,0 +1,354 @@
+"""
+Columnar analytics engine (ANALYTICS_ENGINE=1).
+
+Every `interval` seconds the completed orders and their lines are
+streamed from the main file (or every shard) into one .npy file per
+column under directory/gen-<n>/, and the CURRENT file is switched to
+the new generation. Queries memory-map the current generation and
+aggregate with NumPy (bincount over masks) instead of GROUP BY over the
+row tables; answers are as fresh as the last export. Until the first
+generation is there the stats endpoints aggregate in SQL.
+
+Columns:
+  orders: order_id, day, store_id, total_price
+  lines:  order_id, day, store_id, product_id, quantity, unit_price, is_return
+
+day is days since 1970-01-01 of DATE(order_datetime) (NO_DAY if unset);
+store_id and product_id are NO_ID if unset, and those rows are left out
+of per-store and per-product totals. Lines whose is_return is neither 0
+nor 1 are not exported, as the SQL stats count them as neither sold nor
+returned.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no export lock, pruning's age limit still applies
+    fcntl = None
+
+import numpy as np
+
+NO_DAY = np.iinfo(np.int32).min
+NO_ID = -1
+
+# Rows fetched (and held in memory) at a time while exporting
+EXPORT_CHUNK_ROWS = 50_000
+
+ORDER_COLUMNS = {
+    "order_id": np.int64,
+    "day": np.int32,
+    "store_id": np.int64,
+    "total_price": np.float64,
+}
+LINE_COLUMNS = {
+    "order_id": np.int64,
+    "day": np.int32,
+    "store_id": np.int64,
+    "product_id": np.int64,
+    "quantity": np.int64,
+    "unit_price": np.float64,
+    "is_return": np.bool_,
+}
+
+_DAY_SQL = f"COALESCE(CAST(julianday(DATE(o.order_datetime)) - 2440587.5 AS INTEGER), {NO_DAY})"
+
+EXPORT_ORDERS_SQL = f"""
+    SELECT o.order_id, {_DAY_SQL}, COALESCE(o.store_id, {NO_ID}), COALESCE(o.total_price, 0)
+    FROM "order" AS o
+    WHERE o.status = 'complete'
+"""
+
+EXPORT_LINES_SQL = f"""
+    SELECT
+        oi.order_id,
+        {_DAY_SQL},
+        COALESCE(o.store_id, {NO_ID}),
+        COALESCE(oi.product_id, {NO_ID}),
+        COALESCE(oi.quantity, 0),
+        COALESCE(oi.unit_price, 0),
+        oi.is_return
+    FROM order_item AS oi
+    JOIN "order" AS o
+      ON o.order_id = oi.order_id
+    WHERE o.status = 'complete'
+      AND oi.is_return IN (0, 1)
+"""
+
+
+def _grouped(keys, values=None) -> dict:
+    """{ key: sum of values (or count) }; negative keys (NO_ID) are left out."""
+    known = keys >= 0
+    if not known.all():
+        keys = keys[known]
+        values = values[known] if values is not None else None
+    if len(keys) == 0:
+        return {}
+    sums = np.bincount(keys, weights=values)
+    present = np.flatnonzero(np.bincount(keys))
+    return dict(zip(present.tolist(), sums[present].tolist()))
+
+
+class ColumnarSnapshot:
+    """One exported generation, memory-mapped read-only."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.orders = {
+            name: np.load(os.path.join(path, f"orders.{name}.npy"), mmap_mode="r")
+            for name in ORDER_COLUMNS
+        }
+        self.lines = {
+            name: np.load(os.path.join(path, f"lines.{name}.npy"), mmap_mode="r")
+            for name in LINE_COLUMNS
+        }
+        with open(os.path.join(path, "meta.json")) as f:
+            self.exported_at = json.load(f)["exported_at"]
+
+    def top_sellers(self) -> list:
+        """[(product_id, units sold)] best first, returns excluded."""
+        sold = ~self.lines["is_return"]
+        totals = _grouped(self.lines["product_id"][sold], self.lines["quantity"][sold])
+        return sorted(((pid, int(n)) for pid, n in totals.items()), key=lambda t: (-t[1], t[0]))
+
+    def store_revenue(self) -> dict:
+        """{ store_id: (order_count, revenue) }, returns excluded from revenue."""
+        sold = ~self.lines["is_return"]
+        lines = self.lines
+        revenue = _grouped(lines["store_id"][sold], (lines["quantity"] * lines["unit_price"])[sold])
+        orders = _grouped(self.orders["store_id"])
+        return {
+            store_id: (int(orders.get(store_id, 0)), revenue.get(store_id, 0.0))
+            for store_id in orders.keys() | revenue.keys()
+        }
+
+    def overview(self) -> dict:
+        sold = ~self.lines["is_return"]
+        quantity = self.lines["quantity"][sold]
+        return {
+            "total_orders": int(len(self.orders["order_id"])),
+            "total_revenue": float(np.dot(quantity, self.lines["unit_price"][sold])),
+            "total_products_sold": int(quantity.sum()),
+        }
+
+    def revenue_daily(self, first_day: int, last_day: int) -> list:
+        """[(day, order_count, revenue)] for days with orders, inclusive range."""
+        day = self.orders["day"]
+        in_range = (day >= first_day) & (day <= last_day)
+        offset = day[in_range] - first_day
+        counts = np.bincount(offset, minlength=last_day - first_day + 1)
+        revenue = np.bincount(offset, weights=self.orders["total_price"][in_range],
+                              minlength=last_day - first_day + 1)
+        return [
+            (first_day + int(i), int(counts[i]), float(revenue[i]))
+            for i in np.flatnonzero(counts)
+        ]
+
+    def returns(self) -> dict:
+        """
+        { items_sold, items_returned, revenue_lost,
+          by_product: { product_id: (non_returned_sold, total_returned, total_sold) } }
+        """
+        lines = self.lines
+        returned = lines["is_return"]
+        quantity = lines["quantity"]
+        by_sold = _grouped(lines["product_id"][~returned], quantity[~returned])
+        by_returned = _grouped(lines["product_id"][returned], quantity[returned])
+        return {
+            "items_sold": int(quantity[~returned].sum()),
+            "items_returned": int(quantity[returned].sum()),
+            "revenue_lost": float(np.dot(quantity[returned], lines["unit_price"][returned])),
+            "by_product": {
+                pid: (
+                    int(by_sold.get(pid, 0)),
+                    int(by_returned.get(pid, 0)),
+                    int(by_sold.get(pid, 0) + by_returned.get(pid, 0)),
+                )
+                for pid in by_sold.keys() | by_returned.keys()
+            },
+        }
+
+
+class AnalyticsEngine:
+    """
+    Exports orders to columnar generations and serves the current one.
+    connections() must return [(key, sqlite3.Connection)], one per file
+    holding orders; they are closed after each export.
+
+    start() runs the exports on a background thread: one right away
+    unless CURRENT names a generation younger than `interval` (e.g. after
+    a restart), then one whenever the current generation is `interval`
+    old. current() is None until the first generation is there.
+
+    Processes sharing `directory` export under an flock on EXPORT.lock,
+    and adopt a generation another process exported less than `interval`
+    ago instead of exporting their own. A generation is deleted only once
+    it is neither of the two newest and older than three intervals, by
+    which time every process has moved on from it.
+    """
+
+    def __init__(self, connections, directory: str, interval: int = 300):
+        self._connections = connections
+        self.directory = directory
+        self.interval = max(1, interval)
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._snapshot = None
+
+    def start(self):
+        """Start the export thread (once)."""
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="analytics-export", daemon=True
+            )
+            self._thread.start()
+
+    def current(self):
+        """The current ColumnarSnapshot, or None before the first export."""
+        return self._snapshot
+
+    def export(self):
+        """Export a new generation now, whatever the age of the current one."""
+        with self._lock, self._export_lock():
+            self._export_locked()
+
+    def refresh(self):
+        """Adopt a fresh generation from CURRENT, or export one."""
+        with self._lock:
+            if self._adopt_current():
+                return
+            with self._export_lock():
+                # Another process may have exported while we waited
+                if not self._adopt_current():
+                    self._export_locked()
+
+    def _fresh(self, snapshot) -> bool:
+        return snapshot is not None and time.time() - snapshot.exported_at < self.interval
+
+    def _adopt_current(self) -> bool:
+        snapshot = self._open_current()
+        if not self._fresh(snapshot):
+            return False
+        if self._snapshot is None or snapshot.path != self._snapshot.path:
+            self._snapshot = snapshot
+        return True
+
+    def _open_current(self):
+        try:
+            with open(os.path.join(self.directory, "CURRENT")) as f:
+                return ColumnarSnapshot(os.path.join(self.directory, f.read().strip()))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _export_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        return _FileLock(os.path.join(self.directory, "EXPORT.lock"))
+
+    def _export_locked(self):
+        name = f"gen-{time.time_ns()}"
+        path = os.path.join(self.directory, name)
+        connections = self._connections()
+        try:
+            # One read transaction per file so the counts, orders and lines agree
+            counts = []
+            for _, conn in connections:
+                conn.execute("BEGIN")
+                counts.append([
+                    conn.execute(f"SELECT COUNT(*) FROM ({sql})").fetchone()[0]
+                    for sql in (EXPORT_ORDERS_SQL, EXPORT_LINES_SQL)
+                ])
+            os.makedirs(path)
+            exports = (("orders", EXPORT_ORDERS_SQL, ORDER_COLUMNS), ("lines", EXPORT_LINES_SQL, LINE_COLUMNS))
+            for i, (prefix, sql, spec) in enumerate(exports):
+                _export_columns(
+                    path, prefix, spec, sum(c[i] for c in counts),
+                    (conn.execute(sql) for _, conn in connections),
+                )
+            for _, conn in connections:
+                conn.execute("COMMIT")
+        except BaseException:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+        finally:
+            for _, conn in connections:
+                conn.close()
+
+        exported_at = time.time()
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"exported_at": exported_at}, f)
+        tmp = os.path.join(self.directory, f"CURRENT.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            f.write(name)
+        os.replace(tmp, os.path.join(self.directory, "CURRENT"))
+        self._snapshot = ColumnarSnapshot(path)
+
+        generations = sorted(e for e in os.listdir(self.directory) if e.startswith("gen-"))
+        for entry in generations[:-2]:
+            if int(entry[len("gen-"):]) / 1e9 < exported_at - 3 * self.interval:
+                shutil.rmtree(os.path.join(self.directory, entry), ignore_errors=True)
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                # Keep serving the previous generation; retry next interval
+                pass
+            snapshot = self._snapshot
+            due = snapshot.exported_at + self.interval if snapshot is not None else 0
+            time.sleep(max(1.0, due - time.time()))
+
+
+def _export_columns(path: str, prefix: str, spec: dict, total: int, cursors):
+    """
+    Stream the rows of `cursors` into one preallocated .npy per column,
+    EXPORT_CHUNK_ROWS rows at a time; total is their row count.
+    """
+    columns = {
+        name: np.lib.format.open_memmap(
+            os.path.join(path, f"{prefix}.{name}.npy"), mode="w+", dtype=dtype, shape=(total,)
+        )
+        for name, dtype in spec.items()
+    }
+    start = 0
+    for cur in cursors:
+        while rows := cur.fetchmany(EXPORT_CHUNK_ROWS):
+            end = start + len(rows)
+            if end > total:
+                raise RuntimeError(f"{prefix} changed during the export")
+            # Each column straight into its own dtype (the export SQL leaves no NULLs)
+            for i, (name, dtype) in enumerate(spec.items()):
+                columns[name][start:end] = np.fromiter(
+                    (row[i] for row in rows), dtype=dtype, count=len(rows)
+                )
+            start = end
+    if start != total:
+        raise RuntimeError(f"{prefix} changed during the export")
+    for values in columns.values():
+        values.flush()
+
+
+class _FileLock:
+    """flock on `path` (no-op where fcntl is missing)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "a")
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
@@ -36,15 +36,37 @@ def admin_adjust_inventory():
 '''
 
 
-from flask import Blueprint, request, jsonify
-from ..db import get_db
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+from ..backup import create_backup, list_backups, BackupInProgress
+from ..db import get_db, query_all, run_write, shard_for_store, WriteAborted
+from ..importer import iter_import, load_reference_ids, ImportRequestError
+from ..inventory import (
+    adjust_stock, compact_ledger, reconcile,
+    REASON_ADJUST, REASON_BULK_ADJUST,
+)
+from ..recommendations import build_related, replace_related, ORDER_PRODUCTS_SQL
+from array import array
+import json
+from datetime import datetime, timedelta, timezone
 import sqlite3
+import sys
 
 bp = Blueprint("admin", __name__)
 
 def bad_request(message: str, status_code: int = 400):
     return jsonify({"error": message}), status_code
 
+
+def _inventory_shards(store_id=None):
+    """Shards holding inventory (just [None] without sharding)."""
+    router = current_app.extensions.get("shard_router")
+    if router is None:
+        return [None]
+    if store_id is not None:
+        return [router.shard_for_store(store_id)]
+    return router.shards()
+
+
 # -------------------------------------------------
 # POST /api/admin/inventory/adjust
 # Body: { store_id, product_id, adjustment }
@@ -79,48 +101,815 @@ def admin_adjust_inventory():
     except (TypeError, ValueError):
         return bad_request("store_id, product_id, and adjustment must be integers")
     
-    try:
-        conn = get_db()
-        cur = conn.cursor()
-        
+    def adjust(cur):
         # Check if inventory record exists
         cur.execute(
             """
-            SELECT stock
-            FROM Store_Inventory
-            WHERE store_id = ? AND product_id = ?;
+            SELECT si.stock AS stock
+            FROM Store_Inventory AS si
+            WHERE si.store_id = ? AND si.product_id = ?;
             """,
             (store_id, product_id),
         )
         row = cur.fetchone()
         
         if row is None:
-            return bad_request("inventory record not found for this store and product", status_code=404)
+            raise WriteAborted("inventory record not found for this store and product", status_code=404)
         
-        current_stock = row["stock"]
+        current_stock = row["stock"] or 0
         new_stock = current_stock + adjustment
         
         # Don't allow negative stock
         if new_stock < 0:
-            return bad_request(f"adjustment would result in negative stock (current: {current_stock}, adjustment: {adjustment})")
+            raise WriteAborted(f"adjustment would result in negative stock (current: {current_stock}, adjustment: {adjustment})")
         
-        # Update the stock
+        # Update the stock (and record it in the ledger)
+        adjust_stock(cur, store_id, product_id, adjustment, REASON_ADJUST)
+        return current_stock, new_stock
+    
+    try:
+        current_stock, new_stock = run_write(adjust, shard=shard_for_store(store_id))
+    except WriteAborted as e:
+        return bad_request(e.message, status_code=e.status_code)
+    except sqlite3.Error as e:
+        return bad_request(f"database error: {e}")
+    
+    return jsonify({
+        "success": True,
+        "new_stock": new_stock,
+        "previous_stock": current_stock,
+        "adjustment": adjustment,
+    }), 200
+
+
+# -------------------------------------------------
+# POST /api/admin/inventory/bulk-adjust
+# Body: { items: [{ store_id, product_id, adjustment } | { store_id, product_id, set }],
+#         atomic }
+# Applies many stock changes in one transaction per database file
+# Returns: { applied, results: [{ index, store_id, product_id, status, ... }] }
+# -------------------------------------------------
+
+@bp.post("/inventory/bulk-adjust")
+def admin_bulk_adjust_inventory():
+    """
+    POST /api/admin/inventory/bulk-adjust
+    Body: {
+        items: [
+            { store_id, product_id, adjustment }   (add/subtract)
+            { store_id, product_id, set }          (absolute stock)
+        ],
+        atomic: false   (true = apply nothing if any row is rejected)
+    }
+
+    Each row's status is one of "ok", "not_found", "negative_stock" or
+    "invalid". Rejected rows are left alone and the rest are applied; with
+    atomic=true a rejection marks the other rows "skipped" instead.
+    With sharding, atomic only holds within each shard.
+
+    Returns: {
+        applied: <count>,
+        results: [{ index, store_id, product_id, status, previous_stock, new_stock, error }]
+    }
+    """
+    data = request.get_json(silent=True) or {}
+
+    items = data.get("items")
+    atomic = data.get("atomic", False)
+
+    if not isinstance(items, list) or not items:
+        return bad_request("items must be a non-empty list")
+    max_items = current_app.config["BULK_ADJUST_MAX_ITEMS"]
+    if len(items) > max_items:
+        return bad_request(f"at most {max_items} items per request")
+    if not isinstance(atomic, bool):
+        return bad_request("atomic must be a boolean")
+
+    # Validate rows up front; valid ones are grouped by shard
+    results = [None] * len(items)
+    groups = {}
+    seen = set()
+    for index, item in enumerate(items):
+        entry = item if isinstance(item, dict) else {}
+        result = {
+            "index": index,
+            "store_id": entry.get("store_id"),
+            "product_id": entry.get("product_id"),
+        }
+        results[index] = result
+
+        if ("adjustment" in entry) == ("set" in entry):
+            result.update({"status": "invalid", "error": "exactly one of adjustment or set is required"})
+            continue
+
+        try:
+            store_id = int(entry["store_id"])
+            product_id = int(entry["product_id"])
+            adjustment = int(entry["adjustment"]) if "adjustment" in entry else None
+            set_stock = int(entry["set"]) if "set" in entry else None
+        except (KeyError, TypeError, ValueError):
+            result.update({"status": "invalid", "error": "store_id, product_id, and adjustment or set must be integers"})
+            continue
+
+        if set_stock is not None and set_stock < 0:
+            result.update({"status": "invalid", "error": "set must not be negative"})
+            continue
+        if (store_id, product_id) in seen:
+            result.update({"status": "invalid", "error": "duplicate store_id/product_id in request"})
+            continue
+        seen.add((store_id, product_id))
+
+        result.update({"store_id": store_id, "product_id": product_id})
+        groups.setdefault(shard_for_store(store_id), []).append(
+            (index, store_id, product_id, adjustment, set_stock)
+        )
+
+    if atomic and any("status" in r for r in results):
+        for result in results:
+            result.setdefault("status", "skipped")
+        return jsonify({"applied": 0, "results": results}), 200
+
+    def bulk_adjust(rows):
+        def apply(cur):
+            cur.execute(
+                """
+                CREATE TEMP TABLE IF NOT EXISTS bulk_adjust (
+                  idx INTEGER PRIMARY KEY,
+                  store_id INTEGER NOT NULL,
+                  product_id INTEGER NOT NULL,
+                  adjustment INTEGER,
+                  set_stock INTEGER
+                );
+                """
+            )
+            cur.execute("DELETE FROM temp.bulk_adjust;")
+            cur.executemany(
+                """
+                INSERT INTO temp.bulk_adjust (idx, store_id, product_id, adjustment, set_stock)
+                VALUES (?, ?, ?, ?, ?);
+                """,
+                rows,
+            )
+
+            # Current stock of every requested row that exists; a NULL
+            # stock counts as 0, like everywhere else
+            cur.execute(
+                """
+                CREATE TEMP TABLE IF NOT EXISTS bulk_current (
+                  idx INTEGER PRIMARY KEY,
+                  stock INTEGER
+                );
+                """
+            )
+            cur.execute("DELETE FROM temp.bulk_current;")
+            cur.execute(
+                """
+                INSERT INTO temp.bulk_current (idx, stock)
+                SELECT b.idx, COALESCE(si.stock, 0)
+                FROM temp.bulk_adjust AS b
+                JOIN Store_Inventory AS si
+                  ON si.store_id = b.store_id
+                 AND si.product_id = b.product_id;
+                """
+            )
+            cur.execute(
+                """
+                SELECT
+                    b.idx,
+                    c.idx IS NOT NULL AS found,
+                    c.stock AS previous_stock,
+                    COALESCE(b.set_stock, COALESCE(c.stock, 0) + b.adjustment) AS new_stock
+                FROM temp.bulk_adjust AS b
+                LEFT JOIN temp.bulk_current AS c
+                  ON c.idx = b.idx;
+                """
+            )
+            outcome = {}
+            for row in cur.fetchall():
+                if not row["found"]:
+                    status = "not_found"
+                elif row["new_stock"] < 0:
+                    status = "negative_stock"
+                else:
+                    status = "ok"
+                outcome[row["idx"]] = (status, row["previous_stock"], row["new_stock"])
+
+            rejected = any(status != "ok" for status, _, _ in outcome.values())
+            if not (atomic and rejected):
+                # Keep only the accepted rows, then write the ledger rows
+                # first, while the old stock is still visible
+                cur.execute(
+                    """
+                    DELETE FROM temp.bulk_current
+                    WHERE idx IN (
+                        SELECT b.idx
+                        FROM temp.bulk_adjust AS b
+                        JOIN temp.bulk_current AS c ON c.idx = b.idx
+                        WHERE COALESCE(b.set_stock, c.stock + b.adjustment) < 0
+                    );
+                    """
+                )
+                cur.execute(
+                    """
+                    INSERT INTO inventory_movement (store_id, product_id, delta, reason)
+                    SELECT
+                        b.store_id,
+                        b.product_id,
+                        COALESCE(b.set_stock, c.stock + b.adjustment) - c.stock,
+                        ?
+                    FROM temp.bulk_adjust AS b
+                    JOIN temp.bulk_current AS c
+                      ON c.idx = b.idx
+                    WHERE COALESCE(b.set_stock, c.stock + b.adjustment) != c.stock;
+                    """,
+                    (REASON_BULK_ADJUST,),
+                )
+                # One set-based UPDATE over the accepted rows
+                cur.execute(
+                    """
+                    UPDATE Store_Inventory
+                    SET stock = COALESCE(Store_Inventory.stock, 0) + COALESCE(b.set_stock, c.stock + b.adjustment) - c.stock
+                    FROM temp.bulk_adjust AS b
+                    JOIN temp.bulk_current AS c
+                      ON c.idx = b.idx
+                    WHERE Store_Inventory.store_id = b.store_id
+                      AND Store_Inventory.product_id = b.product_id;
+                    """
+                )
+            cur.execute("DELETE FROM temp.bulk_adjust;")
+            cur.execute("DELETE FROM temp.bulk_current;")
+            return outcome, not (atomic and rejected)
+
+        return apply
+
+    outcomes = {}
+    applied_groups = {}
+    try:
+        for shard, rows in groups.items():
+            outcome, applied = run_write(bulk_adjust(rows), shard=shard)
+            outcomes.update(outcome)
+            applied_groups[shard] = applied
+    except WriteAborted as e:
+        return bad_request(e.message, status_code=e.status_code)
+    except sqlite3.Error as e:
+        return bad_request(f"database error: {e}")
+
+    applied = 0
+    for shard, rows in groups.items():
+        for index, *_ in rows:
+            status, previous_stock, new_stock = outcomes[index]
+            result = results[index]
+            result["status"] = status
+            result["previous_stock"] = previous_stock
+            if status == "ok":
+                if applied_groups[shard]:
+                    result["new_stock"] = new_stock
+                    applied += 1
+                else:
+                    result["status"] = "skipped"
+            elif status == "not_found":
+                result["error"] = "inventory record not found for this store and product"
+            else:
+                result["error"] = f"adjustment would result in negative stock (current: {previous_stock})"
+
+    return jsonify({"applied": applied, "results": results}), 200
+
+
+# -------------------------------------------------
+# GET /api/admin/write-stats
+# Write coordinator contention metrics for this process
+# -------------------------------------------------
+
+@bp.get("/write-stats")
+def admin_write_stats():
+    """
+    GET /api/admin/write-stats
+    
+    Returns: {
+        enabled, queue_depth, max_queue_depth, queue_capacity,
+        jobs, failed_jobs, rejected_jobs, batches, avg_batch_size,
+        avg_wait_ms, max_wait_ms, p50_wait_ms, p95_wait_ms,
+        shards: { <shard>: {...same fields} }   (sharding only)
+    }
+    """
+    writers = current_app.extensions.get("writers")
+    if writers is None:
+        return jsonify({"enabled": False}), 200
+    
+    result = {"enabled": True, **writers.get(None).stats()}
+    shard_stats = {
+        str(shard): stats
+        for shard, stats in writers.stats().items()
+        if shard is not None
+    }
+    if shard_stats:
+        result["shards"] = shard_stats
+    
+    return jsonify(result), 200
+
+
+# -------------------------------------------------
+# GET /api/admin/inventory/matrix
+# Query: ?format=json|binary (or Accept: application/octet-stream)
+# The whole store x product stock grid in one response.
+# Returns (json): { stores: [store_id], products: [product_id],
+#                   stock: [...] }   row-major, stock[s * len(products) + p]
+# Returns (binary): little-endian int32
+#   [n_stores, n_products, store_ids..., product_ids..., stock...]
+# Pairs with no Store_Inventory row (or NULL stock) are -1.
+# -------------------------------------------------
+
+@bp.get("/inventory/matrix")
+def admin_inventory_matrix():
+    fmt = request.args.get("format")
+    if fmt is None:
+        fmt = "binary" if request.accept_mimetypes.best == "application/octet-stream" else "json"
+    if fmt not in ("json", "binary"):
+        return bad_request("format must be json or binary")
+
+    try:
+        cur = get_db(readonly=True).cursor()
+        store_ids = [row[0] for row in cur.execute("SELECT store_id FROM store ORDER BY store_id;")]
+        product_ids = [row[0] for row in cur.execute("SELECT product_id FROM products ORDER BY product_id;")]
+        rows = query_all(
+            """
+            SELECT si.store_id, si.product_id, si.stock AS stock
+            FROM Store_Inventory AS si
+            WHERE si.stock IS NOT NULL;
+            """
+        )
+    except sqlite3.Error as e:
+        return bad_request(f"database error: {e}")
+
+    store_index = {store_id: i for i, store_id in enumerate(store_ids)}
+    product_index = {product_id: i for i, product_id in enumerate(product_ids)}
+    width = len(product_ids)
+
+    stock = array("i", [-1]) * (len(store_ids) * width)
+    for store_id, product_id, value in rows:
+        s = store_index.get(store_id)
+        p = product_index.get(product_id)
+        if s is not None and p is not None:
+            stock[s * width + p] = value
+
+    if fmt == "json":
+        return jsonify({
+            "stores": store_ids,
+            "products": product_ids,
+            "stock": stock.tolist(),
+        }), 200
+
+    body = array("i", [len(store_ids), width])
+    body.extend(store_ids)
+    body.extend(product_ids)
+    body.extend(stock)
+    if sys.byteorder == "big":
+        body.byteswap()
+    response = Response(body.tobytes(), mimetype="application/octet-stream")
+    response.headers["X-Matrix-Shape"] = f"{len(store_ids)},{width}"
+    return response, 200
+
+
+# -------------------------------------------------
+# GET /api/admin/inventory/thresholds
+# Inventory health thresholds (see app/health.py)
+# Returns: { defaults: { low_stock, overstock },
+#            thresholds: [{ store_id, category, low_stock, overstock }] }
+# -------------------------------------------------
+
+@bp.get("/inventory/thresholds")
+def admin_list_thresholds():
+    try:
+        cur = get_db(readonly=True).cursor()
+        cur.execute(
+            """
+            SELECT store_id, category, low_stock, overstock
+            FROM inventory_threshold
+            ORDER BY IFNULL(store_id, -1), IFNULL(category, '');
+            """
+        )
+        rows = cur.fetchall()
+    except sqlite3.Error as e:
+        return bad_request(f"database error: {e}")
+
+    return jsonify({
+        "defaults": {
+            "low_stock": current_app.config["INVENTORY_LOW_STOCK"],
+            "overstock": current_app.config["INVENTORY_OVERSTOCK"],
+        },
+        "thresholds": [dict(row) for row in rows],
+    }), 200
+
+
+# -------------------------------------------------
+# PUT /api/admin/inventory/thresholds
+# Body: { store_id?, category?, low_stock?, overstock? }
+# Sets the thresholds for a store, a category, or a store + category.
+# An omitted/null threshold falls through to the next, less specific one.
+# DELETE with { store_id?, category? } removes that row.
+# Returns: { store_id, category, low_stock, overstock }
+# -------------------------------------------------
+
+def _threshold_scope(data):
+    store_id = data.get("store_id")
+    category = data.get("category")
+    if store_id is not None:
+        store_id = int(store_id)
+    if category is not None:
+        category = str(category).strip() or None
+    return store_id, category
+
+
+def _thresholds_changed():
+    # Stored health buckets (INVENTORY_HEALTH_INCREMENTAL) are rebuilt by
+    # the next refresh; run it now rather than at the end of the interval
+    refresher = current_app.extensions.get("health_refresher")
+    if refresher is not None:
+        refresher.wake()
+
+
+@bp.put("/inventory/thresholds")
+def admin_set_threshold():
+    data = request.get_json(silent=True) or {}
+
+    try:
+        store_id, category = _threshold_scope(data)
+        low_stock = data.get("low_stock")
+        overstock = data.get("overstock")
+        low_stock = int(low_stock) if low_stock is not None else None
+        overstock = int(overstock) if overstock is not None else None
+    except (TypeError, ValueError):
+        return bad_request("store_id, low_stock, and overstock must be integers")
+
+    if store_id is None and category is None:
+        return bad_request("store_id or category is required (defaults come from the config)")
+    if low_stock is None and overstock is None:
+        return bad_request("low_stock or overstock is required")
+    if (low_stock is not None and low_stock < 0) or (overstock is not None and overstock < 0):
+        return bad_request("thresholds must not be negative")
+
+    def set_threshold(cur):
+        if store_id is not None:
+            cur.execute("SELECT 1 FROM store WHERE store_id = ?;", (store_id,))
+            if cur.fetchone() is None:
+                raise WriteAborted("store not found", status_code=404)
+        cur.execute(
+            """
+            DELETE FROM inventory_threshold
+            WHERE store_id IS ?
+              AND category IS ?;
+            """,
+            (store_id, category),
+        )
+        cur.execute(
+            """
+            INSERT INTO inventory_threshold (store_id, category, low_stock, overstock)
+            VALUES (?, ?, ?, ?);
+            """,
+            (store_id, category, low_stock, overstock),
+        )
+
+    try:
+        run_write(set_threshold)
+    except WriteAborted as e:
+        return bad_request(e.message, status_code=e.status_code)
+    except sqlite3.Error as e:
+        return bad_request(f"database error: {e}")
+    _thresholds_changed()
+
+    return jsonify({
+        "store_id": store_id,
+        "category": category,
+        "low_stock": low_stock,
+        "overstock": overstock,
+    }), 200
+
+
+@bp.delete("/inventory/thresholds")
+def admin_delete_threshold():
+    data = request.get_json(silent=True) or {}
+
+    try:
+        store_id, category = _threshold_scope(data)
+    except (TypeError, ValueError):
+        return bad_request("store_id must be an integer")
+
+    def delete_threshold(cur):
         cur.execute(
             """
-            UPDATE Store_Inventory
-            SET stock = ?
+            DELETE FROM inventory_threshold
+            WHERE store_id IS ?
+              AND category IS ?;
+            """,
+            (store_id, category),
+        )
+        if cur.rowcount == 0:
+            raise WriteAborted("no thresholds set for this store/category", status_code=404)
+
+    try:
+        run_write(delete_threshold)
+    except WriteAborted as e:
+        return bad_request(e.message, status_code=e.status_code)
+    except sqlite3.Error as e:
+        return bad_request(f"database error: {e}")
+    _thresholds_changed()
+
+    return jsonify({"success": True}), 200
+
+
+# -------------------------------------------------
+# GET /api/admin/inventory/ledger
+# Query: ?store_id=X&product_id=Y[&limit=N]
+# Stock movements for one store/product, newest first
+# Returns: { store_id, product_id, snapshot_stock, movements: [...] }
+# -------------------------------------------------
+
+@bp.get("/inventory/ledger")
+def admin_inventory_ledger():
+    """
+    GET /api/admin/inventory/ledger?store_id=1&product_id=2&limit=100
+
+    limit is 1..1000 (default 100).
+
+    Returns: {
+        store_id, product_id, stock,
+        snapshot_stock,          (stock folded in by compaction)
+        movements: [{ movement_id, delta, reason, order_id, movement_datetime }]
+    }
+    """
+    try:
+        store_id = int(request.args.get("store_id", ""))
+        product_id = int(request.args.get("product_id", ""))
+    except ValueError:
+        return bad_request("store_id and product_id are required integers")
+    try:
+        limit = int(request.args.get("limit", 100))
+    except ValueError:
+        return bad_request("limit must be an integer")
+    if limit < 1:
+        return bad_request("limit must be positive")
+    limit = min(limit, 1000)
+
+    try:
+        cur = get_db(readonly=True, shard=shard_for_store(store_id)).cursor()
+        cur.execute(
+            """
+            SELECT stock
+            FROM Store_Inventory
             WHERE store_id = ? AND product_id = ?;
             """,
-            (new_stock, store_id, product_id),
+            (store_id, product_id),
         )
-        conn.commit()
-        
-        return jsonify({
-            "success": True,
-            "new_stock": new_stock,
-            "previous_stock": current_stock,
-            "adjustment": adjustment,
-        }), 200
-        
+        stock_row = cur.fetchone()
+        cur.execute(
+            """
+            SELECT stock
+            FROM inventory_snapshot
+            WHERE store_id = ? AND product_id = ?;
+            """,
+            (store_id, product_id),
+        )
+        snapshot_row = cur.fetchone()
+        cur.execute(
+            """
+            SELECT movement_id, delta, reason, order_id, movement_datetime
+            FROM inventory_movement
+            WHERE store_id = ? AND product_id = ?
+            ORDER BY movement_id DESC
+            LIMIT ?;
+            """,
+            (store_id, product_id, limit),
+        )
+        movements = [dict(row) for row in cur.fetchall()]
     except sqlite3.Error as e:
-        return bad_request(f"database error: {e}")
\ No newline at end of file
+        return bad_request(f"database error: {e}")
+
+    return jsonify({
+        "store_id": store_id,
+        "product_id": product_id,
+        "stock": stock_row["stock"] if stock_row else None,
+        "snapshot_stock": snapshot_row["stock"] if snapshot_row else 0,
+        "movements": movements,
+    }), 200
+
+
+# -------------------------------------------------
+# GET /api/admin/inventory/reconcile
+# Query: ?store_id=X (optional)
+# Lists rows whose stock differs from snapshot + ledger
+# Returns: { mismatches: [{ store_id, product_id, stock, ledger_stock }] }
+# -------------------------------------------------
+
+@bp.get("/inventory/reconcile")
+def admin_inventory_reconcile():
+    store_id = request.args.get("store_id")
+    try:
+        store_id = int(store_id) if store_id is not None else None
+    except ValueError:
+        return bad_request("store_id must be an integer")
+
+    mismatches = []
+    try:
+        for shard in _inventory_shards(store_id):
+            cur = get_db(readonly=True, shard=shard).cursor()
+            mismatches.extend(reconcile(cur, store_id))
+    except sqlite3.Error as e:
+        return bad_request(f"database error: {e}")
+
+    return jsonify({"mismatches": mismatches}), 200
+
+
+# -------------------------------------------------
+# POST /api/admin/inventory/compact
+# Body (optional): { older_than_days }
+# Folds old ledger movements into inventory_snapshot
+# Returns: { folded, before }
+# -------------------------------------------------
+
+@bp.post("/inventory/compact")
+def admin_inventory_compact():
+    data = request.get_json(silent=True) or {}
+    try:
+        days = int(data.get("older_than_days", current_app.config["LEDGER_RETENTION_DAYS"]))
+    except (TypeError, ValueError):
+        return bad_request("older_than_days must be an integer")
+    if days < 0:
+        return bad_request("older_than_days must not be negative")
+
+    before = (datetime.now(timezone.utc) - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+
+    folded = 0
+    try:
+        for shard in _inventory_shards():
+            result = run_write(lambda cur: compact_ledger(cur, before), shard=shard)
+            folded += result["folded"]
+    except sqlite3.Error as e:
+        return bad_request(f"database error: {e}")
+
+    return jsonify({"folded": folded, "before": before}), 200
+
+
+# -------------------------------------------------
+# POST /api/admin/recommendations/rebuild
+# Recomputes "frequently bought together" (product_related) from
+# completed orders; same as util/build_related.py
+# Returns: { products, pairs, orders, seconds }
+# -------------------------------------------------
+
+@bp.post("/recommendations/rebuild")
+def admin_rebuild_recommendations():
+    try:
+        order_products = [tuple(row) for row in query_all(ORDER_PRODUCTS_SQL)]
+        result = build_related(order_products, current_app.config["RELATED_TOP_K"])
+        run_write(lambda cur: replace_related(cur, result))
+    except ImportError:
+        return bad_request("recommendations rebuild needs NumPy: pip install -r requirements.txt", 503)
+    except sqlite3.Error as e:
+        return bad_request(f"database error: {e}")
+
+    return jsonify({
+        "products": len({row[0] for row in result["rows"]}),
+        "pairs": result["pairs"],
+        "orders": result["orders"],
+        "seconds": result["seconds"],
+    }), 200
+
+
+# -------------------------------------------------
+# POST /api/admin/import?kind=products|inventory&format=csv|ndjson[&progress=1]
+# Body: the CSV / NDJSON file, raw or as multipart field "file"
+# Streams rows into products or Store_Inventory (upsert) in batches
+# Returns: { kind, format, rows, imported, rejected, errors, seconds, done }
+# -------------------------------------------------
+
+@bp.post("/import")
+def admin_import():
+    """
+    POST /api/admin/import?kind=inventory&format=csv
+
+    products columns:  product_id (optional), product_name, category, price, img_url
+    inventory columns: store_id, product_id, stock
+
+    Rows are validated and written IMPORT_CHUNK_SIZE at a time, each chunk in
+    its own transaction; rejected rows are skipped and listed in errors
+    (first 100). With progress=1 and a raw body the response is NDJSON: one
+    summary line per chunk, the last line being the final summary.
+
+    Returns: { kind, format, rows, imported, rejected, errors: [{ line, error }], seconds, done }
+    """
+    kind = request.args.get("kind", "")
+    fmt = request.args.get("format", "csv")
+
+    upload = request.files.get("file")
+    stream = upload.stream if upload is not None else request.stream
+    # Uploaded files are closed when the request context ends, so progress
+    # can only be streamed while reading a raw body
+    stream_progress = request.args.get("progress") == "1" and upload is None
+
+    try:
+        store_ids, product_ids = load_reference_ids(get_db(readonly=True))
+    except sqlite3.Error as e:
+        return bad_request(f"database error: {e}")
+
+    def catalog_changed():
+        # Product search indexes rebuild on their next use; stored health
+        # buckets are rebuilt since categories pick the thresholds
+        if kind == "products":
+            current_app.extensions["product_search_index"].invalidate()
+            refresher = current_app.extensions.get("health_refresher")
+            if refresher is not None:
+                refresher.invalidate()
+
+    def do_import():
+        return iter_import(
+            stream,
+            kind,
+            fmt,
+            lambda fn, shard: run_write(fn, shard=shard),
+            store_ids,
+            product_ids,
+            shard_for_store=shard_for_store,
+            chunk_size=current_app.config["IMPORT_CHUNK_SIZE"],
+        )
+
+    if stream_progress:
+        def generate():
+            try:
+                for summary in do_import():
+                    line = summary if summary["done"] else {**summary, "errors": []}
+                    yield json.dumps(line) + "\n"
+            except (ImportRequestError, WriteAborted, sqlite3.Error) as e:
+                yield json.dumps({"error": str(e), "done": True}) + "\n"
+            finally:
+                catalog_changed()
+
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    try:
+        for summary in do_import():
+            pass
+    except ImportRequestError as e:
+        return bad_request(str(e))
+    except WriteAborted as e:
+        return bad_request(e.message, status_code=e.status_code)
+    except sqlite3.IntegrityError as e:
+        return bad_request(f"integrity error: {e}")
+    except sqlite3.Error as e:
+        return bad_request(f"database error: {e}")
+    finally:
+        catalog_changed()
+
+    return jsonify(summary), 200
+
+
+# -------------------------------------------------
+# POST /api/admin/backup
+# Body (optional): { compress, keep }
+# Takes an online backup (main database + shards, from one moment) into BACKUP_DIR
+# Returns: { name, files: [{ file, size, method }], seconds, pruned }
+# -------------------------------------------------
+
+@bp.post("/backup")
+def admin_backup():
+    data = request.get_json(silent=True) or {}
+    config = current_app.config
+
+    compress = data.get("compress", config["BACKUP_COMPRESS"])
+    keep = data.get("keep", config["BACKUP_KEEP"])
+
+    if not isinstance(compress, bool):
+        return bad_request("compress must be a boolean")
+    try:
+        keep = int(keep)
+    except (TypeError, ValueError):
+        return bad_request("keep must be an integer")
+
+    router = current_app.extensions.get("shard_router")
+    shard_paths = [router.shard_path(shard) for shard in router.shards()] if router else []
+
+    try:
+        result = create_backup(
+            config["SQLITE_PATH"],
+            config["BACKUP_DIR"],
+            keep=keep,
+            compress=compress,
+            shard_paths=shard_paths,
+            pages=config["BACKUP_PAGES"],
+            sleep=config["BACKUP_SLEEP"],
+        )
+    except BackupInProgress as e:
+        return bad_request(str(e), status_code=409)
+    except (sqlite3.Error, OSError) as e:
+        return bad_request(f"backup failed: {e}", status_code=500)
+
+    return jsonify(result), 201
+
+
+# -------------------------------------------------
+# GET /api/admin/backups
+# Returns: [{ name, files, size }]   newest first
+# -------------------------------------------------
+
+@bp.get("/backups")
+def admin_list_backups():
+    return jsonify(list_backups(current_app.config["BACKUP_DIR"])), 200
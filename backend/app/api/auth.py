@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify
-from ..db import get_db
+from ..db import get_db, run_write, WriteAborted
 import sqlite3
 import os
 import hashlib
@@ -98,18 +98,15 @@ def register():
     if len(password) < 6:
         return bad_request("password must be at least 6 characters")
 
-    try:
-        conn = get_db()
-        cur = conn.cursor()
+    # Hash password (outside the write transaction: PBKDF2 is slow)
+    password_hash, password_salt = hash_password(password)
 
+    def insert_user(cur):
         # Check if user_name already exists
         cur.execute("SELECT uid FROM User WHERE user_name = ?;", (user_name,))
         existing = cur.fetchone()
         if existing is not None:
-            return bad_request("user_name already exists")
-
-        # Hash password
-        password_hash, password_salt = hash_password(password)
+            raise WriteAborted("user_name already exists")
 
         # Insert new user (role = 'customer')
         cur.execute(
@@ -119,21 +116,23 @@ def register():
             """,
             (user_name, password_hash, password_salt),
         )
-        conn.commit()
-
-        uid = cur.lastrowid
-
-        return jsonify(
-            {
-                "uid": uid,
-                "user_name": user_name,
-                "role": "customer",
-            }
-        ), 200
+        return cur.lastrowid
 
+    try:
+        uid = run_write(insert_user)
+    except WriteAborted as e:
+        return bad_request(e.message, status_code=e.status_code)
     except sqlite3.Error as e:
         return bad_request(f"database error: {e}")
 
+    return jsonify(
+        {
+            "uid": uid,
+            "user_name": user_name,
+            "role": "customer",
+        }
+    ), 200
+
 
 @bp.post("/login")
 def login():
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
-from ..db import get_db
+from ..db import get_db, run_write, shard_for_id, shard_for_store, WriteAborted
+from ..reservations import hold_stock, release_hold, reservation_book
 import sqlite3
 
 bp = Blueprint("cart", __name__)
@@ -38,7 +39,7 @@ def get_cart():
         return bad_request("customer_id and store_id must be integers")
 
     try:
-        conn = get_db()
+        conn = get_db(shard=shard_for_store(store_id))
         cur = conn.cursor()
 
         # Find active cart for this customer + store
@@ -120,7 +121,9 @@ def get_cart():
 # POST /api/cart/add_to_cart
 # Body: { customer_id, product_id, quantity, store_id }
 # Adds item to cart (creates order with status='in_cart' if needed)
-# Returns: { order_item_id, product_id, quantity }
+# With STOCK_RESERVATIONS=1 the line's quantity is held for
+# RESERVATION_TTL seconds; 409 if not enough stock is available
+# Returns: { order_item_id, product_id, quantity, reserved_until? }
 # -------------------------------------------------
 
 @bp.post("/add_to_cart")
@@ -146,10 +149,11 @@ def add_to_cart():
     if quantity <= 0:
         return bad_request("quantity must be a positive integer")
 
-    try:
-        conn = get_db()
-        cur = conn.cursor()
+    book = reservation_book()
+    expires_at = book.expires_at() if book is not None else None
+    holds = []
 
+    def add_item(cur):
         # 1. Find or create in_cart order for this customer + store
         cur.execute(
             """
@@ -216,7 +220,7 @@ def add_to_cart():
             )
             price_row = cur.fetchone()
             if price_row is None:
-                return bad_request("product not found")
+                raise WriteAborted("product not found")
 
             unit_price = float(price_row["price"])
 
@@ -230,27 +234,39 @@ def add_to_cart():
             order_item_id = cur.lastrowid
             final_quantity = quantity
 
-        conn.commit()
+        if book is not None:
+            hold_stock(cur, store_id, product_id, order_id, order_item_id, final_quantity, expires_at)
+            holds[:] = [order_id]
 
-        return jsonify(
-            {
-                "order_item_id": order_item_id,
-                "product_id": product_id,
-                "quantity": final_quantity,
-            }
-        ), 200
+        return {
+            "order_item_id": order_item_id,
+            "product_id": product_id,
+            "quantity": final_quantity,
+        }
 
+    try:
+        result = run_write(add_item, shard=shard_for_store(store_id))
+    except WriteAborted as e:
+        return bad_request(e.message, status_code=e.status_code)
     except sqlite3.IntegrityError as e:
         return bad_request(f"integrity error: {e}")
     except sqlite3.Error as e:
         return bad_request(f"database error: {e}")
 
+    if holds:
+        book.hold(
+            store_id, product_id, holds[0], result["order_item_id"], result["quantity"], expires_at
+        )
+        result["reserved_until"] = expires_at
+
+    return jsonify(result), 200
+
 
 # -------------------------------------------------
 # PUT /api/cart/items/<order_item_id>
 # Body: { customer_id, quantity }   (No zero allowed)
-# Updates cart item quantity
-# Returns: { order_item_id, quantity }
+# Updates cart item quantity (and its hold, with STOCK_RESERVATIONS=1)
+# Returns: { order_item_id, quantity, reserved_until? }
 # -------------------------------------------------
 
 @bp.put("/items/<int:order_item_id>")
@@ -272,14 +288,15 @@ def update_cart_item(order_item_id: int):
     if quantity <= 0:
         return bad_request("quantity must be at least 1")
 
-    try:
-        conn = get_db()
-        cur = conn.cursor()
+    book = reservation_book()
+    expires_at = book.expires_at() if book is not None else None
+    holds = []
 
+    def update_item(cur):
         # Verify that this order_item belongs to an in_cart order for this customer
         cur.execute(
             """
-            SELECT oi.order_item_id
+            SELECT oi.order_item_id, oi.order_id, oi.product_id, o.store_id
             FROM order_item AS oi
             JOIN "order" AS o
               ON oi.order_id = o.order_id
@@ -292,7 +309,7 @@ def update_cart_item(order_item_id: int):
         row = cur.fetchone()
 
         if row is None:
-            return bad_request("cart item not found for this customer", status_code=404)
+            raise WriteAborted("cart item not found for this customer", status_code=404)
 
         cur.execute(
             """
@@ -303,18 +320,31 @@ def update_cart_item(order_item_id: int):
             (quantity, order_item_id),
         )
 
-        conn.commit()
-
-        return jsonify(
-            {
-                "order_item_id": order_item_id,
-                "quantity": quantity,
-            }
-        ), 200
+        if book is not None:
+            hold_stock(
+                cur, row["store_id"], row["product_id"], row["order_id"],
+                order_item_id, quantity, expires_at,
+            )
+            holds[:] = [(row["store_id"], row["product_id"], row["order_id"])]
 
+    try:
+        run_write(update_item, shard=shard_for_id(order_item_id))
+    except WriteAborted as e:
+        return bad_request(e.message, status_code=e.status_code)
     except sqlite3.Error as e:
         return bad_request(f"database error: {e}")
 
+    result = {
+        "order_item_id": order_item_id,
+        "quantity": quantity,
+    }
+    if holds:
+        store_id, product_id, order_id = holds[0]
+        book.hold(store_id, product_id, order_id, order_item_id, quantity, expires_at)
+        result["reserved_until"] = expires_at
+
+    return jsonify(result), 200
+
 
 # -------------------------------------------------
 # DELETE /api/cart/items/<order_item_id>
@@ -337,10 +367,7 @@ def remove_cart_item(order_item_id: int):
     except (TypeError, ValueError):
         return bad_request("customer_id must be an integer")
 
-    try:
-        conn = get_db()
-        cur = conn.cursor()
-
+    def remove_item(cur):
         # Verify that this order_item belongs to an in_cart order for this customer
         cur.execute(
             """
@@ -357,11 +384,11 @@ def remove_cart_item(order_item_id: int):
         row = cur.fetchone()
 
         if row is None:
-            return bad_request("cart item not found for this customer", status_code=404)
+            raise WriteAborted("cart item not found for this customer", status_code=404)
 
         order_id = row["order_id"]
 
-        # Delete the item
+        # Delete the item and release its hold
         cur.execute(
             """
             DELETE FROM order_item
@@ -369,6 +396,7 @@ def remove_cart_item(order_item_id: int):
             """,
             (order_item_id,),
         )
+        release_hold(cur, order_item_id)
 
         # Optionally, you could also delete the order if it has no more items.
         # For this project, leaving an empty in_cart order is acceptable.
@@ -383,9 +411,15 @@ def remove_cart_item(order_item_id: int):
         #         (order_id,),
         #     )
 
-        conn.commit()
-
-        return jsonify({"success": True}), 200
-
+    try:
+        run_write(remove_item, shard=shard_for_id(order_item_id))
+    except WriteAborted as e:
+        return bad_request(e.message, status_code=e.status_code)
     except sqlite3.Error as e:
         return bad_request(f"database error: {e}")
+
+    book = reservation_book()
+    if book is not None:
+        book.release(order_item_id)
+
+    return jsonify({"success": True}), 200
@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify
-from ..db import get_db
+from ..db import get_db, run_write, WriteAborted
 import sqlite3
 '''
 GET customer info：
@@ -148,10 +148,7 @@ def create_customer_info():
     except (TypeError, ValueError):
         return bad_request("uid must be an integer")
 
-    try:
-        conn = get_db()
-        cur = conn.cursor()
-
+    def insert_customer(cur):
         # Ensure this uid doesn't already have a customer record
         cur.execute(
             "SELECT customer_id FROM Customers WHERE uid = ?;",
@@ -159,7 +156,7 @@ def create_customer_info():
         )
         existing = cur.fetchone()
         if existing is not None:
-            return bad_request("customer info already exists for this user")
+            raise WriteAborted("customer info already exists for this user")
 
         # Insert new customer row
         cur.execute(
@@ -180,26 +177,29 @@ def create_customer_info():
                 uid_int,
             ),
         )
-        conn.commit()
-        customer_id = cur.lastrowid
-
-        result = {
-            "customer_id": customer_id,
-            "customer_name": payload["customer_name"],
-            "phone_number": payload["phone_number"],
-            "street": payload["street"],
-            "city": payload["city"],
-            "state": payload["state"],
-            "zip_code": payload["zip_code"],
-            "country": payload["country"],
-        }
-        return jsonify(result), 200
+        return cur.lastrowid
 
+    try:
+        customer_id = run_write(insert_customer)
+    except WriteAborted as e:
+        return bad_request(e.message, status_code=e.status_code)
     except sqlite3.IntegrityError as e:
         return bad_request(f"integrity error: {e}")
     except sqlite3.Error as e:
         return bad_request(f"database error: {e}")
 
+    result = {
+        "customer_id": customer_id,
+        "customer_name": payload["customer_name"],
+        "phone_number": payload["phone_number"],
+        "street": payload["street"],
+        "city": payload["city"],
+        "state": payload["state"],
+        "zip_code": payload["zip_code"],
+        "country": payload["country"],
+    }
+    return jsonify(result), 200
+
 
 # -------------------------------------------------
 # PUT /api/customer/customer-info
@@ -225,10 +225,7 @@ def update_customer_info():
     except (TypeError, ValueError):
         return bad_request("uid must be an integer")
 
-    try:
-        conn = get_db()
-        cur = conn.cursor()
-
+    def update_customer(cur):
         # Check if record exists
         cur.execute(
             """
@@ -240,9 +237,7 @@ def update_customer_info():
         )
         row = cur.fetchone()
         if row is None:
-            return bad_request("customer not found", status_code=404)
-
-        customer_id = row["customer_id"]
+            raise WriteAborted("customer not found", status_code=404)
 
         # Update record
         cur.execute(
@@ -268,19 +263,23 @@ def update_customer_info():
                 uid_int,
             ),
         )
-        conn.commit()
-
-        result = {
-            "customer_id": customer_id,
-            "customer_name": payload["customer_name"],
-            "phone_number": payload["phone_number"],
-            "street": payload["street"],
-            "city": payload["city"],
-            "state": payload["state"],
-            "zip_code": payload["zip_code"],
-            "country": payload["country"],
-        }
-        return jsonify(result), 200
+        return row["customer_id"]
 
+    try:
+        customer_id = run_write(update_customer)
+    except WriteAborted as e:
+        return bad_request(e.message, status_code=e.status_code)
     except sqlite3.Error as e:
         return bad_request(f"database error: {e}")
+
+    result = {
+        "customer_id": customer_id,
+        "customer_name": payload["customer_name"],
+        "phone_number": payload["phone_number"],
+        "street": payload["street"],
+        "city": payload["city"],
+        "state": payload["state"],
+        "zip_code": payload["zip_code"],
+        "country": payload["country"],
+    }
+    return jsonify(result), 200
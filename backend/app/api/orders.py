@@ -1,5 +1,8 @@
-from flask import Blueprint, request, jsonify
-from ..db import get_db
+from flask import Blueprint, request, jsonify, current_app, url_for
+from ..db import get_db, query_all, run_write, shard_for_id, shard_for_store, WriteAborted
+from ..checkout import CheckoutError, perform_checkout
+from ..inventory import adjust_stock, REASON_RETURN
+from ..reservations import reservation_book
 import sqlite3
 
 bp = Blueprint("orders", __name__)
@@ -15,6 +18,9 @@ def bad_request(message: str, status_code: int = 400):
 # Converts cart (status='in_cart') to completed order (status='complete')
 # Reduces stock in Store_Inventory
 # Returns: { order_id, total_price, status }
+#
+# With CHECKOUT_MODE=async the cart is queued instead:
+# Returns 202: { ticket, status: 'pending' }
 # -------------------------------------------------
 
 @bp.post("/checkout")
@@ -33,101 +39,57 @@ def checkout_order():
     except (TypeError, ValueError):
         return bad_request("customer_id and store_id must be integers")
 
-    try:
-        conn = get_db()
-        cur = conn.cursor()
+    if current_app.config["CHECKOUT_MODE"] == "async":
+        ticket = current_app.extensions["checkout_queue"].submit(
+            customer_id, store_id, shard=shard_for_store(store_id)
+        )
+        response = jsonify({"ticket": ticket, "status": "pending"})
+        response.headers["Location"] = url_for(".checkout_status", ticket=ticket)
+        return response, 202
 
-        # Find the active cart
-        cur.execute(
-            """
-            SELECT order_id
-            FROM "order"
-            WHERE customer_id = ?
-              AND store_id = ?
-              AND status = 'in_cart';
-            """,
-            (customer_id, store_id),
+    try:
+        result = run_write(
+            lambda cur: perform_checkout(cur, customer_id, store_id),
+            shard=shard_for_store(store_id),
         )
-        row = cur.fetchone()
+    except CheckoutError as e:
+        return bad_request(e.message, status_code=e.status_code)
+    except sqlite3.Error as e:
+        return bad_request(f"database error during checkout: {e}")
 
-        if row is None:
-            return bad_request("no active cart for this customer and store", status_code=404)
+    book = reservation_book()
+    if book is not None:
+        book.release_order(result["order_id"])
 
-        order_id = row["order_id"]
+    return jsonify(result), 200
 
-        # Load items in the cart (non-returned items)
-        cur.execute(
-            """
-            SELECT 
-                oi.product_id,
-                oi.quantity,
-                p.price,
-                COALESCE(si.stock, 0) AS stock
-            FROM order_item AS oi
-            JOIN products AS p
-              ON oi.product_id = p.product_id
-            LEFT JOIN store_inventory AS si
-              ON si.product_id = oi.product_id
-             AND si.store_id = ?
-            WHERE oi.order_id = ?
-              AND oi.is_return = 0;
-            """,
-            (store_id, order_id),
-        )
 
-        items = cur.fetchall()
-
-        if not items:
-            return bad_request("cart is empty", status_code=400)
-
-        # Check stock availability
-        for item in items:
-            if item["stock"] < item["quantity"]:
-                return bad_request("insufficient stock for one or more items")
-
-        # Compute total price
-        total_price = sum(float(item["price"]) * int(item["quantity"]) for item in items)
-
-        # Deduct stock + complete the order
-        try:
-            for item in items:
-                cur.execute(
-                    """
-                    UPDATE store_inventory
-                    SET stock = stock - ?
-                    WHERE store_id = ?
-                      AND product_id = ?;
-                    """,
-                    (item["quantity"], store_id, item["product_id"]),
-                )
-
-            cur.execute(
-                """
-                UPDATE "order"
-                SET status = 'complete',
-                    total_price = ?,
-                    order_datetime = CURRENT_TIMESTAMP
-                WHERE order_id = ?;
-                """,
-                (total_price, order_id),
-            )
+# -------------------------------------------------
+# GET /api/orders/checkout/<ticket>
+# Polls an async checkout
+# Returns: { ticket, status, order_id?, total_price?, error? }
+#   status: pending | complete | insufficient_stock | failed
+# -------------------------------------------------
 
-            conn.commit()
+@bp.get("/checkout/<ticket>")
+def checkout_status(ticket: str):
+    checkout_queue = current_app.extensions.get("checkout_queue")
+    info = checkout_queue.status(ticket) if checkout_queue is not None else None
 
-        except sqlite3.Error as e:
-            conn.rollback()
-            return bad_request(f"database error during checkout: {e}")
+    if info is None:
+        return bad_request("checkout ticket not found", status_code=404)
 
-        return jsonify(
-            {
-                "order_id": order_id,
-                "total_price": total_price,
-                "status": "complete",
-            }
-        ), 200
+    result = {
+        "ticket": info["ticket"],
+        "status": info["status"],
+        "customer_id": info["customer_id"],
+        "store_id": info["store_id"],
+    }
+    for key in ("order_id", "total_price", "error"):
+        if key in info:
+            result[key] = info[key]
 
-    except sqlite3.Error as e:
-        return bad_request(f"database error: {e}")
+    return jsonify(result), 200
 
 
 # -------------------------------------------------
@@ -149,10 +111,8 @@ def get_past_orders():
         return bad_request("customer_id must be an integer")
 
     try:
-        conn = get_db()
-        cur = conn.cursor()
-
-        cur.execute(
+        # A customer may have orders at any store -> every shard when sharded
+        rows = query_all(
             """
             SELECT 
                 o.order_id,
@@ -173,8 +133,7 @@ def get_past_orders():
             """,
             (customer_id,),
         )
-
-        rows = cur.fetchall()
+        rows.sort(key=lambda row: (row["order_datetime"] or "", row["order_id"]), reverse=True)
 
         orders = [
             {
@@ -216,7 +175,7 @@ def get_order_detail(order_id: int):
         return bad_request("customer_id must be an integer")
 
     try:
-        conn = get_db()
+        conn = get_db(shard=shard_for_id(order_id))
         cur = conn.cursor()
 
         # Order info (ensure it belongs to customer)
@@ -328,10 +287,7 @@ def return_order_items(order_id: int):
     except (TypeError, ValueError):
         return bad_request("customer_id and order_item_ids must be integers")
 
-    try:
-        conn = get_db()
-        cur = conn.cursor()
-
+    def apply_return(cur):
         # 1. Verify order belongs to customer and get store_id
         cur.execute(
             """
@@ -344,13 +300,13 @@ def return_order_items(order_id: int):
         )
         order_row = cur.fetchone()
         if order_row is None:
-            return bad_request("order not found for this customer", status_code=404)
+            raise WriteAborted("order not found for this customer", status_code=404)
 
         store_id = order_row["store_id"]
 
         # Optional: Only allow returns for completed orders
         # if order_row["status"] != "complete":
-        #     return bad_request("can only return items for completed orders")
+        #     raise WriteAborted("can only return items for completed orders")
 
         # 2. Load the requested order items for this order
         placeholders = ",".join(["?"] * len(order_item_ids_int))
@@ -368,52 +324,39 @@ def return_order_items(order_id: int):
         rows = cur.fetchall()
 
         if not rows:
-            return bad_request("no matching order items found for this order")
+            raise WriteAborted("no matching order items found for this order")
 
         # Ensure all requested IDs are present
         found_ids = {row["order_item_id"] for row in rows}
         missing_ids = [oid for oid in order_item_ids_int if oid not in found_ids]
         if missing_ids:
-            return bad_request("some order_item_ids do not belong to this order")
+            raise WriteAborted("some order_item_ids do not belong to this order")
 
         # Filter out items already returned
         items_to_return = [row for row in rows if row["is_return"] == 0]
 
         if not items_to_return:
             # Nothing new to return
-            return jsonify({"success": True, "returned_items": []}), 200
-
-        try:
-            # 3. Mark items as returned
-            cur.execute(
-                f"""
-                UPDATE order_item
-                SET is_return = 1
-                WHERE order_id = ?
-                  AND order_item_id IN ({placeholders});
-                """,
-                params,
+            return []
+
+        # 3. Mark items as returned
+        cur.execute(
+            f"""
+            UPDATE order_item
+            SET is_return = 1
+            WHERE order_id = ?
+              AND order_item_id IN ({placeholders});
+            """,
+            params,
+        )
+
+        # 4. Add stock back in Store_Inventory for each item
+        for row in items_to_return:
+            adjust_stock(
+                cur, store_id, row["product_id"], row["quantity"], REASON_RETURN, order_id
             )
 
-            # 4. Add stock back in Store_Inventory for each item
-            for row in items_to_return:
-                cur.execute(
-                    """
-                    UPDATE store_inventory
-                    SET stock = stock + ?
-                    WHERE store_id = ?
-                      AND product_id = ?;
-                    """,
-                    (row["quantity"], store_id, row["product_id"]),
-                )
-
-            conn.commit()
-
-        except sqlite3.Error as e:
-            conn.rollback()
-            return bad_request(f"database error during return: {e}")
-
-        returned_items_payload = [
+        return [
             {
                 "order_item_id": row["order_item_id"],
                 "product_id": row["product_id"],
@@ -422,12 +365,16 @@ def return_order_items(order_id: int):
             for row in items_to_return
         ]
 
-        return jsonify(
-            {
-                "success": True,
-                "returned_items": returned_items_payload,
-            }
-        ), 200
-
+    try:
+        returned_items_payload = run_write(apply_return, shard=shard_for_id(order_id))
+    except WriteAborted as e:
+        return bad_request(e.message, status_code=e.status_code)
     except sqlite3.Error as e:
-        return bad_request(f"database error: {e}")
+        return bad_request(f"database error during return: {e}")
+
+    return jsonify(
+        {
+            "success": True,
+            "returned_items": returned_items_payload,
+        }
+    ), 200
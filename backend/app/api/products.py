@@ -1,5 +1,9 @@
-from flask import Blueprint, request, jsonify
-from ..db import get_db
+from flask import Blueprint, current_app, request, jsonify, send_file
+from ..catalog import catalog_facets, parse_catalog_filters, query_catalog
+from ..db import get_db, shard_for_store
+from ..geo import zip_location
+from ..images import IMAGE_FORMATS, IMAGE_VARIANTS
+from ..reservations import available_stock, reservation_book
 import sqlite3
 
 bp = Blueprint("products", __name__)
@@ -44,7 +48,7 @@ def get_product_for_store():
         return bad_request("store_id and product_id must be integers")
 
     try:
-        conn = get_db()
+        conn = get_db(readonly=True, shard=shard_for_store(store_id_int))
         cur = conn.cursor()
 
         cur.execute(
@@ -55,7 +59,7 @@ def get_product_for_store():
                 p.category,
                 p.price,
                 p.img_url,
-                si.stock
+                si.stock AS stock
             FROM Products AS p
             JOIN Store_Inventory AS si
               ON si.product_id = p.product_id
@@ -70,13 +74,16 @@ def get_product_for_store():
             # No matching product for this store
             return bad_request("product not found for this store", status_code=404)
 
+        book = reservation_book()
+        held = book.held_by_product(store_id_int) if book is not None else {}
+
         result = {
             "product_id": row["product_id"],
             "product_name": row["product_name"],
             "category": row["category"],
             "price": row["price"],
             "img_url": row["img_url"],
-            "stock": row["stock"],
+            "stock": available_stock(row["stock"], held, row["product_id"]),
         }
 
         return jsonify(result), 200
@@ -109,9 +116,20 @@ def search_products_for_store():
         },
         ...
       ]
+
+    Takes the same filters, sort, paging and facets=1 as
+    /api/stores/products.
+
+    mode=fuzzy matches misspelled names through the in-memory trigram
+    index (app/search.py) instead of LIKE; items are ranked by similarity
+    (unless sort is given) and carry a score.
     """
     q = request.args.get("q", "")
     store_id = request.args.get("store_id")
+    mode = request.args.get("mode", "substring")
+
+    if mode not in ("substring", "fuzzy"):
+        return bad_request("mode must be substring or fuzzy")
 
     if store_id is None:
         return bad_request("store_id is required")
@@ -127,31 +145,49 @@ def search_products_for_store():
         return bad_request("store_id must be an integer")
 
     try:
-        conn = get_db()
+        filters = parse_catalog_filters(request.args)
+    except ValueError as e:
+        return bad_request(str(e))
+
+    try:
+        conn = get_db(readonly=True, shard=shard_for_store(store_id_int))
         cur = conn.cursor()
 
-        # Use LIKE with wildcards for substring match
-        like_pattern = f"%{q}%"
+        if mode == "fuzzy":
+            # Every match above the threshold: store, category, stock and
+            # price filters apply before ranking and paging, so total counts
+            # all of them
+            matches = dict(
+                current_app.extensions["product_search_index"].get().search(
+                    q, threshold=current_app.config["SEARCH_FUZZY_THRESHOLD"], limit=None
+                )
+            )
+            # Fetch every match, then rank and page by score here
+            rows, total = query_catalog(
+                cur, store_id_int, {**filters, "limit": None, "offset": 0}, product_ids=matches
+            )
+            if "sort" not in request.args:
+                rows.sort(key=lambda row: (-matches[row["product_id"]], row["product_id"]))
+            end = filters["offset"] + filters["limit"] if filters["limit"] is not None else None
+            rows = rows[filters["offset"]:end]
+            facets = (
+                catalog_facets(cur, store_id_int, filters, product_ids=matches)
+                if filters["facets"] else None
+            )
+        else:
+            # Use LIKE with wildcards for substring match
+            like_pattern = f"%{q}%"
 
-        cur.execute(
-            """
-            SELECT 
-                p.product_id,
-                p.product_name,
-                p.category,
-                p.price,
-                p.img_url,
-                si.stock
-            FROM Store_Inventory AS si
-            JOIN Products AS p
-              ON si.product_id = p.product_id
-            WHERE si.store_id = ?
-              AND p.product_name LIKE ?;
-            """,
-            (store_id_int, like_pattern),
-        )
+            rows, total = query_catalog(cur, store_id_int, filters, name_like=like_pattern)
+            facets = (
+                catalog_facets(cur, store_id_int, filters, name_like=like_pattern)
+                if filters["facets"] else None
+            )
+            matches = None
 
-        rows = cur.fetchall()
+        # Stock held by live cart reservations is not available
+        book = reservation_book()
+        held = book.held_by_product(store_id_int) if book is not None else {}
 
         products = [
             {
@@ -160,12 +196,257 @@ def search_products_for_store():
                 "category": row["category"],
                 "price": row["price"],
                 "img_url": row["img_url"],
-                "stock": row["stock"],
+                "stock": available_stock(row["stock"], held, row["product_id"]),
             }
             for row in rows
         ]
+        if matches is not None:
+            for product in products:
+                product["score"] = matches[product["product_id"]]
+
+        if facets is not None:
+            response = jsonify({"items": products, "total": total, "facets": facets})
+        else:
+            response = jsonify(products)
+        response.headers["X-Total-Count"] = str(total)
+        return response, 200
+
+    except sqlite3.Error as e:
+        return bad_request(f"database error: {e}")
+
+
+# -------------------------------------------------
+# GET /api/products/autocomplete?store_id=X&prefix=sno[&limit=10&in_stock=1]
+# -------------------------------------------------
+
+@bp.get("/autocomplete")
+def autocomplete_products():
+    """
+    GET /api/products/autocomplete?store_id=X&prefix=sno&limit=10&in_stock=1
+
+    Suggestions for the search box from an in-memory index (app/search.py):
+    products of the store whose name, or any word of it, starts with
+    prefix, best sellers at that store first. in_stock=1 hides products
+    that are out of stock.
+
+    Returns: [{ product_id, product_name, stock, total_sold }]
+    """
+    store_id = request.args.get("store_id")
+    prefix = request.args.get("prefix", "")
+
+    if store_id is None:
+        return bad_request("store_id is required")
+
+    try:
+        store_id_int = int(store_id)
+        limit = int(request.args.get("limit", 10))
+    except ValueError:
+        return bad_request("store_id and limit must be integers")
+
+    if limit <= 0:
+        return bad_request("limit must be positive")
+
+    in_stock = request.args.get("in_stock", "0").lower() in ("1", "true", "yes")
+
+    try:
+        suggestions = current_app.extensions["autocomplete_index"].suggest(
+            store_id_int, prefix, limit=min(limit, 50), in_stock=in_stock
+        )
+    except sqlite3.Error as e:
+        return bad_request(f"database error: {e}")
+
+    return jsonify(suggestions), 200
+
+
+# -------------------------------------------------
+# GET /api/products/<product_id>/image?size=card[&format=webp]
+# -------------------------------------------------
+
+@bp.get("/<int:product_id>/image")
+def get_product_image(product_id: int):
+    """
+    GET /api/products/<product_id>/image?size=thumb|card|full&format=jpeg|webp
+
+    Serves a variant pre-built by util/build_images.py (size defaults to
+    card). Without format, WebP is sent to clients that accept it.
+    Responses carry a strong ETag and Cache-Control max-age, answer
+    If-None-Match with 304 and honour Range requests.
+    """
+    size = request.args.get("size", "card")
+    if size not in IMAGE_VARIANTS:
+        return bad_request(f"size must be one of {', '.join(IMAGE_VARIANTS)}")
+
+    fmt = request.args.get("format")
+    negotiated = fmt is None
+    if negotiated:
+        fmt = "webp" if "image/webp" in request.headers.get("Accept", "") else "jpeg"
+    if fmt not in IMAGE_FORMATS:
+        return bad_request(f"format must be one of {', '.join(IMAGE_FORMATS)}")
+
+    try:
+        conn = get_db(readonly=True)
+        cur = conn.cursor()
+        cur.execute("SELECT img_url FROM Products WHERE product_id = ?;", (product_id,))
+        row = cur.fetchone()
+    except sqlite3.Error as e:
+        return bad_request(f"database error: {e}")
+
+    if row is None:
+        return bad_request("product not found", status_code=404)
+
+    found = current_app.extensions["image_store"].lookup(row["img_url"], size, fmt)
+    if found is None:
+        return bad_request("image not built for this product", status_code=404)
+
+    path, etag = found
+    response = send_file(
+        path,
+        mimetype=IMAGE_FORMATS[fmt][1],
+        conditional=True,
+        etag=etag,
+        max_age=current_app.config["IMAGE_CACHE_MAX_AGE"],
+    )
+    if negotiated:
+        response.vary.add("Accept")
+    return response
+
+
+# -------------------------------------------------
+# GET /api/products/<product_id>/availability[?zip=15213&in_stock=1]
+# -------------------------------------------------
+
+@bp.get("/<int:product_id>/availability")
+def get_product_availability(product_id: int):
+    """
+    GET /api/products/<product_id>/availability?zip=15213&in_stock=1&limit=N
+
+    Stock of one product at every store that carries it, from the
+    in-memory availability index (app/availability.py). With zip, the
+    nearest stores come first and each has distance_miles; otherwise the
+    stores with the most stock come first. in_stock=1 leaves out stores
+    that have none.
+
+    Returns: { product_id, stores: [{ store_id, store_name, city, state,
+               zip, stock, distance_miles }] }
+    """
+    near_zip = request.args.get("zip")
+    if near_zip is not None and zip_location(near_zip) is None:
+        return bad_request("unknown zip code")
+
+    try:
+        limit = int(request.args["limit"]) if request.args.get("limit") else None
+    except ValueError:
+        return bad_request("limit must be an integer")
+    if limit is not None and limit <= 0:
+        return bad_request("limit must be positive")
 
-        return jsonify(products), 200
+    in_stock = request.args.get("in_stock", "0").lower() in ("1", "true", "yes")
 
+    try:
+        stores = current_app.extensions["availability_index"].stores_for(product_id, near_zip)
+        if not stores:
+            conn = get_db(readonly=True)
+            cur = conn.cursor()
+            cur.execute("SELECT 1 FROM Products WHERE product_id = ?;", (product_id,))
+            if cur.fetchone() is None:
+                return bad_request("product not found", status_code=404)
     except sqlite3.Error as e:
         return bad_request(f"database error: {e}")
+
+    book = reservation_book()
+    if book is not None:
+        for store in stores:
+            held = book.held_by_product(store["store_id"])
+            store["stock"] = available_stock(store["stock"], held, product_id)
+
+    if in_stock:
+        stores = [store for store in stores if (store["stock"] or 0) > 0]
+    if limit is not None:
+        stores = stores[:limit]
+
+    return jsonify({"product_id": product_id, "stores": stores}), 200
+
+
+# -------------------------------------------------
+# GET /api/products/<product_id>/related?store_id=X[&limit=10]
+# -------------------------------------------------
+
+@bp.get("/<int:product_id>/related")
+def get_related_products(product_id: int):
+    """
+    GET /api/products/<product_id>/related?store_id=X&limit=10
+
+    Products most often bought together with this one, from the
+    precomputed product_related table (app/recommendations.py), limited
+    to the ones in stock at the store.
+
+    Returns:
+      [
+        { product_id, product_name, category, price, img_url, stock,
+          orders_together, confidence }
+      ]
+    """
+    store_id = request.args.get("store_id")
+    if store_id is None:
+        return bad_request("store_id is required")
+
+    try:
+        store_id_int = int(store_id)
+        limit = int(request.args.get("limit") or 10)
+    except ValueError:
+        return bad_request("store_id and limit must be integers")
+    if limit <= 0:
+        return bad_request("limit must be positive")
+
+    try:
+        conn = get_db(readonly=True, shard=shard_for_store(store_id_int))
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT
+                p.product_id,
+                p.product_name,
+                p.category,
+                p.price,
+                p.img_url,
+                si.stock AS stock,
+                r.orders_together,
+                r.confidence
+            FROM product_related AS r
+            JOIN Products AS p
+              ON p.product_id = r.related_product_id
+            JOIN Store_Inventory AS si
+              ON si.store_id = ?
+             AND si.product_id = r.related_product_id
+            WHERE r.product_id = ?
+              AND si.stock > 0
+            ORDER BY r.rank;
+            """,
+            (store_id_int, product_id),
+        )
+        rows = cur.fetchall()
+    except sqlite3.Error as e:
+        return bad_request(f"database error: {e}")
+
+    book = reservation_book()
+    held = book.held_by_product(store_id_int) if book is not None else {}
+
+    related = []
+    for row in rows:
+        stock = available_stock(row["stock"], held, row["product_id"])
+        if stock <= 0:
+            continue
+        related.append({
+            "product_id": row["product_id"],
+            "product_name": row["product_name"],
+            "category": row["category"],
+            "price": row["price"],
+            "img_url": row["img_url"],
+            "stock": stock,
+            "orders_together": row["orders_together"],
+            "confidence": row["confidence"],
+        })
+        if len(related) == limit:
+            break
+
+    return jsonify(related), 200
@@ -1,16 +1,75 @@
-from flask import Blueprint, request, jsonify
-from ..db import get_db
+from flask import Blueprint, current_app, request, jsonify
+from ..db import get_db, query_all, WriteAborted
+from ..health import classify_sql, health_report_sql, HEALTH_BUCKETS
+from ..reorder import REORDER_SORTS
+from ..sales import series_periods, window_start, SALES_WINDOWS, SERIES_PERIODS
+from ..sketches import HyperLogLog, QuantileSketch, HLL_PRECISION, QUANTILE_ACCURACY
+from datetime import date, datetime, timedelta, timezone
+import json
+import math
 import sqlite3
 
 bp = Blueprint("stats", __name__)
 
+EPOCH = date(1970, 1, 1)
+
+# Most buckets one /revenue/series response may have per series
+SERIES_MAX_PERIODS = 10000
+
+SERIES_GROUPS = {"store": "o.store_id", "state": "s.state", "category": "p.category"}
+
+SKETCH_GROUPS = ("store", "day")
+
 
 def bad_request(message: str, status_code: int = 400):
     return jsonify({"error": message}), status_code
 
 
+def sum_by(rows, key_fields, sum_fields):
+    """
+    Merge rows sharing the same key_fields by adding up sum_fields.
+
+    On a single database the grouped queries below already return one row
+    per key and this is a no-op. With sharding, query_all returns one
+    partial row per key from every shard and this combines them.
+    """
+    merged = {}
+    for row in rows:
+        key = tuple(row[field] for field in key_fields)
+        if key not in merged:
+            merged[key] = dict(row)
+            continue
+        for field in sum_fields:
+            merged[key][field] = (merged[key][field] or 0) + (row[field] or 0)
+    return list(merged.values())
+
+
+def analytics_snapshot():
+    """
+    The columnar snapshot (app/analytics.py) when ANALYTICS_ENGINE is on
+    and its first export is done, else None and the endpoints below
+    aggregate in SQL.
+    """
+    engine = current_app.extensions.get("analytics_engine")
+    return engine.current() if engine is not None else None
+
+
+def products_by_id(product_ids) -> dict:
+    """{ product_id: row } with product_name, category, price, img_url."""
+    cur = get_db(readonly=True).cursor()
+    cur.execute(
+        """
+        SELECT product_id, product_name, category, price, img_url
+        FROM products
+        WHERE product_id IN (SELECT value FROM json_each(?));
+        """,
+        (json.dumps(list(product_ids)),),
+    )
+    return {row["product_id"]: row for row in cur.fetchall()}
+
+
 # -------------------------------------------------
-# GET /api/stats/top-sellers?limit=10
+# GET /api/stats/top-sellers?limit=10[&window=7d&store_id=X]
 # Returns top N products by units sold
 # -------------------------------------------------
 
@@ -22,6 +81,16 @@ def top_sellers():
     Returns top N products by total units sold across all stores.
     Query params:
       - limit: number of products to return (default 10)
+      - window: 1d | 7d | 30d | all (default all); days are UTC, today included
+      - store_id: rank one store's sales only
+
+    With window or store_id the ranking comes from the cached sales_daily
+    rankings (app/sales.py, refreshed every TOP_SELLERS_REFRESH_INTERVAL
+    seconds, at most TOP_SELLERS_CACHE_SIZE products). So does the
+    all-time ranking with sharding, since the top N of every shard do not
+    add up to the overall top N; beyond the cache size every shard's
+    totals are merged. Until the cache's first refresh these are
+    answered from order_item.
     
     Returns: [{ product_id, product_name, total_sold }]
     """
@@ -33,36 +102,83 @@ def top_sellers():
             limit = 10
     except ValueError:
         limit = 10
+
+    window = request.args.get("window", "all")
+    if window not in SALES_WINDOWS:
+        return bad_request(f"window must be one of {', '.join(SALES_WINDOWS)}")
+
+    store_id = request.args.get("store_id")
+    if store_id is not None:
+        try:
+            store_id = int(store_id)
+        except ValueError:
+            return bad_request("store_id must be an integer")
     
     try:
-        conn = get_db()
-        cur = conn.cursor()
-        
-        cur.execute(
-            """
-            SELECT 
-                p.product_id,
-                p.product_name,
-                p.category,
-                p.price,
-                p.img_url,
-                SUM(oi.quantity) as total_sold
-            FROM order_item AS oi
-            JOIN products AS p
-              ON oi.product_id = p.product_id
-            JOIN "order" AS o
-              ON oi.order_id = o.order_id
-            WHERE o.status = 'complete'
-              AND oi.is_return = 0
-            GROUP BY p.product_id, p.product_name, p.category, p.price, p.img_url
-            ORDER BY total_sold DESC
-            LIMIT ?;
-            """,
-            (limit,),
-        )
-        
-        rows = cur.fetchall()
-        
+        columnar = analytics_snapshot()
+        cache = current_app.extensions["top_seller_cache"]
+        sharded = current_app.extensions.get("shard_router") is not None
+        ranking = None
+        if window != "all" or store_id is not None or (
+            sharded and columnar is None and limit <= cache.size
+        ):
+            # None until the cache's first refresh: query order_item below
+            ranking = cache.top(window, store_id, limit=None)
+
+        if ranking is not None:
+            products = products_by_id(pid for pid, _ in ranking)
+            rows = [
+                dict(products[pid], total_sold=sold)
+                for pid, sold in ranking if pid in products
+            ][:limit]
+        elif columnar is not None and window == "all" and store_id is None:
+            totals = columnar.top_sellers()
+            products = products_by_id(pid for pid, _ in totals)
+            rows = [
+                dict(products[pid], total_sold=sold)
+                for pid, sold in totals if pid in products
+            ][:limit]
+        else:
+            where, params = [], []
+            start = window_start(window)
+            if start is not None:
+                where.append("AND o.order_datetime >= ?")
+                params.append(start)
+            if store_id is not None:
+                where.append("AND o.store_id = ?")
+                params.append(store_id)
+            if not sharded:
+                params.append(limit)
+            rows = query_all(
+                f"""
+                SELECT
+                    p.product_id,
+                    p.product_name,
+                    p.category,
+                    p.price,
+                    p.img_url,
+                    SUM(oi.quantity) as total_sold
+                FROM order_item AS oi
+                JOIN products AS p
+                  ON oi.product_id = p.product_id
+                JOIN "order" AS o
+                  ON oi.order_id = o.order_id
+                WHERE o.status = 'complete'
+                  AND oi.is_return = 0
+                  {" ".join(where)}
+                GROUP BY p.product_id, p.product_name, p.category, p.price, p.img_url
+                ORDER BY total_sold DESC, p.product_id
+                {"" if sharded else "LIMIT ?"};
+                """,
+                tuple(params),
+                snapshot=True,
+            )
+
+            if sharded:
+                rows = sum_by(rows, ("product_id",), ("total_sold",))
+                rows.sort(key=lambda row: (-(row["total_sold"] or 0), row["product_id"]))
+                rows = rows[:limit]
+
         if not rows:
             # No sales data yet - return empty array
             return jsonify([]), 200
@@ -100,30 +216,38 @@ def best_region():
     Returns: [{ store_id, state, city, total_revenue, order_count }]
     """
     try:
-        conn = get_db()
-        cur = conn.cursor()
-        
-        cur.execute(
-            """
-            SELECT 
-                s.store_id,
-                s.state,
-                s.city,
-                COUNT(DISTINCT o.order_id) as order_count,
-                COALESCE(SUM(oi.quantity * oi.unit_price), 0) as total_revenue
-            FROM store AS s
-            LEFT JOIN "order" AS o
-              ON o.store_id = s.store_id
-             AND o.status = 'complete'
-            LEFT JOIN order_item AS oi
-              ON o.order_id = oi.order_id
-             AND oi.is_return = 0
-            GROUP BY s.store_id, s.state, s.city
-            ORDER BY total_revenue DESC;
-            """
-        )
-        
-        rows = cur.fetchall()
+        columnar = analytics_snapshot()
+        if columnar is not None:
+            by_store = columnar.store_revenue()
+            stores = get_db(readonly=True).execute("SELECT store_id, state, city FROM store;").fetchall()
+            rows = [
+                dict(store, **dict(zip(("order_count", "total_revenue"), by_store.get(store["store_id"], (0, 0.0)))))
+                for store in stores
+            ]
+        else:
+            rows = query_all(
+                """
+                SELECT
+                    s.store_id,
+                    s.state,
+                    s.city,
+                    COUNT(DISTINCT o.order_id) as order_count,
+                    COALESCE(SUM(oi.quantity * oi.unit_price), 0) as total_revenue
+                FROM store AS s
+                LEFT JOIN "order" AS o
+                  ON o.store_id = s.store_id
+                 AND o.status = 'complete'
+                LEFT JOIN order_item AS oi
+                  ON o.order_id = oi.order_id
+                 AND oi.is_return = 0
+                GROUP BY s.store_id, s.state, s.city
+                ORDER BY total_revenue DESC;
+                """,
+                snapshot=True,
+            )
+            rows = sum_by(rows, ("store_id",), ("order_count", "total_revenue"))
+
+        rows.sort(key=lambda row: row["total_revenue"] or 0, reverse=True)
         
         if not rows:
             return jsonify([]), 200
@@ -160,24 +284,25 @@ def overview():
     Returns: { total_revenue, total_orders, total_products_sold }
     """
     try:
-        conn = get_db()
-        cur = conn.cursor()
-        
-        cur.execute(
-            """
-            SELECT 
-                COUNT(DISTINCT o.order_id) as total_orders,
-                COALESCE(SUM(oi.quantity * oi.unit_price), 0) as total_revenue,
-                COALESCE(SUM(oi.quantity), 0) as total_products_sold
-            FROM "order" AS o
-            LEFT JOIN order_item AS oi
-              ON o.order_id = oi.order_id
-             AND oi.is_return = 0
-            WHERE o.status = 'complete';
-            """
-        )
-        
-        row = cur.fetchone()
+        columnar = analytics_snapshot()
+        if columnar is not None:
+            row = columnar.overview()
+        else:
+            rows = query_all(
+                """
+                SELECT
+                    COUNT(DISTINCT o.order_id) as total_orders,
+                    COALESCE(SUM(oi.quantity * oi.unit_price), 0) as total_revenue,
+                    COALESCE(SUM(oi.quantity), 0) as total_products_sold
+                FROM "order" AS o
+                LEFT JOIN order_item AS oi
+                  ON o.order_id = oi.order_id
+                 AND oi.is_return = 0
+                WHERE o.status = 'complete';
+                """,
+                snapshot=True,
+            )
+            row = sum_by(rows, (), ("total_orders", "total_revenue", "total_products_sold"))[0]
         
         result = {
             "total_revenue": float(row["total_revenue"]) if row["total_revenue"] else 0.0,
@@ -212,25 +337,38 @@ def revenue_daily():
         return bad_request("date_start and date_end are required (format: YYYY-MM-DD)")
     
     try:
-        conn = get_db()
-        cur = conn.cursor()
-        
-        cur.execute(
-            """
-            SELECT 
-                DATE(o.order_datetime) as date,
-                COUNT(o.order_id) as order_count,
-                SUM(o.total_price) as revenue
-            FROM "order" AS o
-            WHERE o.status = 'complete'
-              AND DATE(o.order_datetime) BETWEEN ? AND ?
-            GROUP BY DATE(o.order_datetime)
-            ORDER BY date ASC;
-            """,
-            (date_start, date_end),
-        )
-        
-        rows = cur.fetchall()
+        columnar = analytics_snapshot()
+        try:
+            first_day = (date.fromisoformat(date_start) - EPOCH).days
+            last_day = (date.fromisoformat(date_end) - EPOCH).days
+        except ValueError:
+            # Not ISO dates: leave the string comparison to SQL
+            columnar = None
+
+        if columnar is not None:
+            rows = [
+                {"date": (EPOCH + timedelta(days=day)).isoformat(), "order_count": count, "revenue": revenue}
+                for day, count, revenue in columnar.revenue_daily(first_day, last_day)
+            ] if first_day <= last_day else []
+        else:
+            rows = query_all(
+                """
+                SELECT
+                    DATE(o.order_datetime) as date,
+                    COUNT(o.order_id) as order_count,
+                    SUM(o.total_price) as revenue
+                FROM "order" AS o
+                WHERE o.status = 'complete'
+                  AND o.order_datetime >= ?
+                  AND o.order_datetime < DATE(?, '+1 day')
+                GROUP BY DATE(o.order_datetime)
+                ORDER BY date ASC;
+                """,
+                (date_start, date_end),
+                snapshot=True,
+            )
+            rows = sum_by(rows, ("date",), ("order_count", "revenue"))
+            rows.sort(key=lambda row: row["date"])
         
         daily_stats = [
             {
@@ -247,6 +385,299 @@ def revenue_daily():
         return bad_request(f"database error: {e}")
 
 
+# -------------------------------------------------
+# GET /api/stats/revenue/series?date_start=..&date_end=..&granularity=day
+# Revenue per hour/day/week/month, gaps filled with zeros
+# -------------------------------------------------
+
+def _series_bound(value: str, name: str, end: bool = False) -> datetime:
+    # A bare date as date_end includes that whole day. An offset (+02:00,
+    # Z) is converted to naive UTC, like order_datetime.
+    try:
+        if len(value) == 10:
+            bound = datetime.strptime(value, "%Y-%m-%d")
+            return bound + timedelta(days=1) if end else bound
+        bound = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be YYYY-MM-DD or YYYY-MM-DD HH:MM[:SS][+HH:MM]")
+    if bound.tzinfo is not None:
+        bound = bound.astimezone(timezone.utc).replace(tzinfo=None)
+    return bound
+
+
+@bp.get("/revenue/series")
+def revenue_series():
+    """
+    GET /api/stats/revenue/series?date_start=2025-11-01&date_end=2025-11-30
+        &granularity=hour|day|week|month&group_by=store|state|category
+        &store_id=X&state=PA,NY&category=Birds
+
+    Revenue (completed orders, returned lines excluded) and order counts
+    per period between date_start and date_end (UTC, times with an offset
+    are converted; a bare date_end includes that day). Orders are selected with a range on the indexed
+    order_datetime, so only rows inside the range are read. Weeks start
+    on Monday. Every period in the range is present, with zeros when
+    nothing sold; with group_by there is one series per store, state or
+    category (an order with lines in two categories counts in both).
+
+    Returns: { granularity, group_by, date_start, date_end, periods: [label],
+               series: [{ key, revenue: [..], order_count: [..] }] }
+    """
+    granularity = request.args.get("granularity", "day")
+    if granularity not in SERIES_PERIODS:
+        return bad_request(f"granularity must be one of {', '.join(SERIES_PERIODS)}")
+
+    group_by = request.args.get("group_by")
+    if group_by is not None and group_by not in SERIES_GROUPS:
+        return bad_request(f"group_by must be one of {', '.join(SERIES_GROUPS)}")
+
+    if not request.args.get("date_start") or not request.args.get("date_end"):
+        return bad_request("date_start and date_end are required (format: YYYY-MM-DD)")
+    try:
+        start = _series_bound(request.args["date_start"], "date_start")
+        end = _series_bound(request.args["date_end"], "date_end", end=True)
+    except ValueError as e:
+        return bad_request(str(e))
+    if end <= start:
+        return bad_request("date_end must not be before date_start")
+
+    periods = series_periods(start, end, granularity)
+    if len(periods) > SERIES_MAX_PERIODS:
+        return bad_request(f"too many {granularity} periods; use a coarser granularity or a shorter range")
+
+    where = [
+        "o.status = 'complete'",
+        "o.order_datetime >= ?",
+        "o.order_datetime < ?",
+    ]
+    params = [start.strftime("%Y-%m-%d %H:%M:%S"), end.strftime("%Y-%m-%d %H:%M:%S")]
+
+    store_id = request.args.get("store_id")
+    if store_id is not None:
+        try:
+            params.append(int(store_id))
+        except ValueError:
+            return bad_request("store_id must be an integer")
+        where.append("o.store_id = ?")
+
+    states = [v.strip() for v in request.args.get("state", "").split(",") if v.strip()]
+    if states:
+        where.append(f"s.state IN ({', '.join('?' * len(states))})")
+        params.extend(states)
+
+    categories = [v.strip() for v in request.args.get("category", "").split(",") if v.strip()]
+    if categories:
+        where.append(f"p.category IN ({', '.join('?' * len(categories))})")
+        params.extend(categories)
+
+    by_category = bool(categories) or group_by == "category"
+    joins = [
+        # Inner join when lines are filtered or grouped by category
+        f"{'' if by_category else 'LEFT '}JOIN order_item AS oi ON oi.order_id = o.order_id AND oi.is_return = 0"
+    ]
+    if by_category:
+        joins.append("JOIN products AS p ON p.product_id = oi.product_id")
+    if states or group_by == "state":
+        joins.append("JOIN store AS s ON s.store_id = o.store_id")
+
+    try:
+        rows = query_all(
+            f"""
+            SELECT
+                {SERIES_PERIODS[granularity]} AS period,
+                {SERIES_GROUPS[group_by] if group_by else "NULL"} AS series_key,
+                COUNT(DISTINCT o.order_id) AS order_count,
+                COALESCE(SUM(oi.quantity * oi.unit_price), 0) AS revenue
+            FROM "order" AS o
+            {" ".join(joins)}
+            WHERE {" AND ".join(where)}
+            GROUP BY period, series_key;
+            """,
+            params,
+            snapshot=True,
+        )
+    except sqlite3.Error as e:
+        return bad_request(f"database error: {e}")
+
+    rows = sum_by(rows, ("period", "series_key"), ("order_count", "revenue"))
+
+    index = {label: i for i, label in enumerate(periods)}
+    series = {}
+    if group_by is None:
+        series[None] = {"key": None, "revenue": [0.0] * len(periods), "order_count": [0] * len(periods)}
+    for row in rows:
+        i = index.get(row["period"])
+        if i is None:
+            continue
+        entry = series.setdefault(row["series_key"], {
+            "key": row["series_key"],
+            "revenue": [0.0] * len(periods),
+            "order_count": [0] * len(periods),
+        })
+        entry["revenue"][i] = round(float(row["revenue"] or 0), 2)
+        entry["order_count"][i] = row["order_count"]
+
+    return jsonify({
+        "granularity": granularity,
+        "group_by": group_by,
+        "date_start": start.strftime("%Y-%m-%d %H:%M:%S"),
+        "date_end": end.strftime("%Y-%m-%d %H:%M:%S"),
+        "periods": periods,
+        "series": sorted(series.values(), key=lambda entry: str(entry["key"])),
+    }), 200
+
+
+# -------------------------------------------------
+# Order sketches (app/sketches.py): approximate distinct customers and
+# order-value percentiles per day and store, merged per request
+# -------------------------------------------------
+
+def _order_sketch_groups():
+    """
+    Parse date_start / date_end / store_id / group_by and load the matching
+    order_sketch rows, grouped. Returns (groups, filters) where groups is
+    { key: [row] } (key None without group_by), or (None, error response).
+    """
+    date_start = request.args.get("date_start")
+    date_end = request.args.get("date_end")
+    try:
+        for value in (date_start, date_end):
+            if value is not None:
+                date.fromisoformat(value)
+    except ValueError:
+        return None, bad_request("date_start and date_end must be YYYY-MM-DD")
+
+    group_by = request.args.get("group_by")
+    if group_by is not None and group_by not in SKETCH_GROUPS:
+        return None, bad_request(f"group_by must be one of {', '.join(SKETCH_GROUPS)}")
+
+    where, params = [], []
+    if date_start is not None:
+        where.append("day >= ?")
+        params.append(date_start)
+    if date_end is not None:
+        where.append("day <= ?")
+        params.append(date_end)
+    store_id = request.args.get("store_id")
+    if store_id is not None:
+        try:
+            store_id = int(store_id)
+        except ValueError:
+            return None, bad_request("store_id must be an integer")
+        where.append("store_id = ?")
+        params.append(store_id)
+
+    try:
+        # Read-only: built with the schema, kept current by checkout
+        rows = query_all(
+            f"""
+            SELECT day, store_id, orders, customers, order_values
+            FROM order_sketch
+            {"WHERE " + " AND ".join(where) if where else ""};
+            """,
+            params,
+            snapshot=True,
+        )
+    except sqlite3.Error as e:
+        return None, bad_request(f"database error: {e}")
+
+    field = {"store": "store_id", "day": "day"}.get(group_by)
+    groups = {}
+    for row in rows:
+        groups.setdefault(row[field] if field else None, []).append(row)
+    if not groups and group_by is None:
+        groups[None] = []
+
+    return groups, {
+        "date_start": date_start,
+        "date_end": date_end,
+        "store_id": store_id,
+        "group_by": group_by,
+    }
+
+
+def _with_groups(filters: dict, groups: dict, summarize) -> dict:
+    # One merged total, plus one entry per key with group_by
+    result = {**filters, **summarize([row for rows in groups.values() for row in rows])}
+    if filters["group_by"] is not None:
+        result["groups"] = [
+            {"key": key, **summarize(groups[key])} for key in sorted(groups)
+        ]
+    return result
+
+
+# -------------------------------------------------
+# GET /api/stats/distinct-customers?date_start=..&date_end=..&store_id=X&group_by=store|day
+# Approximate distinct customers with completed orders
+# -------------------------------------------------
+
+@bp.get("/distinct-customers")
+def distinct_customers():
+    """
+    GET /api/stats/distinct-customers?date_start=2025-11-01&date_end=2025-11-30
+
+    Approximate number of distinct customers with completed orders in the
+    range (UTC days, inclusive; all time by default), from the merged
+    HyperLogLog sketches of every matching day and store. Cost depends on
+    the number of days x stores, not on the number of orders.
+    Optional: store_id, group_by=store|day (one estimate per key as well).
+
+    Returns: { date_start, date_end, store_id, group_by, orders,
+               distinct_customers, standard_error, groups?: [...] }
+    """
+    groups, filters = _order_sketch_groups()
+    if groups is None:
+        return filters
+
+    def summarize(rows):
+        customers = HyperLogLog.union(HyperLogLog.from_bytes(row["customers"]) for row in rows)
+        return {
+            "orders": sum(row["orders"] for row in rows),
+            "distinct_customers": customers.count(),
+        }
+
+    result = _with_groups(filters, groups, summarize)
+    result["standard_error"] = round(1.04 / (1 << HLL_PRECISION) ** 0.5, 4)
+    return jsonify(result), 200
+
+
+# -------------------------------------------------
+# GET /api/stats/order-values?date_start=..&date_end=..&store_id=X&group_by=store|day
+# Approximate p50 / p90 / p99 order value
+# -------------------------------------------------
+
+@bp.get("/order-values")
+def order_values():
+    """
+    GET /api/stats/order-values?date_start=2025-11-01&date_end=2025-11-30
+
+    p50 / p90 / p99 of completed orders' total_price in the range (UTC
+    days, inclusive; all time by default), from the merged order-value
+    sketches; each is within relative_error of the exact value.
+    Optional: store_id, group_by=store|day.
+
+    Returns: { date_start, date_end, store_id, group_by, orders,
+               p50, p90, p99, relative_error, groups?: [...] }
+    """
+    groups, filters = _order_sketch_groups()
+    if groups is None:
+        return filters
+
+    def summarize(rows):
+        values = QuantileSketch()
+        for row in rows:
+            values.merge(QuantileSketch.from_bytes(row["order_values"]))
+        summary = {"orders": values.count}
+        for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+            value = values.quantile(q)
+            summary[name] = round(value, 2) if value is not None else None
+        return summary
+
+    result = _with_groups(filters, groups, summarize)
+    result["relative_error"] = QUANTILE_ACCURACY
+    return jsonify(result), 200
+
+
 # -------------------------------------------------
 # GET /api/stats/return-rate
 # Returns return statistics
@@ -268,61 +699,76 @@ def return_rate():
     }
     """
     try:
-        conn = get_db()
-        cur = conn.cursor()
-        
-        # Overall return statistics
-        cur.execute(
-            """
-            SELECT 
-                SUM(oi.quantity) FILTER (WHERE oi.is_return = 0) as items_sold,
-                SUM(oi.quantity) FILTER (WHERE oi.is_return = 1) as items_returned,
-                SUM(oi.quantity * oi.unit_price) FILTER (WHERE oi.is_return = 1) as revenue_lost
-            FROM order_item AS oi
-            JOIN "order" AS o ON oi.order_id = o.order_id
-            WHERE o.status = 'complete';
-            """
-        )
-        
-        overall = cur.fetchone()
-        
+        columnar = analytics_snapshot()
+        if columnar is not None:
+            returns = columnar.returns()
+            overall = returns
+            products = products_by_id(returns["by_product"])
+            top_returned = [
+                {
+                    "product_id": pid,
+                    "product_name": products[pid]["product_name"],
+                    "img_url": products[pid]["img_url"],
+                    "non_returned_sold": non_returned_sold,
+                    "total_returned": total_returned,
+                    "total_sold": total_sold,
+                }
+                for pid, (non_returned_sold, total_returned, total_sold) in sorted(returns["by_product"].items())
+                if pid in products
+            ]
+        else:
+            # Overall return statistics
+            rows = query_all(
+                """
+                SELECT
+                    SUM(oi.quantity) FILTER (WHERE oi.is_return = 0) as items_sold,
+                    SUM(oi.quantity) FILTER (WHERE oi.is_return = 1) as items_returned,
+                    SUM(oi.quantity * oi.unit_price) FILTER (WHERE oi.is_return = 1) as revenue_lost
+                FROM order_item AS oi
+                JOIN "order" AS o ON oi.order_id = o.order_id
+                WHERE o.status = 'complete';
+                """,
+                snapshot=True,
+            )
+            overall = sum_by(rows, (), ("items_sold", "items_returned", "revenue_lost"))[0]
+
+            # Products with highest return rates
+            # (per-product totals; rate, filter and top 5 are applied after
+            # merging so they stay correct across shards)
+            rows = query_all(
+                """
+                SELECT
+                    p.product_id,
+                    p.product_name,
+                    p.img_url,
+                    COALESCE(SUM(CASE WHEN oi.is_return = 0 THEN oi.quantity ELSE 0 END), 0) as non_returned_sold,
+                    COALESCE(SUM(CASE WHEN oi.is_return = 1 THEN oi.quantity ELSE 0 END), 0) as total_returned,
+                    COALESCE(SUM(oi.quantity), 0) as total_sold
+                FROM order_item AS oi
+                JOIN products AS p ON oi.product_id = p.product_id
+                JOIN "order" AS o ON oi.order_id = o.order_id
+                WHERE o.status = 'complete'
+                GROUP BY p.product_id, p.product_name, p.img_url;
+                """,
+                snapshot=True,
+            )
+            top_returned = sum_by(
+                rows, ("product_id",), ("non_returned_sold", "total_returned", "total_sold")
+            )
+
         total_sold = overall["items_sold"] or 0
         total_returned = overall["items_returned"] or 0
         revenue_lost = float(overall["revenue_lost"]) if overall["revenue_lost"] else 0.0
         return_rate = (total_returned / (total_sold+total_returned) * 100) if total_sold > 0 else 0
-        
-        # Products with highest return rates
-        cur.execute(
-            """
-            SELECT 
-            p.product_id,
-            p.product_name,
-            p.img_url,
-            COALESCE(SUM(CASE WHEN oi.is_return = 0 THEN oi.quantity ELSE 0 END), 0) as non_returned_sold,
-            COALESCE(SUM(CASE WHEN oi.is_return = 1 THEN oi.quantity ELSE 0 END), 0) as total_returned,
-            COALESCE(SUM(oi.quantity), 0) as total_sold,
-            CASE 
-                WHEN COALESCE(SUM(oi.quantity), 0) > 0 
-                THEN ROUND(
-                    CAST(COALESCE(SUM(CASE WHEN oi.is_return = 1 THEN oi.quantity ELSE 0 END), 0) AS FLOAT) 
-                    / COALESCE(SUM(oi.quantity), 0) 
-                    * 100, 
-                    2
-                )
-                ELSE 0
-            END as return_rate
-        FROM order_item AS oi
-        JOIN products AS p ON oi.product_id = p.product_id
-        JOIN "order" AS o ON oi.order_id = o.order_id
-        WHERE o.status = 'complete'
-        GROUP BY p.product_id, p.product_name, p.img_url
-        HAVING COALESCE(SUM(CASE WHEN oi.is_return = 1 THEN oi.quantity ELSE 0 END), 0) > 0
-        ORDER BY return_rate DESC
-        LIMIT 5;
-            """
-        )
-        
-        top_returned = cur.fetchall()
+
+        top_returned = [row for row in top_returned if row["total_returned"] > 0]
+        for row in top_returned:
+            row["return_rate"] = (
+                round(row["total_returned"] / row["total_sold"] * 100, 2)
+                if row["total_sold"] > 0 else 0
+            )
+        top_returned.sort(key=lambda row: row["return_rate"], reverse=True)
+        top_returned = top_returned[:5]
         
         result = {
             "total_items_sold": total_sold,
@@ -348,112 +794,197 @@ def return_rate():
         return bad_request(f"database error: {e}")
 
 
+# -------------------------------------------------
+# GET /api/stats/reorder?lead_time_days=7&cover_days=28&sort=urgency
+# Reorder suggestions per store/product from trailing sales velocity
+# -------------------------------------------------
+
+@bp.get("/reorder")
+def reorder():
+    """
+    GET /api/stats/reorder?limit=50&offset=0
+
+    For every (store, product): units sold over the trailing
+    REORDER_VELOCITY_DAYS (UTC, today included; completed orders net of
+    returns), daily velocity, days of cover at that rate and the quantity
+    to order now so stock lasts lead_time_days plus cover_days (see
+    app/reorder.py). Stock and sales are as of refreshed_at; until the
+    first load after startup the answer is a 503 with Retry-After.
+    Query params:
+      - lead_time_days, cover_days: default REORDER_* config
+      - sort: urgency (fewest days of cover first, default) |
+              reorder_quantity | velocity
+      - store_id: one store only
+      - all=1: include pairs that need no reorder
+      - limit (default 100), offset
+
+    Returns: { days, lead_time_days, cover_days, sort, total, refreshed_at,
+               items: [{ store_id, product_id, product_name, category, stock,
+                         units_sold, daily_velocity, days_of_cover,
+                         reorder_quantity, stockout_before_delivery }] }
+    """
+    config = current_app.config
+    try:
+        lead_time_days = float(request.args.get("lead_time_days", config["REORDER_LEAD_TIME_DAYS"]))
+        cover_days = float(request.args.get("cover_days", config["REORDER_COVER_DAYS"]))
+    except ValueError:
+        return bad_request("lead_time_days and cover_days must be numbers")
+    if not (math.isfinite(lead_time_days) and math.isfinite(cover_days)):
+        return bad_request("lead_time_days and cover_days must be finite")
+    if lead_time_days < 0 or cover_days < 0:
+        return bad_request("lead_time_days and cover_days must not be negative")
+
+    try:
+        limit = int(request.args.get("limit", 100))
+        offset = int(request.args.get("offset", 0))
+    except ValueError:
+        return bad_request("limit and offset must be integers")
+    if limit <= 0 or offset < 0:
+        return bad_request("limit must be positive and offset must not be negative")
+
+    sort = request.args.get("sort", "urgency")
+    if sort not in REORDER_SORTS:
+        return bad_request(f"sort must be one of {', '.join(REORDER_SORTS)}")
+
+    store_id = request.args.get("store_id")
+    if store_id is not None:
+        try:
+            store_id = int(store_id)
+        except ValueError:
+            return bad_request("store_id must be an integer")
+
+    planner = current_app.extensions["reorder_planner"]
+    try:
+        plan = planner.plan(
+            lead_time_days, cover_days, sort=sort, store_id=store_id,
+            include_all=request.args.get("all") == "1",
+        )
+    except ImportError:
+        return bad_request("reorder suggestions need NumPy: pip install -r requirements.txt", 503)
+    except sqlite3.Error as e:
+        return bad_request(f"database error: {e}")
+    if plan is None:
+        # Loaded in the background at startup
+        response, status = bad_request("reorder suggestions are still loading", 503)
+        response.headers["Retry-After"] = "1"
+        return response, status
+
+    page = plan["order"][offset:offset + limit]
+    products = products_by_id(plan["product_id"][page].tolist())
+
+    items = []
+    for i in page.tolist():
+        product = products.get(int(plan["product_id"][i]))
+        cover = float(plan["days_of_cover"][i])
+        items.append({
+            "store_id": int(plan["store_id"][i]),
+            "product_id": int(plan["product_id"][i]),
+            "product_name": product["product_name"] if product else None,
+            "category": product["category"] if product else None,
+            "stock": int(plan["stock"][i]),
+            "units_sold": int(plan["units_sold"][i]),
+            "daily_velocity": round(float(plan["daily_velocity"][i]), 3),
+            "days_of_cover": round(cover, 1) if cover != float("inf") else None,
+            "reorder_quantity": int(plan["reorder_quantity"][i]),
+            "stockout_before_delivery": cover < lead_time_days,
+        })
+
+    return jsonify({
+        "days": planner.days,
+        "lead_time_days": lead_time_days,
+        "cover_days": cover_days,
+        "sort": sort,
+        "total": int(len(plan["order"])),
+        "refreshed_at": planner.refreshed_at,
+        "items": items,
+    }), 200
+
+
 # -------------------------------------------------
 # GET /api/stats/inventory-health
 # Returns inventory health statistics
 # -------------------------------------------------
 
+# Sort order within each bucket (HEALTH_ORDER_SQL in Python), for merging shards
+HEALTH_ORDER = {
+    "out_of_stock": lambda row: (row["product_name"], row["store_id"]),
+    "low_stock": lambda row: (row["stock"], row["product_name"], row["store_id"]),
+    "overstocked": lambda row: (-row["stock"], row["product_name"], row["store_id"]),
+}
+
+
 @bp.get("/inventory-health")
 def inventory_health():
     """
-    GET /api/stats/inventory-health
+    GET /api/stats/inventory-health?bucket=low_stock&limit=50&offset=0
     
-    Returns inventory health statistics.
+    Returns inventory health statistics. Every row is classified in one
+    pass using the thresholds in inventory_threshold (see app/health.py).
+    Query params (all optional):
+      - bucket: only return this bucket's list
+      - limit, offset: page within each bucket (default: everything)
     
     Returns: {
-        out_of_stock: [{ product_id, product_name, store_id, city, state }],
-        low_stock: [{ product_id, product_name, store_id, city, state, stock }],
-        overstocked: [{ product_id, product_name, store_id, city, state, stock }]
+        counts: { out_of_stock, low_stock, overstocked },
+        out_of_stock: [{ product_id, product_name, img_url, store_id, city, state, stock }],
+        low_stock: [...],
+        overstocked: [...]
     }
     """
+    bucket = request.args.get("bucket")
+    if bucket is not None and bucket not in HEALTH_BUCKETS:
+        return bad_request(f"bucket must be one of {', '.join(HEALTH_BUCKETS)}")
+
     try:
-        conn = get_db()
-        cur = conn.cursor()
-        
-        # Out of stock products
-        cur.execute(
-            """
-            SELECT 
-                p.product_id,
-                p.product_name,
-                p.img_url,
-                si.store_id,
-                s.city,
-                s.state,
-                si.stock
-            FROM Store_Inventory AS si
-            JOIN products AS p ON si.product_id = p.product_id
-            JOIN store AS s ON si.store_id = s.store_id
-            WHERE si.stock = 0
-            ORDER BY p.product_name;
-            """
-        )
-        
-        out_of_stock = [
-            {
-                "product_id": row["product_id"],
-                "product_name": row["product_name"],
-                "img_url": row["img_url"],
-                "store_id": row["store_id"],
-                "city": row["city"],
-                "state": row["state"],
-                "stock": row["stock"],
-            }
-            for row in cur.fetchall()
-        ]
-        
-        # Low stock products (< 5 units)
-        cur.execute(
-            """
-            SELECT 
-                p.product_id,
-                p.product_name,
-                p.img_url,
-                si.store_id,
-                s.city,
-                s.state,
-                si.stock
-            FROM Store_Inventory AS si
-            JOIN products AS p ON si.product_id = p.product_id
-            JOIN store AS s ON si.store_id = s.store_id
-            WHERE si.stock > 0 AND si.stock < 5
-            ORDER BY si.stock ASC, p.product_name;
-            """
-        )
-        
-        low_stock = [
-            {
-                "product_id": row["product_id"],
-                "product_name": row["product_name"],
-                "img_url": row["img_url"],
-                "store_id": row["store_id"],
-                "city": row["city"],
-                "state": row["state"],
-                "stock": row["stock"],
-            }
-            for row in cur.fetchall()
-        ]
-        
-        # Overstocked products (> 50 units)
-        cur.execute(
-            """
-            SELECT 
-                p.product_id,
-                p.product_name,
-                p.img_url,
-                si.store_id,
-                s.city,
-                s.state,
-                si.stock
-            FROM Store_Inventory AS si
-            JOIN products AS p ON si.product_id = p.product_id
-            JOIN store AS s ON si.store_id = s.store_id
-            WHERE si.stock > 50
-            ORDER BY si.stock DESC, p.product_name;
-            """
-        )
-        
-        overstocked = [
+        limit = request.args.get("limit")
+        limit = int(limit) if limit is not None else None
+        offset = int(request.args.get("offset", 0))
+    except ValueError:
+        return bad_request("limit and offset must be integers")
+    if (limit is not None and limit <= 0) or offset < 0:
+        return bad_request("limit must be positive and offset must not be negative")
+
+    buckets = (bucket,) if bucket is not None else HEALTH_BUCKETS
+    sharded = current_app.extensions.get("shard_router") is not None
+    params = {
+        "low_stock": current_app.config["INVENTORY_LOW_STOCK"],
+        "overstock": current_app.config["INVENTORY_OVERSTOCK"],
+        # Each shard returns its first offset + limit rows per bucket; the
+        # page is cut after merging
+        "limit": -1 if limit is None else (offset + limit if sharded else limit),
+        "offset": 0 if sharded else offset,
+    }
+
+    try:
+        refresher = current_app.extensions.get("health_refresher")
+        if refresher is not None:
+            # Buckets maintained by the background refresh
+            refresher.ensure_started()
+            sql, snapshot = health_report_sql("inventory_health", buckets), False
+        else:
+            sql, snapshot = health_report_sql(f"({classify_sql()})", buckets, materialize=True), True
+
+        rows = query_all(sql, params, snapshot=snapshot)
+    except WriteAborted as e:
+        return bad_request(e.message, status_code=e.status_code)
+    except sqlite3.Error as e:
+        return bad_request(f"database error: {e}")
+
+    # Counted before the bucket filter, so every bucket has its count
+    counts = {name: 0 for name in HEALTH_BUCKETS}
+    pages = {name: [] for name in buckets}
+    for row in rows:
+        if row["n"] is not None:
+            counts[row["bucket"]] += row["n"]
+        else:
+            pages[row["bucket"]].append(row)
+
+    result = {"counts": counts}
+    for name, items in pages.items():
+        if sharded:
+            items.sort(key=HEALTH_ORDER[name])
+            items = items[offset:offset + limit] if limit is not None else items[offset:]
+        result[name] = [
             {
                 "product_id": row["product_id"],
                 "product_name": row["product_name"],
@@ -463,19 +994,13 @@ def inventory_health():
                 "state": row["state"],
                 "stock": row["stock"],
             }
-            for row in cur.fetchall()
+            for row in items
         ]
-        
-        result = {
-            "out_of_stock": out_of_stock,
-            "low_stock": low_stock,
-            "overstocked": overstocked,
-        }
-        
-        return jsonify(result), 200
-        
-    except sqlite3.Error as e:
-        return bad_request(f"database error: {e}")
+    if limit is not None or offset:
+        result["limit"] = limit
+        result["offset"] = offset
+
+    return jsonify(result), 200
 
 
 # -------------------------------------------------
@@ -497,10 +1022,7 @@ def all_orders():
     }]
     """
     try:
-        conn = get_db()
-        cur = conn.cursor()
-        
-        cur.execute(
+        rows = query_all(
             """
             SELECT 
                 o.order_id,
@@ -518,10 +1040,11 @@ def all_orders():
             JOIN user AS u ON c.uid = u.uid
             JOIN store AS s ON o.store_id = s.store_id
             ORDER BY o.order_datetime DESC;
-            """
+            """,
+            snapshot=True,
         )
         
-        rows = cur.fetchall()
+        rows.sort(key=lambda row: row["order_datetime"] or "", reverse=True)
         
         orders = [
             {
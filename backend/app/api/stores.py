@@ -1,12 +1,24 @@
-from flask import Blueprint, request, jsonify
-from ..db import get_db
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from ..catalog import catalog_facets, parse_catalog_filters, query_catalog
+from ..db import get_db, shard_for_store
+from ..geo import zip_location
+from ..inventory import changed_since, compacted_through, latest_movement_id
+from ..reservations import available_stock, reservation_book
+import json
 import sqlite3
+import time
 '''
 List all stores:
 curl -X GET "http://127.0.0.1:5000/api/stores"
 
+Five stores nearest to a zip:
+curl -X GET "http://127.0.0.1:5000/api/stores/nearby?zip=15213&limit=5"
+
 List products in store 5:
 curl -X GET "http://127.0.0.1:5000/api/stores/products?store_id=5"
+
+Follow stock changes in store 5:
+curl -N "http://127.0.0.1:5000/api/stores/5/inventory/stream"
 '''
 
 bp = Blueprint("stores", __name__)
@@ -29,7 +41,7 @@ def list_stores():
       ]
     """
     try:
-        conn = get_db()
+        conn = get_db(readonly=True)
         cur = conn.cursor()
 
         cur.execute(
@@ -58,6 +70,57 @@ def list_stores():
         return bad_request(f"database error: {e}")
     
 
+# -------------------------------------------------
+# GET /api/stores/nearby?zip=15213[&limit=10] or ?lat=..&lon=..
+# -------------------------------------------------
+
+@bp.get("/nearby")
+def nearby_stores():
+    """
+    GET /api/stores/nearby?zip=15213&limit=10[&max_miles=100]
+    GET /api/stores/nearby?lat=40.44&lon=-79.95&limit=10
+
+    The limit stores closest to a zip (its centroid) or a point, nearest
+    first, from the KD-tree in app/geo.py. Stores whose zip cannot be
+    geocoded are never returned.
+
+    Returns:
+      [
+        { store_id, store_name, street, city, state, zip, distance_miles }
+      ]
+    """
+    try:
+        limit = int(request.args.get("limit") or 10)
+        max_miles = float(request.args["max_miles"]) if request.args.get("max_miles") else None
+    except ValueError:
+        return bad_request("limit must be an integer and max_miles a number")
+    if limit <= 0 or (max_miles is not None and max_miles < 0):
+        return bad_request("limit must be positive and max_miles must not be negative")
+
+    if request.args.get("zip"):
+        location = zip_location(request.args["zip"])
+        if location is None:
+            return bad_request("unknown zip code")
+    elif request.args.get("lat") and request.args.get("lon"):
+        try:
+            location = (float(request.args["lat"]), float(request.args["lon"]))
+        except ValueError:
+            return bad_request("lat and lon must be numbers")
+        if not (-90 <= location[0] <= 90 and -180 <= location[1] <= 180):
+            return bad_request("lat must be within [-90, 90] and lon within [-180, 180]")
+    else:
+        return bad_request("zip or lat and lon are required")
+
+    try:
+        stores = current_app.extensions["store_locator"].nearest(
+            location, k=min(limit, 100), max_miles=max_miles
+        )
+    except sqlite3.Error as e:
+        return bad_request(f"database error: {e}")
+
+    return jsonify(stores), 200
+
+
 # -------------------------------------------------
 # GET /api/stores/products?store_id=X
 # -------------------------------------------------
@@ -67,6 +130,11 @@ def list_store_products():
     """
     GET /api/stores/products?store_id=X
 
+    Optional filters (evaluated in SQL, see app/catalog.py):
+      category=Birds,Pets  in_stock=1|0  min_price  max_price
+      sort=product_id|name|-name|price|-price|stock|-stock
+      limit  offset  facets=1
+
     Returns:
       [
         {
@@ -78,6 +146,8 @@ def list_store_products():
             stock
         }
       ]
+    with the total number of matches in the X-Total-Count header.
+    With facets=1: { items: [...], total, facets: { category, stock } }
     """
 
     store_id = request.args.get("store_id", None)
@@ -91,28 +161,21 @@ def list_store_products():
         return bad_request("store_id must be an integer")
 
     try:
-        conn = get_db()
+        filters = parse_catalog_filters(request.args)
+    except ValueError as e:
+        return bad_request(str(e))
+
+    try:
+        conn = get_db(readonly=True, shard=shard_for_store(store_id_int))
         cur = conn.cursor()
 
-        # JOIN Products + Store_Inventory
-        cur.execute(
-            """
-            SELECT 
-                Products.product_id,
-                Products.product_name,
-                Products.category,
-                Products.price,
-                Products.img_url,
-                Store_Inventory.stock
-            FROM Store_Inventory
-            JOIN Products
-              ON Store_Inventory.product_id = Products.product_id
-            WHERE Store_Inventory.store_id = ?;
-            """,
-            (store_id_int,),
-        )
+        # JOIN Products + Store_Inventory, filtered and paged in SQL
+        rows, total = query_catalog(cur, store_id_int, filters)
+        facets = catalog_facets(cur, store_id_int, filters) if filters["facets"] else None
 
-        rows = cur.fetchall()
+        # Stock held by live cart reservations is not available
+        book = reservation_book()
+        held = book.held_by_product(store_id_int) if book is not None else {}
 
         products = [
             {
@@ -121,13 +184,126 @@ def list_store_products():
                 "category": row["category"],
                 "price": row["price"],
                 "img_url": row["img_url"],
-                "stock": row["stock"],
+                "stock": available_stock(row["stock"], held, row["product_id"]),
             }
             for row in rows
         ]
 
-        return jsonify(products), 200
+        if facets is not None:
+            response = jsonify({"items": products, "total": total, "facets": facets})
+        else:
+            response = jsonify(products)
+        response.headers["X-Total-Count"] = str(total)
+        return response, 200
+
+    except sqlite3.Error as e:
+        return bad_request(f"database error: {e}")
+
+
+# -------------------------------------------------
+# GET /api/stores/<store_id>/inventory/stream
+# Server-Sent Events with the store's stock changes, read from the
+# inventory ledger (checkout, returns, admin adjustments, imports).
+#
+#   id: <movement_id>
+#   event: stock
+#   data: [ { product_id, stock }, ... ]   (changed products only)
+#
+# Resume with the Last-Event-ID header (sent by EventSource on reconnect)
+# or ?last_event_id=. If the ledger was compacted past that id, one
+# `event: snapshot` with every product of the store is sent instead.
+# stock is the same available stock /api/stores/products shows.
+# -------------------------------------------------
+
+def _sse(event: str, event_id: int, data) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
 
+def _current_stock(cur, store_id: int, product_ids=None) -> list:
+    product_filter = ""
+    params = [store_id]
+    if product_ids is not None:
+        product_filter = "AND si.product_id IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps(product_ids))
+
+    cur.execute(
+        f"""
+        SELECT si.product_id, si.stock AS stock
+        FROM Store_Inventory AS si
+        WHERE si.store_id = ?
+          {product_filter}
+        ORDER BY si.product_id;
+        """,
+        params,
+    )
+    rows = cur.fetchall()
+
+    book = reservation_book()
+    held = book.held_by_product(store_id) if book is not None else {}
+    return [
+        {
+            "product_id": row["product_id"],
+            "stock": available_stock(row["stock"], held, row["product_id"]),
+        }
+        for row in rows
+    ]
+
+
+@bp.get("/<int:store_id>/inventory/stream")
+def stream_store_inventory(store_id: int):
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    if last_event_id is not None:
+        try:
+            last_event_id = int(last_event_id)
+        except ValueError:
+            return bad_request("Last-Event-ID must be an integer")
+
+    try:
+        row = get_db(readonly=True).execute(
+            "SELECT 1 FROM Store WHERE store_id = ?;", (store_id,)
+        ).fetchone()
     except sqlite3.Error as e:
         return bad_request(f"database error: {e}")
+    if row is None:
+        return bad_request("store not found", status_code=404)
+
+    signal = current_app.extensions["commit_signal"]
+    coalesce = current_app.config["INVENTORY_STREAM_COALESCE"]
+    poll = current_app.config["INVENTORY_STREAM_POLL"]
+    keepalive = current_app.config["INVENTORY_STREAM_KEEPALIVE"]
+
+    def events():
+        # The request's connections are closed once the view returns, so
+        # the stream gets its own (closed again when the stream ends)
+        cur = get_db(readonly=True, shard=shard_for_store(store_id)).cursor()
+        last_id = last_event_id
+        yield "retry: 3000\n\n"
+
+        if last_id is None:
+            # New subscriber: only changes from now on
+            last_id = latest_movement_id(cur)
+        elif last_id < compacted_through(cur):
+            last_id = latest_movement_id(cur)
+            yield _sse("snapshot", last_id, _current_stock(cur, store_id))
+
+        last_sent = time.monotonic()
+        while True:
+            # Read the version first so a commit during the query still wakes us
+            seen = signal.version
+            last_id_now, product_ids = changed_since(cur, store_id, last_id)
+            if product_ids:
+                last_id = last_id_now
+                yield _sse("stock", last_id, _current_stock(cur, store_id, product_ids))
+                last_sent = time.monotonic()
+
+            if signal.wait(seen, timeout=poll):
+                # Let the rest of a burst commit so it goes out as one event
+                time.sleep(coalesce)
+            elif time.monotonic() - last_sent >= keepalive:
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
 
+    response = Response(stream_with_context(events()), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
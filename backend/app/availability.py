@@ -0,0 +1,113 @@
+"""
+Cross-store availability: an in-memory inverted index
+product_id -> { store_id: stock } over every Store_Inventory file, so
+"which stores have this product" is a dict lookup instead of a query per
+shard.
+
+Like AutocompleteIndex, it follows the inventory ledger (LedgerIndex in
+app/search.py): after a commit (commit_signal) or every check_interval
+seconds its background thread reads only the movements after its
+watermark and swaps in a copy with those pairs' stock refreshed. It
+reloads fully when the catalog changes or the ledger was compacted.
+Lookups never query the database once the first load finished.
+"""
+
+from .geo import haversine_miles, normalize_zip, zip_location
+from .search import LedgerIndex
+
+
+class AvailabilityIndex(LedgerIndex):
+    def stores_for(self, product_id: int, near_zip=None) -> list:
+        """
+        [{ store_id, store_name, city, state, zip, stock, distance_miles }]
+        for every store carrying the product. With near_zip, nearest store
+        first (distance_miles is None for stores that could not be placed,
+        which go last); otherwise most stock first.
+        """
+        by_product, stores = self._current()
+        origin = zip_location(near_zip) if near_zip is not None else None
+        by_store = by_product.get(product_id, {})
+
+        results = []
+        for store_id, stock in by_store.items():
+            store = stores.get(store_id, {})
+            location = store.get("location")
+            results.append({
+                "store_id": store_id,
+                "store_name": store.get("store_name"),
+                "city": store.get("city"),
+                "state": store.get("state"),
+                "zip": store.get("zip"),
+                "stock": stock,
+                "distance_miles": (
+                    round(haversine_miles(origin, location), 1)
+                    if origin is not None and location is not None else None
+                ),
+            })
+
+        if origin is not None:
+            results.sort(key=lambda s: (s["distance_miles"] is None, s["distance_miles"] or 0, s["store_id"]))
+        else:
+            results.sort(key=lambda s: (-(s["stock"] or 0), s["store_id"]))
+        return results
+
+    @staticmethod
+    def _load_stores(conn) -> dict:
+        # Store lives in the main file (attached as `shared` on shards)
+        stores = {}
+        for store_id, name, city, state, zip_code in conn.execute(
+            "SELECT store_id, store_name, city, state, zip FROM store;"
+        ):
+            stores[store_id] = {
+                "store_name": name,
+                "city": city,
+                "state": state,
+                "zip": normalize_zip(zip_code) or zip_code,
+                "location": zip_location(zip_code),
+            }
+        return stores
+
+    def _new_state(self):
+        # product_id -> { store_id: stock }
+        return {}
+
+    def _load(self, stock, conn):
+        for store_id, product_id, on_hand in conn.execute(
+            "SELECT si.store_id, si.product_id, si.stock FROM Store_Inventory AS si;"
+        ):
+            stock.setdefault(product_id, {})[store_id] = on_hand
+
+    def _finish(self, stock, connections):
+        # (product_id -> { store_id: stock }, store_id -> store details)
+        return stock, self._load_stores(connections[0][1])
+
+    def _apply(self, state, cur, watermark: int):
+        cur.execute(
+            """
+            SELECT m.store_id, m.product_id, MAX(m.movement_id), si.stock
+            FROM inventory_movement AS m
+            JOIN Store_Inventory AS si
+              ON si.store_id = m.store_id
+             AND si.product_id = m.product_id
+            WHERE m.movement_id > ?
+            GROUP BY m.store_id, m.product_id;
+            """,
+            (watermark,),
+        )
+        rows = cur.fetchall()
+        if not rows:
+            return state, None
+
+        # Copy the outer dict and the touched products' dicts only
+        stock, stores = state
+        stock, copied = dict(stock), set()
+        last = None
+        for store_id, product_id, last_id, on_hand in rows:
+            if product_id not in copied:
+                stock[product_id] = dict(stock.get(product_id, {}))
+                copied.add(product_id)
+            stock[product_id][store_id] = on_hand
+            last = last_id if last is None else max(last, last_id)
+        if any(row[0] not in stores for row in rows):
+            stores = self._load_stores(cur.connection)
+        return (stock, stores), last
@@ -0,0 +1,248 @@
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+BACKUP_PREFIX = "jellydog-"
+_BACKUP_NAME = re.compile(r"jellydog-(\d{8}-\d{6}-\d{6})(?:\.(shard_\d+))?\.db(\.gz)?")
+
+# One backup at a time per process; a second request gets BackupInProgress
+_backup_lock = threading.Lock()
+
+
+class BackupInProgress(Exception):
+    pass
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def backup_database(source_path: str, dest_path: str, pages: int = 256,
+                    sleep: float = 0.005, max_restarts: int = 3, progress=None) -> str:
+    """
+    Copy a live database into dest_path without blocking writers.
+
+    Uses SQLite's online backup API `pages` pages at a time, sleeping
+    `sleep` seconds between steps so the writer thread keeps getting the
+    file. A write from another connection restarts the copy; after
+    max_restarts restarts it falls back to `VACUUM INTO`, which copies from
+    a single read transaction (in WAL mode writers are not blocked by it).
+
+    The copy is written to a temp file and renamed into place, so dest_path
+    is always a complete database. progress(remaining, total) is called
+    after each step.
+
+    Returns the method used: "backup" or "vacuum".
+    """
+    tmp_path = f"{dest_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    restarts = 0
+    last_remaining = None
+
+    def on_step(status, remaining, total):
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > max_restarts:
+                raise _TooManyRestarts()
+        last_remaining = remaining
+        if progress is not None:
+            progress(remaining, total)
+
+    method = "backup"
+    source = sqlite3.connect(source_path)
+    try:
+        target = sqlite3.connect(tmp_path)
+        try:
+            source.backup(target, pages=pages, progress=on_step, sleep=sleep)
+        except _TooManyRestarts:
+            method = "vacuum"
+        finally:
+            target.close()
+
+        if method == "vacuum":
+            os.remove(tmp_path)
+            source.execute("VACUUM INTO ?;", (tmp_path,))
+    finally:
+        source.close()
+
+    _install_copy(tmp_path, dest_path)
+    return method
+
+
+def _install_copy(tmp_path: str, dest_path: str):
+    # The copy inherits WAL mode from the live file; a standalone copy
+    # should not need -wal/-shm side files
+    target = sqlite3.connect(tmp_path)
+    try:
+        target.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        target.close()
+
+    os.replace(tmp_path, dest_path)
+
+
+def _snapshot_readers(paths, timeout: float = 5.0) -> list:
+    """
+    One connection per path, each inside a read transaction, all started
+    while every file's write lock was held. They see the same moment
+    across files: nothing can commit to any file between the first
+    snapshot and the last. The write locks are released before returning.
+    In WAL mode writers then carry on; in rollback-journal mode they
+    cannot commit until the readers are closed.
+    """
+    locks, readers = [], []
+    try:
+        # Always the same order, so two freezes cannot deadlock
+        for path in paths:
+            conn = sqlite3.connect(path, isolation_level=None, timeout=timeout)
+            locks.append(conn)
+            conn.execute("BEGIN IMMEDIATE")
+        for path in paths:
+            reader = sqlite3.connect(path, isolation_level=None, timeout=timeout)
+            readers.append(reader)
+            reader.execute("BEGIN")
+            # The first read starts the snapshot
+            reader.execute("SELECT COUNT(*) FROM sqlite_master;").fetchone()
+    except BaseException:
+        for reader in readers:
+            reader.close()
+        raise
+    finally:
+        for conn in locks:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            conn.close()
+    return readers
+
+
+def _backup_from(reader, dest_path: str, pages: int = 256, sleep: float = 0.005, progress=None):
+    """Copy dest_path from a connection whose read transaction is open."""
+    tmp_path = f"{dest_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    target = sqlite3.connect(tmp_path)
+    try:
+        # The open read transaction keeps every step on the same snapshot
+        reader.backup(
+            target, pages=pages, sleep=sleep,
+            progress=(lambda status, remaining, total: progress(remaining, total)) if progress else None,
+        )
+    finally:
+        target.close()
+    _install_copy(tmp_path, dest_path)
+
+
+def _gzip_file(path: str) -> str:
+    gz_path = f"{path}.gz"
+    with open(path, "rb") as src, gzip.open(f"{gz_path}.tmp", "wb", compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.replace(f"{gz_path}.tmp", gz_path)
+    os.remove(path)
+    return gz_path
+
+
+def create_backup(source_path: str, backup_dir: str, keep: int = 7, compress: bool = False,
+                  shard_paths=(), pages: int = 256, sleep: float = 0.005, progress=None) -> dict:
+    """
+    Write a timestamped backup of source_path (plus any shard files) into
+    backup_dir, then delete all but the newest `keep` backups.
+
+    With shard files the whole set is copied from one moment
+    (_snapshot_readers), so an order cannot show up in a shard but not in
+    main or the other way round. Writers briefly wait while the snapshots
+    are taken; in rollback-journal mode (WRITE_COORDINATOR off, the
+    default) they cannot commit until the copy is done.
+
+    Raises BackupInProgress if this process is already taking a backup.
+
+    Returns: { name, files: [{ file, size, method }], seconds, pruned }
+    """
+    if not _backup_lock.acquire(blocking=False):
+        raise BackupInProgress("a backup is already running")
+
+    try:
+        started = time.monotonic()
+        os.makedirs(backup_dir, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S-%f")
+
+        sources = [(source_path, f"{BACKUP_PREFIX}{stamp}.db")]
+        for path in shard_paths:
+            shard = os.path.splitext(os.path.basename(path))[0]
+            sources.append((path, f"{BACKUP_PREFIX}{stamp}.{shard}.db"))
+
+        readers = _snapshot_readers([path for path, _ in sources]) if shard_paths else None
+        copies = []
+        try:
+            for i, (path, file_name) in enumerate(sources):
+                dest = os.path.join(backup_dir, file_name)
+                step = (lambda r, t, f=file_name: progress(f, r, t)) if progress else None
+                if readers is not None:
+                    _backup_from(readers[i], dest, pages=pages, sleep=sleep, progress=step)
+                    copies.append((dest, "snapshot"))
+                else:
+                    copies.append((dest, backup_database(path, dest, pages=pages, sleep=sleep, progress=step)))
+        finally:
+            for reader in readers or ():
+                reader.close()
+
+        # Compressed once the snapshots are released
+        files = []
+        for dest, method in copies:
+            if compress:
+                dest = _gzip_file(dest)
+            files.append(
+                {"file": os.path.basename(dest), "size": os.path.getsize(dest), "method": method}
+            )
+
+        pruned = prune_backups(backup_dir, keep)
+        return {
+            "name": stamp,
+            "files": files,
+            "seconds": round(time.monotonic() - started, 3),
+            "pruned": pruned,
+        }
+    finally:
+        _backup_lock.release()
+
+
+def list_backups(backup_dir: str) -> list:
+    """
+    Backups in backup_dir, newest first.
+    Returns: [{ name, files: [...], size }]
+    """
+    if not os.path.isdir(backup_dir):
+        return []
+
+    backups = {}
+    for file_name in os.listdir(backup_dir):
+        match = _BACKUP_NAME.fullmatch(file_name)
+        if match is None:
+            continue
+        entry = backups.setdefault(match.group(1), {"name": match.group(1), "files": [], "size": 0})
+        entry["files"].append(file_name)
+        entry["size"] += os.path.getsize(os.path.join(backup_dir, file_name))
+
+    for entry in backups.values():
+        entry["files"].sort()
+    return sorted(backups.values(), key=lambda b: b["name"], reverse=True)
+
+
+def prune_backups(backup_dir: str, keep: int) -> list:
+    """Delete all but the newest `keep` backups; returns the removed names."""
+    if keep <= 0:
+        return []
+    removed = []
+    for backup in list_backups(backup_dir)[keep:]:
+        for file_name in backup["files"]:
+            os.remove(os.path.join(backup_dir, file_name))
+        removed.append(backup["name"])
+    return removed
@@ -0,0 +1,204 @@
+"""
+Catalog filters shared by /api/stores/products and /api/products/search:
+category, in_stock, price range, sort and pagination, all evaluated in
+SQL, plus facet counts from one grouped query.
+"""
+
+import json
+
+
+# Main database (Products lives there with or without sharding)
+CATALOG_SCHEMA = """
+CREATE INDEX IF NOT EXISTS idx_products_category_price ON products (category, price);
+CREATE INDEX IF NOT EXISTS idx_products_price ON products (price);
+"""
+
+CATALOG_SORTS = {
+    "product_id": "p.product_id",
+    "name": "p.product_name COLLATE NOCASE, p.product_id",
+    "-name": "p.product_name COLLATE NOCASE DESC, p.product_id",
+    "price": "p.price, p.product_id",
+    "-price": "p.price DESC, p.product_id",
+    "stock": "stock, p.product_id",
+    "-stock": "stock DESC, p.product_id",
+}
+
+_TRUE = ("1", "true", "yes")
+_FALSE = ("0", "false", "no")
+
+
+def ensure_catalog_schema(cur):
+    for statement in CATALOG_SCHEMA.split(";"):
+        if statement.strip():
+            cur.execute(statement)
+
+
+def parse_catalog_filters(args) -> dict:
+    """
+    Read the filter query params. Raises ValueError with a message
+    suitable for bad_request.
+
+      category=Birds,Pets (or repeated), in_stock=1|0,
+      min_price, max_price, sort (see CATALOG_SORTS), limit, offset,
+      facets=1
+    """
+    categories = [
+        c.strip() for value in args.getlist("category") for c in value.split(",") if c.strip()
+    ]
+
+    in_stock = args.get("in_stock")
+    if in_stock is not None:
+        if in_stock.lower() in _TRUE:
+            in_stock = True
+        elif in_stock.lower() in _FALSE:
+            in_stock = False
+        else:
+            raise ValueError("in_stock must be 1 or 0")
+
+    try:
+        min_price = float(args["min_price"]) if args.get("min_price") else None
+        max_price = float(args["max_price"]) if args.get("max_price") else None
+    except ValueError:
+        raise ValueError("min_price and max_price must be numbers")
+
+    sort = args.get("sort", "product_id")
+    if sort not in CATALOG_SORTS:
+        raise ValueError(f"sort must be one of {', '.join(CATALOG_SORTS)}")
+
+    try:
+        limit = int(args["limit"]) if args.get("limit") else None
+        offset = int(args.get("offset") or 0)
+    except ValueError:
+        raise ValueError("limit and offset must be integers")
+    if (limit is not None and limit <= 0) or offset < 0:
+        raise ValueError("limit must be positive and offset must not be negative")
+
+    return {
+        "categories": categories,
+        "in_stock": in_stock,
+        "min_price": min_price,
+        "max_price": max_price,
+        "sort": sort,
+        "limit": limit,
+        "offset": offset,
+        "facets": (args.get("facets") or "").lower() in _TRUE,
+    }
+
+
+def _base_where(store_id: int, filters: dict, name_like=None, product_ids=None):
+    """Store, name and price conditions (the ones facets are counted under)."""
+    where = ["si.store_id = ?"]
+    params = [store_id]
+    if name_like is not None:
+        where.append("p.product_name LIKE ?")
+        params.append(name_like)
+    if product_ids is not None:
+        where.append("p.product_id IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(list(product_ids)))
+    if filters["min_price"] is not None:
+        where.append("p.price >= ?")
+        params.append(filters["min_price"])
+    if filters["max_price"] is not None:
+        where.append("p.price <= ?")
+        params.append(filters["max_price"])
+    return where, params
+
+
+def query_catalog(cur, store_id: int, filters: dict, name_like=None, product_ids=None):
+    """
+    Products of one store matching filters (plus an optional LIKE on the
+    name, or a set of product ids), sorted and paginated in SQL.
+
+    Returns (rows, total) where total counts all matches before paging.
+    Rows have product_id, product_name, category, price, img_url, stock.
+    """
+    where, params = _base_where(store_id, filters, name_like, product_ids)
+    if filters["categories"]:
+        where.append(f"p.category IN ({', '.join('?' * len(filters['categories']))})")
+        params.extend(filters["categories"])
+    if filters["in_stock"] is True:
+        where.append("si.stock > 0")
+    elif filters["in_stock"] is False:
+        where.append("COALESCE(si.stock, 0) <= 0")
+
+    page = ""
+    if filters["limit"] is not None or filters["offset"]:
+        page = "LIMIT ? OFFSET ?"
+        params.extend([filters["limit"] if filters["limit"] is not None else -1, filters["offset"]])
+
+    cur.execute(
+        f"""
+        SELECT
+            p.product_id,
+            p.product_name,
+            p.category,
+            p.price,
+            p.img_url,
+            si.stock AS stock,
+            COUNT(*) OVER () AS total
+        FROM Store_Inventory AS si
+        JOIN Products AS p
+          ON si.product_id = p.product_id
+        WHERE {" AND ".join(where)}
+        ORDER BY {CATALOG_SORTS[filters["sort"]]}
+        {page};
+        """,
+        params,
+    )
+    rows = cur.fetchall()
+    if rows:
+        return rows, rows[0]["total"]
+    if page:
+        # Past the last page: count without paging
+        cur.execute(
+            f"""
+            SELECT COUNT(*)
+            FROM Store_Inventory AS si
+            JOIN Products AS p
+              ON si.product_id = p.product_id
+            WHERE {" AND ".join(where)};
+            """,
+            params[:-2],
+        )
+        return rows, cur.fetchone()[0]
+    return rows, 0
+
+
+def catalog_facets(cur, store_id: int, filters: dict, name_like=None, product_ids=None) -> dict:
+    """
+    Facet counts from one grouped query over (category, stock bucket).
+    Each facet honours the other facet's filter but not its own, so every
+    option shows how many results picking it would give.
+
+    Returns: { category: { name: count }, stock: { in_stock, out_of_stock } }
+    """
+    where, params = _base_where(store_id, filters, name_like, product_ids)
+    cur.execute(
+        f"""
+        SELECT
+            p.category,
+            CASE WHEN si.stock > 0 THEN 'in_stock' ELSE 'out_of_stock' END AS stock_bucket,
+            COUNT(*) AS n
+        FROM Store_Inventory AS si
+        JOIN Products AS p
+          ON si.product_id = p.product_id
+        WHERE {" AND ".join(where)}
+        GROUP BY p.category, stock_bucket;
+        """,
+        params,
+    )
+
+    wanted_bucket = {True: "in_stock", False: "out_of_stock", None: None}[filters["in_stock"]]
+    categories = set(filters["categories"])
+    by_category = {}
+    by_stock = {"in_stock": 0, "out_of_stock": 0}
+    for category, bucket, n in cur.fetchall():
+        if category is None:
+            continue
+        if wanted_bucket is None or bucket == wanted_bucket:
+            by_category[category] = by_category.get(category, 0) + n
+        else:
+            by_category.setdefault(category, 0)
+        if not categories or category in categories:
+            by_stock[bucket] += n
+    return {"category": by_category, "stock": by_stock}
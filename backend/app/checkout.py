@@ -0,0 +1,206 @@
+import sqlite3
+import threading
+import time
+import uuid
+
+from .db import WriteAborted
+from .inventory import adjust_stock, REASON_CHECKOUT
+from .sketches import record_order
+
+
+class CheckoutError(WriteAborted):
+    """
+    Raised by perform_checkout when a cart cannot be completed.
+    status is the ticket status reported to async callers
+    ("insufficient_stock" or "failed"); status_code is the HTTP code
+    used by the synchronous endpoint.
+    """
+
+    def __init__(self, message: str, status: str = "failed", status_code: int = 400):
+        super().__init__(message, status_code=status_code)
+        self.status = status
+
+
+def perform_checkout(cur, customer_id: int, store_id: int) -> dict:
+    """
+    Convert the customer's in_cart order at store_id into a completed order.
+    Deducts stock from Store_Inventory, sets total_price and adds the order
+    to the day's order sketches (app/sketches.py). Stock held by other
+    carts (inventory_reservation) is not available; the order's own holds
+    are released.
+
+    Runs on the caller's cursor and does NOT commit; the caller owns the
+    transaction. Raises CheckoutError if the cart cannot be completed.
+
+    Returns: { order_id, total_price, status }
+    """
+    # Find the active cart
+    cur.execute(
+        """
+        SELECT order_id
+        FROM "order"
+        WHERE customer_id = ?
+          AND store_id = ?
+          AND status = 'in_cart';
+        """,
+        (customer_id, store_id),
+    )
+    row = cur.fetchone()
+
+    if row is None:
+        raise CheckoutError("no active cart for this customer and store", status_code=404)
+
+    order_id = row["order_id"]
+
+    # Load items in the cart (non-returned items)
+    cur.execute(
+        """
+        SELECT
+            oi.product_id,
+            oi.quantity,
+            p.price,
+            COALESCE(si.stock, 0)
+            - COALESCE((
+                SELECT SUM(r.quantity)
+                FROM inventory_reservation AS r
+                WHERE r.store_id = si.store_id
+                  AND r.product_id = si.product_id
+                  AND r.expires_at > ?
+                  AND r.order_id != oi.order_id
+            ), 0) AS stock
+        FROM order_item AS oi
+        JOIN products AS p
+          ON oi.product_id = p.product_id
+        LEFT JOIN store_inventory AS si
+          ON si.product_id = oi.product_id
+         AND si.store_id = ?
+        WHERE oi.order_id = ?
+          AND oi.is_return = 0;
+        """,
+        (time.time(), store_id, order_id),
+    )
+
+    items = cur.fetchall()
+
+    if not items:
+        raise CheckoutError("cart is empty")
+
+    # Check stock availability
+    for item in items:
+        if item["stock"] < item["quantity"]:
+            raise CheckoutError(
+                "insufficient stock for one or more items",
+                status="insufficient_stock",
+            )
+
+    # Compute total price
+    total_price = sum(float(item["price"]) * int(item["quantity"]) for item in items)
+
+    # Deduct stock + complete the order
+    for item in items:
+        adjust_stock(
+            cur, store_id, item["product_id"], -item["quantity"], REASON_CHECKOUT, order_id
+        )
+
+    cur.execute(
+        """
+        UPDATE "order"
+        SET status = 'complete',
+            total_price = ?,
+            order_datetime = CURRENT_TIMESTAMP
+        WHERE order_id = ?;
+        """,
+        (total_price, order_id),
+    )
+    cur.execute("DELETE FROM inventory_reservation WHERE order_id = ?;", (order_id,))
+    record_order(cur, order_id)
+
+    return {
+        "order_id": order_id,
+        "total_price": total_price,
+        "status": "complete",
+    }
+
+
+class CheckoutQueue:
+    """
+    Async checkout pipeline.
+
+    Request threads call submit() and get a ticket back immediately.
+    The checkout itself is queued on the WriteCoordinator for the store's
+    database file, whose writer thread group-commits it with whatever
+    other writes are waiting.
+
+    Tickets are kept in memory, so polling must reach the same process
+    that accepted the checkout.
+    """
+
+    def __init__(self, writers, ticket_ttl: int = 3600, on_complete=None):
+        self.writers = writers
+        self.ticket_ttl = ticket_ttl
+        # Called with the result of every completed checkout
+        self.on_complete = on_complete
+        self._tickets = {}
+        self._lock = threading.Lock()
+
+    def submit(self, customer_id: int, store_id: int, shard=None) -> str:
+        """
+        Queue a checkout and return its ticket.
+        Raises WriteQueueFull if the writer queue has no room.
+        """
+        ticket = uuid.uuid4().hex
+        with self._lock:
+            self._prune_locked()
+            self._tickets[ticket] = {
+                "ticket": ticket,
+                "status": "pending",
+                "customer_id": customer_id,
+                "store_id": store_id,
+                "submitted_at": time.time(),
+            }
+
+        try:
+            future = self.writers.get(shard).submit(
+                lambda cur: perform_checkout(cur, customer_id, store_id),
+                timeout=0,
+            )
+        except Exception:
+            with self._lock:
+                del self._tickets[ticket]
+            raise
+
+        future.add_done_callback(lambda f: self._finish(ticket, f))
+        return ticket
+
+    def status(self, ticket: str):
+        with self._lock:
+            info = self._tickets.get(ticket)
+            return dict(info) if info is not None else None
+
+    def _prune_locked(self):
+        cutoff = time.time() - self.ticket_ttl
+        expired = [
+            t for t, info in self._tickets.items()
+            if info["status"] != "pending" and info.get("finished_at", 0) < cutoff
+        ]
+        for t in expired:
+            del self._tickets[t]
+
+    def _finish(self, ticket: str, future):
+        error = future.exception()
+        if error is None:
+            result = future.result()
+            if self.on_complete is not None:
+                self.on_complete(result)
+        elif isinstance(error, CheckoutError):
+            result = {"status": error.status, "error": error.message}
+        elif isinstance(error, sqlite3.Error):
+            result = {"status": "failed", "error": f"database error during checkout: {error}"}
+        else:
+            result = {"status": "failed", "error": str(error)}
+
+        with self._lock:
+            info = self._tickets.get(ticket)
+            if info is not None:
+                info.update(result)
+                info["finished_at"] = time.time()
@@ -8,3 +8,132 @@ class Config:
         "SQLITE_PATH",
         os.path.join(BASE_DIR, "database.db")
     )
+
+    # Checkout mode:
+    #   "sync"  -> the request completes the order itself (default)
+    #   "async" -> the request enqueues the cart and returns 202 + ticket;
+    #              the database writer thread completes orders in batches
+    CHECKOUT_MODE = os.getenv("CHECKOUT_MODE", "sync")
+    # How long finished tickets stay available for polling (seconds)
+    CHECKOUT_TICKET_TTL = int(os.getenv("CHECKOUT_TICKET_TTL", "3600"))
+
+    # Write coordinator (opt-in): route every write transaction through one
+    # writer thread per process (see app/writer.py). It only serializes
+    # writes within this process, and its connections switch the database
+    # to SQLITE_JOURNAL_MODE (WAL by default, which persists in the file).
+    # CHECKOUT_MODE=async always uses the writer thread.
+    WRITE_COORDINATOR = os.getenv("WRITE_COORDINATOR", "0") == "1"
+    WRITE_QUEUE_SIZE = int(os.getenv("WRITE_QUEUE_SIZE", "256"))
+    WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "50"))
+    # Max seconds a request waits for the writer before getting a 503
+    WRITE_WAIT_TIMEOUT = float(os.getenv("WRITE_WAIT_TIMEOUT", "5"))
+    SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "wal")
+
+    # Optional read-only snapshot for the stats blueprint. When set, the
+    # live database is copied here every READ_SNAPSHOT_INTERVAL seconds
+    # and analytics queries read the copy instead of the live file.
+    READ_SNAPSHOT_PATH = os.getenv("READ_SNAPSHOT_PATH", "")
+    READ_SNAPSHOT_INTERVAL = int(os.getenv("READ_SNAPSHOT_INTERVAL", "300"))
+
+    # Optional per-store sharding: Store_Inventory, "order" and order_item
+    # live in one SQLite file per SHARD_GROUP_SIZE stores under SHARD_DIR;
+    # User, Customers, Products and Store stay in SQLITE_PATH.
+    # Populate the shards with util/shard_db.py before turning this on.
+    SHARDING = os.getenv("SHARDING", "0") == "1"
+    SHARD_DIR = os.getenv("SHARD_DIR", os.path.join(BASE_DIR, "shards"))
+    SHARD_GROUP_SIZE = int(os.getenv("SHARD_GROUP_SIZE", "1"))
+
+    # Online backups (util/backup_db.py, POST /api/admin/backup).
+    # Copies BACKUP_PAGES pages per step and sleeps BACKUP_SLEEP seconds
+    # between steps so writers are not stalled; keeps the newest BACKUP_KEEP.
+    BACKUP_DIR = os.getenv("BACKUP_DIR", os.path.join(BASE_DIR, "backups"))
+    BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+    BACKUP_COMPRESS = os.getenv("BACKUP_COMPRESS", "0") == "1"
+    BACKUP_PAGES = int(os.getenv("BACKUP_PAGES", "256"))
+    BACKUP_SLEEP = float(os.getenv("BACKUP_SLEEP", "0.005"))
+
+    # Largest items list accepted by POST /api/admin/inventory/bulk-adjust
+    BULK_ADJUST_MAX_ITEMS = int(os.getenv("BULK_ADJUST_MAX_ITEMS", "10000"))
+
+    # Rows validated and written per transaction by POST /api/admin/import
+    # and util/import_data.py
+    IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "5000"))
+
+    # Inventory ledger: POST /api/admin/inventory/compact (or
+    # util/compact_ledger.py from cron) folds movements older than this
+    # many days into inventory_snapshot
+    LEDGER_RETENTION_DAYS = int(os.getenv("LEDGER_RETENTION_DAYS", "30"))
+
+    # Stock reservations: adding to or updating a cart holds the stock for
+    # RESERVATION_TTL seconds, /api/stores/products shows stock minus live
+    # holds, and checkout turns the holds into the deduction. Expired holds
+    # are released every RESERVATION_SWEEP_INTERVAL seconds.
+    STOCK_RESERVATIONS = os.getenv("STOCK_RESERVATIONS", "0") == "1"
+    RESERVATION_TTL = int(os.getenv("RESERVATION_TTL", "900"))
+    RESERVATION_SWEEP_INTERVAL = int(os.getenv("RESERVATION_SWEEP_INTERVAL", "30"))
+
+    # GET /api/stores/<store_id>/inventory/stream (Server-Sent Events):
+    # changes committed within INVENTORY_STREAM_COALESCE seconds go out as
+    # one event; writes from other processes are picked up at least every
+    # INVENTORY_STREAM_POLL seconds; idle streams get a keepalive comment
+    # every INVENTORY_STREAM_KEEPALIVE seconds.
+    INVENTORY_STREAM_COALESCE = float(os.getenv("INVENTORY_STREAM_COALESCE", "0.25"))
+    INVENTORY_STREAM_POLL = float(os.getenv("INVENTORY_STREAM_POLL", "2"))
+    INVENTORY_STREAM_KEEPALIVE = float(os.getenv("INVENTORY_STREAM_KEEPALIVE", "15"))
+
+    # GET /api/stats/inventory-health: default thresholds when no row in
+    # inventory_threshold applies (low_stock: stock < this; overstocked:
+    # stock > this). INVENTORY_HEALTH_INCREMENTAL=1 keeps the buckets in
+    # inventory_health and re-classifies the pairs the ledger shows moved
+    # every INVENTORY_HEALTH_REFRESH_INTERVAL seconds in the background.
+    INVENTORY_LOW_STOCK = int(os.getenv("INVENTORY_LOW_STOCK", "5"))
+    INVENTORY_OVERSTOCK = int(os.getenv("INVENTORY_OVERSTOCK", "50"))
+    INVENTORY_HEALTH_INCREMENTAL = os.getenv("INVENTORY_HEALTH_INCREMENTAL", "0") == "1"
+    INVENTORY_HEALTH_REFRESH_INTERVAL = int(os.getenv("INVENTORY_HEALTH_REFRESH_INTERVAL", "30"))
+
+    # /api/products/search?mode=fuzzy: minimum trigram score (0-1) and how
+    # often (seconds) the in-memory index checks Products for changes made
+    # by other processes
+    SEARCH_FUZZY_THRESHOLD = float(os.getenv("SEARCH_FUZZY_THRESHOLD", "0.3"))
+    SEARCH_INDEX_CHECK_INTERVAL = float(os.getenv("SEARCH_INDEX_CHECK_INTERVAL", "30"))
+
+    # GET /api/products/<product_id>/image serves variants pre-built by
+    # util/build_images.py from IMAGE_SOURCE_DIR into IMAGE_CACHE_DIR.
+    # Responses may be cached for IMAGE_CACHE_MAX_AGE seconds and are
+    # revalidated with the variant's ETag after that.
+    IMAGE_SOURCE_DIR = os.getenv(
+        "IMAGE_SOURCE_DIR",
+        os.path.join(os.path.dirname(BASE_DIR), "product_images")
+    )
+    IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", os.path.join(BASE_DIR, "image_cache"))
+    IMAGE_CACHE_MAX_AGE = int(os.getenv("IMAGE_CACHE_MAX_AGE", "604800"))
+
+    # Related products kept per product by util/build_related.py and
+    # POST /api/admin/recommendations/rebuild
+    RELATED_TOP_K = int(os.getenv("RELATED_TOP_K", "20"))
+
+    # Columnar analytics: ANALYTICS_ENGINE=1 answers top-sellers,
+    # best-region, overview, revenue/daily and return-rate from NumPy
+    # arrays exported to ANALYTICS_DIR every ANALYTICS_EXPORT_INTERVAL
+    # seconds (see app/analytics.py) instead of GROUP BYs. Until the first
+    # export is done they use SQL. Processes may share ANALYTICS_DIR.
+    ANALYTICS_ENGINE = os.getenv("ANALYTICS_ENGINE", "0") == "1"
+    ANALYTICS_DIR = os.getenv("ANALYTICS_DIR", os.path.join(BASE_DIR, "analytics"))
+    ANALYTICS_EXPORT_INTERVAL = int(os.getenv("ANALYTICS_EXPORT_INTERVAL", "300"))
+
+    # GET /api/stats/top-sellers?window=1d|7d|30d|all&store_id=X: rankings
+    # are rebuilt from the sales_daily counters every
+    # TOP_SELLERS_REFRESH_INTERVAL seconds, keeping TOP_SELLERS_CACHE_SIZE
+    # products per window and store
+    TOP_SELLERS_REFRESH_INTERVAL = int(os.getenv("TOP_SELLERS_REFRESH_INTERVAL", "60"))
+    TOP_SELLERS_CACHE_SIZE = int(os.getenv("TOP_SELLERS_CACHE_SIZE", "100"))
+
+    # GET /api/stats/reorder: sales velocity over the trailing
+    # REORDER_VELOCITY_DAYS, reloaded with stock every
+    # REORDER_REFRESH_INTERVAL seconds (sales_daily itself is refreshed by
+    # the top-sellers cache). By default stock must last
+    # REORDER_LEAD_TIME_DAYS until a delivery and then REORDER_COVER_DAYS more
+    REORDER_VELOCITY_DAYS = int(os.getenv("REORDER_VELOCITY_DAYS", "28"))
+    REORDER_REFRESH_INTERVAL = int(os.getenv("REORDER_REFRESH_INTERVAL", "60"))
+    REORDER_LEAD_TIME_DAYS = int(os.getenv("REORDER_LEAD_TIME_DAYS", "7"))
+    REORDER_COVER_DAYS = int(os.getenv("REORDER_COVER_DAYS", "28"))
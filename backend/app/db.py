@@ -1,14 +1,345 @@
+import glob
+import os
+import re
 import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
 from flask import current_app, g
 
-def get_db():
+from .catalog import ensure_catalog_schema
+from .health import ensure_health_schema, ensure_threshold_schema
+from .inventory import ensure_inventory_schema
+from .recommendations import ensure_related_schema
+from .sales import ensure_sales_schema
+from .sketches import ensure_order_sketches, ensure_sketch_schema
+
+
+class WriteAborted(Exception):
+    """
+    Raise inside a write job to roll that job back and report an error.
+    Handlers turn it into bad_request(message, status_code).
+    """
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def get_db(readonly: bool = False, snapshot: bool = False, shard=None):
+    """
+    Per-request connection.
+
+    readonly=True opens a separate `mode=ro` + `query_only` connection, for
+    blueprints that never write. snapshot=True additionally reads from the
+    periodically refreshed copy at READ_SNAPSHOT_PATH when one is configured
+    (falls back to the live file otherwise).
+
+    shard selects a per-store shard (see shard_for_store); None means the
+    main database.
+    """
+    if shard is not None:
+        key = (shard, readonly or snapshot)
+        shard_dbs = g.setdefault("shard_dbs", {})
+        if key not in shard_dbs:
+            router = current_app.extensions["shard_router"]
+            shard_dbs[key] = router.connect(shard, readonly=key[1])
+        return shard_dbs[key]
+
+    if snapshot:
+        refresher = current_app.extensions.get("snapshot_refresher")
+        if refresher is not None:
+            if "db_snapshot" not in g:
+                refresher.ensure_started()
+                g.db_snapshot = _connect_readonly(refresher.snapshot_path)
+            return g.db_snapshot
+        readonly = True
+
+    if readonly:
+        if "db_ro" not in g:
+            g.db_ro = _connect_readonly(current_app.config["SQLITE_PATH"])
+        return g.db_ro
+
     if "db" not in g:
         g.db = sqlite3.connect(current_app.config["SQLITE_PATH"])
         g.db.row_factory = sqlite3.Row
         g.db.execute("PRAGMA foreign_keys = ON")
     return g.db
 
+
+def _readonly_uri(path: str) -> str:
+    return f"file:{quote(os.path.abspath(path))}?mode=ro"
+
+
+def _connect_readonly(path: str):
+    conn = sqlite3.connect(_readonly_uri(path), uri=True)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+def run_write(fn, shard=None):
+    """
+    Run fn(cur) as a single write transaction and return its result.
+
+    With WRITE_COORDINATOR enabled the job is handed to the writer thread
+    for that database file (see writer.py), which may commit it together
+    with other waiting writes. Otherwise it runs inline on the request
+    connection under BEGIN IMMEDIATE.
+
+    fn must not touch flask.g / request: it may run on another thread.
+    """
+    writers = current_app.extensions.get("writers")
+    if writers is not None:
+        return writers.get(shard).run(fn)
+
+    conn = get_db(shard=shard)
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        result = fn(conn.cursor())
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    signal = current_app.extensions.get("commit_signal")
+    if signal is not None:
+        signal.notify()
+    return result
+
+
+def query_all(sql: str, params=(), snapshot: bool = False) -> list:
+    """
+    Run a read-only query over every store's data and return all rows.
+
+    Without sharding this is a plain query on the main database. With
+    sharding the query runs on every shard in parallel and the rows are
+    concatenated, so callers must re-aggregate anything grouped.
+    """
+    router = current_app.extensions.get("shard_router")
+    if router is None:
+        return get_db(readonly=True, snapshot=snapshot).execute(sql, params).fetchall()
+    return router.query_all(sql, params)
+
+
+def ensure_schema(path: str):
+    """
+    Create the tables added after ddl.sql (inventory ledger, reservations,
+    health thresholds, sales counters, order sketches, catalog indexes,
+    related products)
+    if they are missing, and build the order sketches from the existing
+    orders the first time. Safe to run on every start.
+    """
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA busy_timeout = 5000")
+        conn.execute("BEGIN IMMEDIATE")
+        ensure_inventory_schema(conn.cursor())
+        ensure_health_schema(conn.cursor())
+        ensure_sales_schema(conn.cursor())
+        ensure_sketch_schema(conn.cursor())
+        ensure_order_sketches(conn.cursor())
+        ensure_threshold_schema(conn.cursor())
+        ensure_catalog_schema(conn.cursor())
+        ensure_related_schema(conn.cursor())
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+
+def connect_inventory_dbs(main_path: str, router=None) -> list:
+    """
+    [(shard, read-only connection)] for every file holding Store_Inventory:
+    [(None, main)] without sharding. For background indexes; the caller
+    closes them.
+    """
+    if router is None:
+        return [(None, _connect_readonly(main_path))]
+    return [(shard, router.connect(shard, readonly=True)) for shard in router.shards()]
+
+
 def close_db(e=None):
-    db = g.pop("db", None)
-    if db is not None:
+    for key in ("db", "db_ro", "db_snapshot"):
+        db = g.pop(key, None)
+        if db is not None:
+            db.close()
+    for db in g.pop("shard_dbs", {}).values():
         db.close()
+
+
+# -------------------------------------------------
+# Sharding
+# -------------------------------------------------
+
+# order_id / order_item_id values of shard k live in
+# [k * SHARD_ID_SPAN, (k+1) * SHARD_ID_SPAN), so the shard can be
+# recovered from the id alone. Still well inside JS's safe integer range.
+SHARD_ID_SPAN = 1 << 32
+
+# Per-store tables. Same columns as ddl.sql; foreign keys to the shared
+# tables are dropped because SQLite cannot enforce them across files.
+SHARD_SCHEMA = """
+CREATE TABLE IF NOT EXISTS store_inventory (
+  store_id INTEGER NOT NULL,
+  product_id INTEGER NOT NULL,
+  stock INTEGER DEFAULT NULL,
+  PRIMARY KEY (store_id,product_id)
+);
+
+CREATE TABLE IF NOT EXISTS "order" (
+  order_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  customer_id INTEGER DEFAULT NULL,
+  order_datetime datetime DEFAULT CURRENT_TIMESTAMP,
+  total_price REAL(10,2) DEFAULT NULL,
+  status TEXT  DEFAULT NULL,
+  store_id INTEGER DEFAULT NULL
+);
+
+CREATE TABLE IF NOT EXISTS order_item (
+  order_item_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  order_id INTEGER NOT NULL,
+  product_id INTEGER NOT NULL,
+  unit_price REAL(10,2) DEFAULT NULL,
+  quantity INTEGER DEFAULT NULL,
+  is_return INTEGER DEFAULT NULL,
+  CONSTRAINT fk_item_order FOREIGN KEY (order_id) REFERENCES "order" (order_id) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_order_customer_store ON "order" (customer_id, store_id, status);
+CREATE INDEX IF NOT EXISTS idx_order_item_order ON order_item (order_id);
+"""
+
+
+class ShardRouter:
+    """
+    Maps stores to shard files: shard k holds stores
+    (k-1)*group_size+1 .. k*group_size.
+
+    A shard connection opens the shard file as `main` and attaches the
+    shared database as `shared`. Unqualified names resolve main first,
+    so queries written against the single-file schema run unchanged:
+    Store_Inventory / "order" / order_item come from the shard, and
+    User / Customers / Products / Store from the shared file.
+
+    `shared` is always attached read-only (shared_uri), also on writable
+    connections: BEGIN IMMEDIATE takes a write lock on every attached
+    database that is writable, which would make all shard writers queue
+    on the main file. Shared tables are written through the main
+    database (shard None) only.
+    """
+
+    def __init__(self, main_path: str, shard_dir: str, group_size: int = 1, max_workers: int = 8):
+        self.main_path = main_path
+        self.shared_uri = _readonly_uri(main_path)
+        self.shard_dir = shard_dir
+        self.group_size = max(1, group_size)
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._ready = set()
+        self._pool = None
+
+    def shard_for_store(self, store_id: int) -> int:
+        return (int(store_id) - 1) // self.group_size + 1
+
+    def shard_for_id(self, row_id: int) -> int:
+        # Ids below SHARD_ID_SPAN predate sharding; route them to shard 1,
+        # where they simply are not found
+        return max(1, int(row_id) // SHARD_ID_SPAN)
+
+    def shard_path(self, shard: int) -> str:
+        return os.path.join(self.shard_dir, f"shard_{shard:04d}.db")
+
+    def shards(self) -> list:
+        shards = []
+        for path in glob.glob(os.path.join(self.shard_dir, "shard_*.db")):
+            match = re.fullmatch(r"shard_(\d+)\.db", os.path.basename(path))
+            if match:
+                shards.append(int(match.group(1)))
+        return sorted(shards)
+
+    def ensure_shard(self, shard: int) -> str:
+        """Create the shard file and schema on first use; returns its path."""
+        path = self.shard_path(shard)
+        if shard in self._ready:
+            return path
+
+        with self._lock:
+            if shard in self._ready:
+                return path
+            os.makedirs(self.shard_dir, exist_ok=True)
+            conn = sqlite3.connect(path, isolation_level=None)
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for statement in SHARD_SCHEMA.split(";"):
+                    if statement.strip():
+                        conn.execute(statement)
+                ensure_inventory_schema(conn.cursor())
+                ensure_health_schema(conn.cursor())
+                ensure_sales_schema(conn.cursor())
+                ensure_sketch_schema(conn.cursor())
+                ensure_order_sketches(conn.cursor())
+                # Start this shard's ids at its own range
+                for table in ("order", "order_item"):
+                    seeded = conn.execute(
+                        "SELECT 1 FROM sqlite_sequence WHERE name = ?;", (table,)
+                    ).fetchone()
+                    if seeded is None:
+                        conn.execute(
+                            "INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?);",
+                            (table, shard * SHARD_ID_SPAN),
+                        )
+                conn.execute("COMMIT")
+            finally:
+                conn.close()
+            self._ready.add(shard)
+        return path
+
+    def connect(self, shard: int, readonly: bool = False):
+        path = self.ensure_shard(shard)
+        if readonly:
+            conn = sqlite3.connect(_readonly_uri(path), uri=True)
+            conn.execute("ATTACH DATABASE ? AS shared;", (self.shared_uri,))
+            conn.execute("PRAGMA query_only = ON")
+        else:
+            conn = sqlite3.connect(path, uri=True)
+            conn.execute("ATTACH DATABASE ? AS shared;", (self.shared_uri,))
+            conn.execute("PRAGMA foreign_keys = ON")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def query_all(self, sql: str, params=()) -> list:
+        """Run a read query on every shard in parallel; rows are concatenated."""
+        # With no shards yet, still run once (on an empty shard 1) so
+        # aggregate queries return their usual single row
+        shards = self.shards() or [1]
+
+        def run(shard):
+            conn = self.connect(shard, readonly=True)
+            try:
+                return conn.execute(sql, params).fetchall()
+            finally:
+                conn.close()
+
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="shard-read"
+                )
+        rows = []
+        for shard_rows in self._pool.map(run, shards):
+            rows.extend(shard_rows)
+        return rows
+
+
+def shard_for_store(store_id):
+    """Shard holding store_id's carts, orders and inventory; None without sharding."""
+    router = current_app.extensions.get("shard_router")
+    return router.shard_for_store(store_id) if router is not None else None
+
+
+def shard_for_id(row_id):
+    """Shard holding an order_id / order_item_id; None without sharding."""
+    router = current_app.extensions.get("shard_router")
+    return router.shard_for_id(row_id) if router is not None else None
@@ -0,0 +1,188 @@
+"""
+Offline US zip geocoding for store distance sorting.
+
+data/zip_centroids.csv.gz maps every 5-digit zip to the latitude and
+longitude of its centroid (GeoNames postal code data, CC BY 4.0,
+geonames.org). It is loaded once per process on first use.
+
+StoreLocator answers nearest-store queries from a KD-tree over the
+stores' zip centroids.
+"""
+
+import csv
+import gzip
+import heapq
+import math
+import os
+import sqlite3
+import threading
+import time
+
+ZIP_CENTROIDS = os.path.join(os.path.dirname(__file__), "data", "zip_centroids.csv.gz")
+
+EARTH_RADIUS_MILES = 3958.8
+
+_lock = threading.Lock()
+_centroids = None
+
+
+def normalize_zip(value):
+    """'02116' from '2116', '02116-1234' or 2116; None if it is not a zip."""
+    if value is None:
+        return None
+    digits = str(value).strip().split("-", 1)[0]
+    if not digits.isdigit() or len(digits) > 5:
+        return None
+    return digits.zfill(5)
+
+
+def zip_centroids() -> dict:
+    """{ zip: (lat, lon) } for every zip in the bundled table."""
+    global _centroids
+    with _lock:
+        if _centroids is None:
+            with gzip.open(ZIP_CENTROIDS, "rt", newline="") as f:
+                _centroids = {
+                    row["zip"]: (float(row["lat"]), float(row["lon"]))
+                    for row in csv.DictReader(f)
+                }
+        return _centroids
+
+
+def zip_location(value):
+    """(lat, lon) of a zip's centroid, or None if it is unknown."""
+    zip_code = normalize_zip(value)
+    return zip_centroids().get(zip_code) if zip_code else None
+
+
+def haversine_miles(a, b) -> float:
+    """Great-circle distance between two (lat, lon) points in miles."""
+    lat1, lon1 = map(math.radians, a)
+    lat2, lon2 = map(math.radians, b)
+    h = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_MILES * math.asin(math.sqrt(h))
+
+
+def _unit_vector(location) -> tuple:
+    # Straight-line distance between points on the unit sphere grows with
+    # great-circle distance, so a 3-d KD-tree ranks neighbours correctly
+    lat, lon = map(math.radians, location)
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+
+def _chord_to_miles(chord: float) -> float:
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1.0, chord / 2))
+
+
+class KDTree:
+    """Static 3-d tree over (lat, lon) points for nearest-K queries."""
+
+    def __init__(self, points):
+        # points: iterable of ((lat, lon), item)
+        self._root = self._build([(_unit_vector(loc), item) for loc, item in points], 0)
+
+    def _build(self, points, axis):
+        if not points:
+            return None
+        points.sort(key=lambda p: p[0][axis])
+        mid = len(points) // 2
+        return (
+            points[mid][0],
+            points[mid][1],
+            axis,
+            self._build(points[:mid], (axis + 1) % 3),
+            self._build(points[mid + 1:], (axis + 1) % 3),
+        )
+
+    def nearest(self, location, k: int, max_miles=None) -> list:
+        """[(distance_miles, item)] for the k points closest to location."""
+        target = _unit_vector(location)
+        best = []  # max-heap of (-squared chord, tiebreak, item)
+        limit = math.inf
+        if max_miles is not None:
+            limit = (2 * math.sin(min(max_miles / EARTH_RADIUS_MILES, math.pi) / 2)) ** 2
+        counter = 0
+
+        def visit(node):
+            nonlocal counter
+            if node is None:
+                return
+            point, item, axis, left, right = node
+            d2 = sum((a - b) ** 2 for a, b in zip(point, target))
+            worst = -best[0][0] if len(best) == k else limit
+            if d2 <= worst:
+                counter += 1
+                heapq.heappush(best, (-d2, -counter, item))
+                if len(best) > k:
+                    heapq.heappop(best)
+            diff = target[axis] - point[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            worst = -best[0][0] if len(best) == k else limit
+            if diff * diff <= worst:
+                visit(far)
+
+        if k > 0:
+            visit(self._root)
+        return [
+            (_chord_to_miles(math.sqrt(-neg_d2)), item)
+            for neg_d2, _, item in sorted(best, key=lambda entry: (-entry[0], -entry[1]))
+        ]
+
+
+class StoreLocator:
+    """
+    Nearest stores to a point. Stores are geocoded by zip and put in a
+    KDTree when first needed; the Store table is re-checked at most every
+    check_interval seconds and the tree rebuilt if it changed.
+    """
+
+    def __init__(self, db_path: str, check_interval: float = 30):
+        self.db_path = db_path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._tree = None
+        self._stores = {}
+        self._signature = None
+        self._checked_at = 0.0
+
+    def nearest(self, location, k: int = 10, max_miles=None) -> list:
+        """[{ store_id, store_name, street, city, state, zip, distance_miles }] closest first."""
+        tree, stores = self._current()
+        return [
+            dict(stores[store_id], distance_miles=round(miles, 1))
+            for miles, store_id in tree.nearest(location, k, max_miles)
+        ]
+
+    def _current(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._tree is not None and now - self._checked_at < self.check_interval:
+                return self._tree, self._stores
+            conn = sqlite3.connect(self.db_path)
+            try:
+                rows = conn.execute(
+                    "SELECT store_id, store_name, street, city, state, zip FROM store ORDER BY store_id;"
+                ).fetchall()
+            finally:
+                conn.close()
+            if self._tree is None or rows != self._signature:
+                stores, points = {}, []
+                for store_id, name, street, city, state, zip_code in rows:
+                    stores[store_id] = {
+                        "store_id": store_id,
+                        "store_name": name,
+                        "street": street,
+                        "city": city,
+                        "state": state,
+                        "zip": normalize_zip(zip_code) or zip_code,
+                    }
+                    location = zip_location(zip_code)
+                    if location is not None:
+                        points.append((location, store_id))
+                self._tree, self._stores, self._signature = KDTree(points), stores, rows
+            self._checked_at = now
+            return self._tree, self._stores
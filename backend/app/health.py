@@ -0,0 +1,298 @@
+"""
+Inventory health: sorts every (store, product) into out_of_stock,
+low_stock or overstocked in one pass.
+
+Thresholds come from inventory_threshold (main database). The most
+specific row wins: store + category, then store, then category, then the
+INVENTORY_LOW_STOCK / INVENTORY_OVERSTOCK defaults. A NULL column in a
+row falls through to the next level.
+
+With INVENTORY_HEALTH_INCREMENTAL=1 the buckets are kept in
+inventory_health (next to Store_Inventory) and refresh_health only
+re-classifies pairs with ledger movements since the last refresh.
+HealthRefresher runs it in the background, so reads never write.
+"""
+
+import json
+import threading
+import time
+
+from .inventory import compacted_through, latest_movement_id
+
+HEALTH_BUCKETS = ("out_of_stock", "low_stock", "overstocked")
+
+# Main database only: shard connections see it through the `shared` attach
+THRESHOLD_SCHEMA = """
+CREATE TABLE IF NOT EXISTS inventory_threshold (
+  store_id INTEGER DEFAULT NULL,
+  category TEXT DEFAULT NULL,
+  low_stock INTEGER DEFAULT NULL,
+  overstock INTEGER DEFAULT NULL
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_threshold_scope ON inventory_threshold (IFNULL(store_id, -1), IFNULL(category, ''));
+"""
+
+# Next to Store_Inventory (in each shard with SHARDING=1). Only pairs in a
+# bucket have a row; idx_health_bucket answers the per-bucket counts from
+# the index alone and limits each bucket's page to that bucket's rows.
+HEALTH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS inventory_health (
+  store_id INTEGER NOT NULL,
+  product_id INTEGER NOT NULL,
+  bucket TEXT NOT NULL,
+  stock INTEGER NOT NULL,
+  PRIMARY KEY (store_id, product_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_health_bucket ON inventory_health (bucket, stock);
+
+CREATE TABLE IF NOT EXISTS inventory_health_state (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  through_movement_id INTEGER NOT NULL,
+  thresholds TEXT NOT NULL
+);
+"""
+
+
+def classify_sql(pair_filter: str = "") -> str:
+    """
+    One pass over Store_Inventory: (store_id, product_id, stock, bucket)
+    for every pair in a bucket. Named parameters :low_stock and
+    :overstock are the defaults. pair_filter is an extra WHERE on si.
+    """
+    return f"""
+        SELECT store_id, product_id, stock, bucket
+        FROM (
+            SELECT
+                si.store_id,
+                si.product_id,
+                si.stock AS stock,
+                CASE
+                    WHEN si.stock <= 0 THEN 'out_of_stock'
+                    WHEN si.stock < COALESCE(sc.low_stock, st.low_stock, ct.low_stock, :low_stock)
+                        THEN 'low_stock'
+                    WHEN si.stock > COALESCE(sc.overstock, st.overstock, ct.overstock, :overstock)
+                        THEN 'overstocked'
+                END AS bucket
+            FROM Store_Inventory AS si
+            JOIN products AS p
+              ON p.product_id = si.product_id
+            LEFT JOIN inventory_threshold AS sc
+              ON sc.store_id = si.store_id AND sc.category = p.category
+            LEFT JOIN inventory_threshold AS st
+              ON st.store_id = si.store_id AND st.category IS NULL
+            LEFT JOIN inventory_threshold AS ct
+              ON ct.store_id IS NULL AND ct.category = p.category
+            {pair_filter}
+        )
+        WHERE bucket IS NOT NULL
+    """
+
+
+# ORDER BY of each bucket's list (c = the classified pairs, p = products)
+HEALTH_ORDER_SQL = {
+    "out_of_stock": "p.product_name, c.store_id",
+    "low_stock": "c.stock, p.product_name, c.store_id",
+    "overstocked": "c.stock DESC, p.product_name, c.store_id",
+}
+
+
+def health_report_sql(source: str, buckets, materialize: bool = False) -> str:
+    """
+    One statement over `source` (inventory_health, or classify_sql() in
+    parentheses): a row per bucket with its count in n, then one page of
+    each of `buckets` in HEALTH_ORDER_SQL order, with n NULL. Named
+    parameters :limit (-1 for no limit) and :offset page every bucket.
+    materialize classifies once for the counts and all the pages;
+    otherwise every part reads `source` (and its indexes) directly.
+    """
+    pages = "".join(
+        f"""
+        UNION ALL
+        SELECT * FROM (
+            SELECT c.bucket, NULL, p.product_id, p.product_name, p.img_url,
+                   c.store_id, s.city, s.state, c.stock
+            FROM c
+            JOIN products AS p ON c.product_id = p.product_id
+            JOIN store AS s ON c.store_id = s.store_id
+            WHERE c.bucket = '{name}'
+            ORDER BY {HEALTH_ORDER_SQL[name]}
+            LIMIT :limit OFFSET :offset
+        )"""
+        for name in buckets
+    )
+    return f"""
+        WITH c AS {"" if materialize else "NOT "}MATERIALIZED (
+            SELECT store_id, product_id, stock, bucket FROM {source}
+        )
+        SELECT
+            bucket, COUNT(*) AS n, NULL AS product_id, NULL AS product_name,
+            NULL AS img_url, NULL AS store_id, NULL AS city, NULL AS state, NULL AS stock
+        FROM c
+        GROUP BY bucket
+        {pages};
+    """
+
+
+def ensure_health_schema(cur):
+    for statement in HEALTH_SCHEMA.split(";"):
+        if statement.strip():
+            cur.execute(statement)
+
+
+def ensure_threshold_schema(cur):
+    for statement in THRESHOLD_SCHEMA.split(";"):
+        if statement.strip():
+            cur.execute(statement)
+
+
+def _threshold_signature(cur, low_stock: int, overstock: int) -> str:
+    cur.execute(
+        """
+        SELECT store_id, category, low_stock, overstock
+        FROM inventory_threshold
+        ORDER BY IFNULL(store_id, -1), IFNULL(category, '');
+        """
+    )
+    return json.dumps([low_stock, overstock, [list(row) for row in cur.fetchall()]])
+
+
+def reset_health(cur):
+    """Make the next refresh_health rebuild every bucket (e.g. after product categories changed)."""
+    cur.execute("DELETE FROM inventory_health_state;")
+
+
+def refresh_health(cur, low_stock: int, overstock: int) -> dict:
+    """
+    Bring inventory_health up to date. Re-classifies only the pairs with
+    movements after the last refresh; rebuilds everything when the
+    thresholds changed or the ledger was compacted past the last refresh.
+    Run inside a write transaction.
+
+    Returns: { mode: "full" | "incremental", pairs, through_movement_id }
+    """
+    params = {"low_stock": low_stock, "overstock": overstock}
+    signature = _threshold_signature(cur, low_stock, overstock)
+    latest = latest_movement_id(cur)
+
+    cur.execute("SELECT through_movement_id, thresholds FROM inventory_health_state WHERE id = 1;")
+    state = cur.fetchone()
+
+    if state is None or state[1] != signature or state[0] < compacted_through(cur):
+        cur.execute("DELETE FROM inventory_health;")
+        cur.execute(
+            f"INSERT INTO inventory_health (store_id, product_id, stock, bucket) {classify_sql()};",
+            params,
+        )
+        mode, pairs = "full", cur.rowcount
+    else:
+        cur.execute(
+            """
+            CREATE TEMP TABLE IF NOT EXISTS health_changed (
+              store_id INTEGER NOT NULL,
+              product_id INTEGER NOT NULL,
+              PRIMARY KEY (store_id, product_id)
+            );
+            """
+        )
+        cur.execute("DELETE FROM temp.health_changed;")
+        cur.execute(
+            """
+            INSERT OR IGNORE INTO temp.health_changed (store_id, product_id)
+            SELECT store_id, product_id
+            FROM inventory_movement
+            WHERE movement_id > ?;
+            """,
+            (state[0],),
+        )
+        pairs = cur.rowcount
+        cur.execute(
+            """
+            DELETE FROM inventory_health
+            WHERE (store_id, product_id) IN (SELECT store_id, product_id FROM temp.health_changed);
+            """
+        )
+        cur.execute(
+            f"""
+            INSERT INTO inventory_health (store_id, product_id, stock, bucket)
+            {classify_sql("WHERE (si.store_id, si.product_id) IN (SELECT store_id, product_id FROM temp.health_changed)")};
+            """,
+            params,
+        )
+        cur.execute("DELETE FROM temp.health_changed;")
+        mode = "incremental"
+
+    cur.execute(
+        """
+        INSERT INTO inventory_health_state (id, through_movement_id, thresholds)
+        VALUES (1, ?, ?)
+        ON CONFLICT (id) DO UPDATE SET
+            through_movement_id = excluded.through_movement_id,
+            thresholds = excluded.thresholds;
+        """,
+        (latest, signature),
+    )
+    return {"mode": mode, "pairs": pairs, "through_movement_id": latest}
+
+
+class HealthRefresher:
+    """
+    Keeps inventory_health current: refresh_health on every shard once
+    when first needed, then every `interval` seconds on a background
+    thread, or sooner after wake(). write(fn, shard) must run fn(cur) in
+    a write transaction on one shard (None without sharding); shards()
+    lists them.
+    """
+
+    def __init__(self, write, shards, low_stock: int, overstock: int, interval: int = 30):
+        self._write = write
+        self._shards = shards
+        self.low_stock = low_stock
+        self.overstock = overstock
+        self.interval = max(1, interval)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.refreshed_at = None
+
+    def ensure_started(self):
+        """Make sure the buckets were built once and the refresh thread is running."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self.refreshed_at is None:
+                self._refresh_locked()
+            self._thread = threading.Thread(
+                target=self._run, name="inventory-health-refresh", daemon=True
+            )
+            self._thread.start()
+
+    def wake(self):
+        """Refresh soon instead of at the end of the interval."""
+        self._wake.set()
+
+    def invalidate(self):
+        """Rebuild every bucket on the next refresh, and refresh soon."""
+        for shard in self._shards():
+            self._write(reset_health, shard)
+        self.wake()
+
+    def refresh(self):
+        with self._lock:
+            self._refresh_locked()
+
+    def _refresh_locked(self):
+        for shard in self._shards():
+            self._write(lambda cur: refresh_health(cur, self.low_stock, self.overstock), shard)
+        self.refreshed_at = time.time()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.refresh()
+            except Exception:
+                # Keep the stored buckets; retry next interval
+                pass
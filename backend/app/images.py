@@ -0,0 +1,138 @@
+"""
+Pre-generated product image variants.
+
+util/build_images.py hashes every source image under IMAGE_SOURCE_DIR
+and, in a process pool, writes each variant below IMAGE_CACHE_DIR:
+
+    <cache>/v<VARIANTS_VERSION>/<sha256 of source>/<variant>.<jpg|webp>
+    <cache>/manifest.json   { "Birds/Evelyn_Swan.jpg": "<sha256>", ... }
+
+Unchanged sources keep their hash, so rebuilds skip them. ImageStore
+resolves a Products.img_url to a variant file through the manifest
+(re-read when the build rewrites it); the variant path never changes
+content, so its hash doubles as a strong ETag.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+# Longest side in pixels; None keeps the source size
+IMAGE_VARIANTS = {"thumb": 160, "card": 480, "full": None}
+IMAGE_FORMATS = {"jpeg": ("jpg", "image/jpeg"), "webp": ("webp", "image/webp")}
+SOURCE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+# Bump when the encoder settings below change so every variant is rebuilt
+VARIANTS_VERSION = 1
+_ENCODE = {
+    "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+    "webp": {"format": "WEBP", "quality": 80, "method": 6},
+}
+
+MANIFEST = "manifest.json"
+
+
+def source_key(img_url: str):
+    """'Birds/Evelyn_Swan.jpg' from a Products.img_url (URL or path), or None."""
+    if not img_url:
+        return None
+    path = img_url.split("?", 1)[0].replace("\\", "/")
+    if "product_images/" in path:
+        path = path.rsplit("product_images/", 1)[1]
+    path = path.lstrip("/")
+    return path or None
+
+
+def content_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def variant_dir(cache_dir: str, digest: str) -> str:
+    return os.path.join(cache_dir, f"v{VARIANTS_VERSION}", digest)
+
+
+def variant_name(variant: str, fmt: str) -> str:
+    return f"{variant}.{IMAGE_FORMATS[fmt][0]}"
+
+
+def variants_built(cache_dir: str, digest: str) -> bool:
+    directory = variant_dir(cache_dir, digest)
+    return all(
+        os.path.exists(os.path.join(directory, variant_name(variant, fmt)))
+        for variant in IMAGE_VARIANTS
+        for fmt in IMAGE_FORMATS
+    )
+
+
+def build_variants(source_path: str, cache_dir: str, digest: str) -> str:
+    """
+    Write every variant of one source image (process pool worker).
+    Each file is written under a temporary name and renamed, so the
+    server never sees a partial image. Returns digest.
+    """
+    # Pillow is only needed by the build step, not by the server
+    from PIL import Image
+
+    directory = variant_dir(cache_dir, digest)
+    os.makedirs(directory, exist_ok=True)
+
+    with Image.open(source_path) as source:
+        source = source.convert("RGB")
+        for variant, size in IMAGE_VARIANTS.items():
+            image = source.copy()
+            if size is not None:
+                image.thumbnail((size, size), Image.LANCZOS)
+            for fmt in IMAGE_FORMATS:
+                path = os.path.join(directory, variant_name(variant, fmt))
+                tmp = f"{path}.{os.getpid()}.tmp"
+                image.save(tmp, **_ENCODE[fmt])
+                os.replace(tmp, path)
+    return digest
+
+
+def write_manifest(cache_dir: str, manifest: dict):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, MANIFEST)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+class ImageStore:
+    """Resolves product images to built variants via the build manifest."""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._manifest = {}
+        self._mtime = None
+
+    def _load(self) -> dict:
+        path = os.path.join(self.cache_dir, MANIFEST)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        with self._lock:
+            if mtime != self._mtime:
+                with open(path) as f:
+                    self._manifest = json.load(f)
+                self._mtime = mtime
+            return self._manifest
+
+    def lookup(self, img_url: str, variant: str, fmt: str):
+        """(path, etag) of a built variant, or None if it was never built."""
+        digest = self._load().get(source_key(img_url))
+        if digest is None:
+            return None
+        name = variant_name(variant, fmt)
+        path = os.path.join(variant_dir(self.cache_dir, digest), name)
+        if not os.path.exists(path):
+            return None
+        return path, f"{digest[:32]}-v{VARIANTS_VERSION}-{name}"
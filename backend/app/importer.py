@@ -0,0 +1,254 @@
+import csv
+import io
+import json
+import math
+import time
+
+from .inventory import REASON_IMPORT
+
+# Required columns per import kind. Products may also carry product_id
+# (omit it to insert a new product), category and img_url; other columns
+# are ignored.
+IMPORT_KINDS = {
+    "products": ("product_name", "price"),
+    "inventory": ("store_id", "product_id", "stock"),
+}
+IMPORT_FORMATS = ("csv", "ndjson")
+
+PRODUCTS_UPSERT = """
+    INSERT INTO products (product_id, product_name, category, price, img_url)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (product_id) DO UPDATE SET
+        product_name = excluded.product_name,
+        category = COALESCE(excluded.category, products.category),
+        price = excluded.price,
+        img_url = COALESCE(excluded.img_url, products.img_url);
+"""
+
+
+def _write_products(cur, rows):
+    cur.executemany(PRODUCTS_UPSERT, rows)
+
+
+def _write_inventory(cur, rows):
+    """Upsert stock rows and record the stock changes in the ledger."""
+    cur.execute(
+        """
+        CREATE TEMP TABLE IF NOT EXISTS import_inventory (
+          store_id INTEGER NOT NULL,
+          product_id INTEGER NOT NULL,
+          stock INTEGER NOT NULL,
+          PRIMARY KEY (store_id, product_id)
+        );
+        """
+    )
+    cur.execute("DELETE FROM temp.import_inventory;")
+    # Later rows for the same pair win, as with row-by-row upserts
+    cur.executemany(
+        "INSERT OR REPLACE INTO temp.import_inventory (store_id, product_id, stock) VALUES (?, ?, ?);",
+        rows,
+    )
+    cur.execute(
+        """
+        INSERT INTO inventory_movement (store_id, product_id, delta, reason)
+        SELECT i.store_id, i.product_id, i.stock - COALESCE(si.stock, 0), ?
+        FROM temp.import_inventory AS i
+        LEFT JOIN Store_Inventory AS si
+          ON si.store_id = i.store_id
+         AND si.product_id = i.product_id
+        WHERE i.stock != COALESCE(si.stock, 0);
+        """,
+        (REASON_IMPORT,),
+    )
+    cur.execute(
+        """
+        INSERT INTO Store_Inventory (store_id, product_id, stock)
+        SELECT store_id, product_id, stock
+        FROM temp.import_inventory
+        WHERE true
+        ON CONFLICT (store_id, product_id) DO UPDATE SET
+            stock = excluded.stock;
+        """
+    )
+    cur.execute("DELETE FROM temp.import_inventory;")
+
+
+class ImportRequestError(Exception):
+    """Bad import request (unknown kind/format, unreadable header)."""
+
+
+def iter_records(stream, fmt: str, required=()):
+    """
+    Yield (line_number, dict) from a binary or text stream, one row at a
+    time; the file is never loaded as a whole. Unparseable NDJSON lines
+    yield (line_number, None).
+
+    For CSV, raises ImportRequestError if the header lacks a required column.
+    """
+    if isinstance(stream, io.TextIOBase):
+        text = stream
+    else:
+        text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        if reader.fieldnames is None:
+            return
+        missing = [c for c in required if c not in reader.fieldnames]
+        if missing:
+            raise ImportRequestError(f"CSV header is missing: {', '.join(missing)}")
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == "ndjson":
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield line_number, record if isinstance(record, dict) else None
+    else:
+        raise ImportRequestError(f"format must be one of {', '.join(IMPORT_FORMATS)}")
+
+
+def _blank(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _required(record, field):
+    value = record.get(field)
+    if _blank(value):
+        raise ValueError(f"{field} is required")
+    return value
+
+
+def _integer(value, field):
+    """value as an int; booleans and fractional numbers are rejected, not truncated."""
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f"{field} must be an integer")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be an integer") from None
+
+
+def _validate_product(record, product_ids, store_ids):
+    product_id = None if _blank(record.get("product_id")) else _integer(record["product_id"], "product_id")
+    name = _required(record, "product_name")
+    price = _required(record, "price")
+    if isinstance(price, bool):
+        raise ValueError("price must be a number")
+    price = float(price)
+    if not math.isfinite(price):
+        raise ValueError("price must be a finite number")
+    if price < 0:
+        raise ValueError("price must not be negative")
+    category = None if _blank(record.get("category")) else str(record["category"]).strip()
+    img_url = None if _blank(record.get("img_url")) else str(record["img_url"]).strip()
+    return None, (product_id, str(name).strip(), category, round(price, 2), img_url)
+
+
+def _validate_inventory(record, product_ids, store_ids):
+    store_id = _integer(_required(record, "store_id"), "store_id")
+    product_id = _integer(_required(record, "product_id"), "product_id")
+    stock = _integer(_required(record, "stock"), "stock")
+    if stock < 0:
+        raise ValueError("stock must not be negative")
+    if store_id not in store_ids:
+        raise ValueError(f"unknown store_id {store_id}")
+    if product_id not in product_ids:
+        raise ValueError(f"unknown product_id {product_id}")
+    return store_id, (store_id, product_id, stock)
+
+
+def load_reference_ids(conn):
+    """(store_ids, product_ids) currently in the shared tables."""
+    store_ids = {row[0] for row in conn.execute("SELECT store_id FROM store;")}
+    product_ids = {row[0] for row in conn.execute("SELECT product_id FROM products;")}
+    return store_ids, product_ids
+
+
+def iter_import(stream, kind: str, fmt: str, write, store_ids, product_ids,
+                shard_for_store=None, chunk_size: int = 5000, max_errors: int = 100):
+    """
+    Stream rows from `stream`, validate them in chunks of chunk_size and
+    upsert each chunk in its own transaction (executemany; inventory goes
+    through a temp table so stock changes land in the ledger).
+
+    write(fn, shard) must run fn(cur) as one write transaction (run_write
+    inside the app; a plain connection in the CLI). Inventory rows are
+    grouped by shard_for_store(store_id) when given.
+
+    Rejected rows are skipped; the first max_errors are reported with
+    their line numbers.
+
+    Yields the running summary after every chunk, the last one being final:
+    { kind, format, rows, imported, rejected, errors, seconds, done }
+    """
+    if kind not in IMPORT_KINDS:
+        raise ImportRequestError(f"kind must be one of {', '.join(IMPORT_KINDS)}")
+    if fmt not in IMPORT_FORMATS:
+        raise ImportRequestError(f"format must be one of {', '.join(IMPORT_FORMATS)}")
+
+    validate = _validate_product if kind == "products" else _validate_inventory
+    write_rows = _write_products if kind == "products" else _write_inventory
+
+    started = time.monotonic()
+    summary = {
+        "kind": kind,
+        "format": fmt,
+        "rows": 0,
+        "imported": 0,
+        "rejected": 0,
+        "errors": [],
+        "seconds": 0.0,
+        "done": False,
+    }
+
+    def reject(line_number, message):
+        summary["rejected"] += 1
+        if len(summary["errors"]) < max_errors:
+            summary["errors"].append({"line": line_number, "error": message})
+
+    def flush(chunk):
+        groups = {}
+        for store_id, params in chunk:
+            shard = shard_for_store(store_id) if shard_for_store and store_id is not None else None
+            groups.setdefault(shard, []).append(params)
+        for shard, rows in groups.items():
+            write(lambda cur, rows=rows: write_rows(cur, rows), shard)
+            summary["imported"] += len(rows)
+        summary["seconds"] = round(time.monotonic() - started, 3)
+
+    chunk = []
+    for line_number, record in iter_records(stream, fmt, IMPORT_KINDS[kind]):
+        summary["rows"] += 1
+        if record is None:
+            reject(line_number, "not a JSON object")
+            continue
+        try:
+            chunk.append(validate(record, product_ids, store_ids))
+        except (TypeError, ValueError) as e:
+            reject(line_number, str(e) or "invalid value")
+            continue
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+            yield summary
+
+    if chunk:
+        flush(chunk)
+
+    summary["seconds"] = round(time.monotonic() - started, 3)
+    summary["done"] = True
+    yield summary
+
+
+def run_import(*args, progress=None, **kwargs) -> dict:
+    """iter_import run to completion; progress(summary) is called per chunk."""
+    summary = None
+    for summary in iter_import(*args, **kwargs):
+        if progress is not None and not summary["done"]:
+            progress(summary)
+    return summary
@@ -0,0 +1,242 @@
+"""
+Stock changes and the inventory ledger.
+
+Store_Inventory.stock stays the materialized current stock that every
+read uses. Each change to it also appends a row to inventory_movement in
+the same transaction, so for every (store, product):
+
+    stock = inventory_snapshot.stock + SUM(movements after the snapshot)
+
+compact_ledger folds old movements into inventory_snapshot, and
+reconcile lists the pairs where that equation does not hold.
+
+With STOCK_RESERVATIONS=1, cart lines hold stock in inventory_reservation
+until expires_at (see app/reservations.py). Holds never change stock;
+they only lower what other carts can take.
+"""
+
+# Tables live next to Store_Inventory (in each shard with SHARDING=1)
+INVENTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS inventory_movement (
+  movement_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  store_id INTEGER NOT NULL,
+  product_id INTEGER NOT NULL,
+  delta INTEGER NOT NULL,
+  reason TEXT NOT NULL,
+  order_id INTEGER DEFAULT NULL,
+  movement_datetime datetime DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_movement_store_product ON inventory_movement (store_id, product_id, movement_id);
+CREATE INDEX IF NOT EXISTS idx_movement_datetime ON inventory_movement (movement_datetime);
+CREATE INDEX IF NOT EXISTS idx_movement_store ON inventory_movement (store_id, movement_id);
+
+CREATE TABLE IF NOT EXISTS inventory_snapshot (
+  store_id INTEGER NOT NULL,
+  product_id INTEGER NOT NULL,
+  stock INTEGER NOT NULL DEFAULT 0,
+  through_movement_id INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (store_id, product_id)
+);
+
+CREATE TABLE IF NOT EXISTS inventory_reservation (
+  order_item_id INTEGER PRIMARY KEY,
+  order_id INTEGER NOT NULL,
+  store_id INTEGER NOT NULL,
+  product_id INTEGER NOT NULL,
+  quantity INTEGER NOT NULL,
+  expires_at REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_reservation_store_product ON inventory_reservation (store_id, product_id, expires_at);
+CREATE INDEX IF NOT EXISTS idx_reservation_order ON inventory_reservation (order_id);
+CREATE INDEX IF NOT EXISTS idx_reservation_expires ON inventory_reservation (expires_at);
+"""
+
+# reason values written by the app
+REASON_CHECKOUT = "checkout"
+REASON_RETURN = "return"
+REASON_ADJUST = "adjust"
+REASON_BULK_ADJUST = "bulk_adjust"
+REASON_IMPORT = "import"
+
+
+def ensure_inventory_schema(cur):
+    """
+    Create the ledger and reservation tables if needed. If the ledger is
+    empty, seed the snapshot from the current stock so existing data
+    reconciles. Run inside a write transaction.
+    """
+    for statement in INVENTORY_SCHEMA.split(";"):
+        if statement.strip():
+            cur.execute(statement)
+
+    cur.execute(
+        """
+        SELECT
+            (SELECT COUNT(*) FROM inventory_snapshot) +
+            (SELECT COUNT(*) FROM inventory_movement) AS n;
+        """
+    )
+    if cur.fetchone()[0] == 0:
+        cur.execute(
+            """
+            INSERT INTO inventory_snapshot (store_id, product_id, stock, through_movement_id)
+            SELECT store_id, product_id, COALESCE(stock, 0), 0
+            FROM store_inventory;
+            """
+        )
+
+
+def record_movements(cur, movements):
+    """
+    Append ledger rows. movements: iterable of
+    (store_id, product_id, delta, reason, order_id); zero deltas are skipped.
+    """
+    cur.executemany(
+        """
+        INSERT INTO inventory_movement (store_id, product_id, delta, reason, order_id)
+        VALUES (?, ?, ?, ?, ?);
+        """,
+        [m for m in movements if m[2] != 0],
+    )
+
+
+def adjust_stock(cur, store_id: int, product_id: int, delta: int, reason: str, order_id=None) -> bool:
+    """
+    Add delta to one Store_Inventory row and record it in the ledger.
+    Does not check for negative stock; callers validate first.
+    Returns False (and records nothing) if the row does not exist.
+    """
+    cur.execute(
+        """
+        UPDATE store_inventory
+        SET stock = COALESCE(stock, 0) + ?
+        WHERE store_id = ?
+          AND product_id = ?;
+        """,
+        (delta, store_id, product_id),
+    )
+    if cur.rowcount == 0:
+        return False
+    record_movements(cur, [(store_id, product_id, delta, reason, order_id)])
+    return True
+
+
+def compact_ledger(cur, before: str) -> dict:
+    """
+    Fold every movement recorded before `before` (an SQLite datetime
+    string) into inventory_snapshot and delete those movements.
+    Run inside a write transaction.
+
+    Returns: { folded, through_movement_id }
+    """
+    cur.execute(
+        """
+        SELECT MAX(movement_id)
+        FROM inventory_movement
+        WHERE movement_datetime < ?;
+        """,
+        (before,),
+    )
+    through_id = cur.fetchone()[0]
+    if through_id is None:
+        return {"folded": 0, "through_movement_id": None}
+
+    cur.execute(
+        """
+        INSERT INTO inventory_snapshot (store_id, product_id, stock, through_movement_id)
+        SELECT store_id, product_id, SUM(delta), ?
+        FROM inventory_movement
+        WHERE movement_id <= ?
+        GROUP BY store_id, product_id
+        ON CONFLICT (store_id, product_id) DO UPDATE SET
+            stock = inventory_snapshot.stock + excluded.stock,
+            through_movement_id = excluded.through_movement_id;
+        """,
+        (through_id, through_id),
+    )
+    cur.execute("DELETE FROM inventory_movement WHERE movement_id <= ?;", (through_id,))
+    return {"folded": cur.rowcount, "through_movement_id": through_id}
+
+
+def latest_movement_id(cur) -> int:
+    """Highest movement_id ever assigned (0 if none), compacted ones included."""
+    cur.execute("SELECT seq FROM sqlite_sequence WHERE name = 'inventory_movement';")
+    row = cur.fetchone()
+    return row[0] if row is not None else 0
+
+
+def compacted_through(cur) -> int:
+    """Movements up to this id have been folded away by compact_ledger."""
+    cur.execute("SELECT COALESCE(MAX(through_movement_id), 0) FROM inventory_snapshot;")
+    return cur.fetchone()[0]
+
+
+def changed_since(cur, store_id: int, after_id: int):
+    """
+    Products of one store with movements after after_id.
+    Returns (last movement_id seen, [product_id]); last is after_id if none.
+    """
+    cur.execute(
+        """
+        SELECT product_id, MAX(movement_id) AS last_id
+        FROM inventory_movement
+        WHERE store_id = ?
+          AND movement_id > ?
+        GROUP BY product_id;
+        """,
+        (store_id, after_id),
+    )
+    rows = cur.fetchall()
+    last_id = max((row[1] for row in rows), default=after_id)
+    return last_id, [row[0] for row in rows]
+
+
+def reconcile(cur, store_id=None) -> list:
+    """
+    (store, product) pairs whose stock differs from snapshot + ledger.
+    Returns: [{ store_id, product_id, stock, ledger_stock }]
+    """
+    params = []
+    store_filter = ""
+    if store_id is not None:
+        store_filter = "WHERE k.store_id = ?"
+        params.append(store_id)
+
+    cur.execute(
+        f"""
+        WITH keys AS (
+            SELECT store_id, product_id FROM store_inventory
+            UNION
+            SELECT store_id, product_id FROM inventory_snapshot
+            UNION
+            SELECT store_id, product_id FROM inventory_movement
+        ),
+        moved AS (
+            SELECT store_id, product_id, SUM(delta) AS delta
+            FROM inventory_movement
+            GROUP BY store_id, product_id
+        )
+        SELECT
+            k.store_id,
+            k.product_id,
+            si.stock AS stock,
+            COALESCE(s.stock, 0) + COALESCE(m.delta, 0) AS ledger_stock
+        FROM keys AS k
+        LEFT JOIN store_inventory AS si
+          ON si.store_id = k.store_id AND si.product_id = k.product_id
+        LEFT JOIN inventory_snapshot AS s
+          ON s.store_id = k.store_id AND s.product_id = k.product_id
+        LEFT JOIN moved AS m
+          ON m.store_id = k.store_id AND m.product_id = k.product_id
+        {store_filter}
+        ORDER BY k.store_id, k.product_id;
+        """,
+        params,
+    )
+    return [
+        {"store_id": row[0], "product_id": row[1], "stock": row[2], "ledger_stock": row[3]}
+        for row in cur.fetchall()
+        if (row[2] or 0) != row[3]
+    ]
@@ -0,0 +1,142 @@
+"""
+"Frequently bought together": the top related products for every
+product, precomputed from completed orders into product_related so
+GET /api/products/<product_id>/related is one indexed lookup.
+
+build_related turns the (order, product) pairs of completed,
+non-returned lines into a sparse product x product co-occurrence count
+(how many orders contain both) with NumPy and keeps the related_top_k
+best neighbours of each product. Rebuild it from cron with
+util/build_related.py or with POST /api/admin/recommendations/rebuild.
+"""
+
+import time
+
+# Main database (products are global; order lines may live in shards)
+RELATED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS product_related (
+  product_id INTEGER NOT NULL,
+  rank INTEGER NOT NULL,
+  related_product_id INTEGER NOT NULL,
+  orders_together INTEGER NOT NULL,
+  confidence REAL NOT NULL,
+  PRIMARY KEY (product_id, rank)
+);
+
+CREATE TABLE IF NOT EXISTS product_related_state (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  built_at TEXT NOT NULL,
+  orders INTEGER NOT NULL,
+  pairs INTEGER NOT NULL
+);
+"""
+
+# Every shard (or the main file): one row per product per order
+ORDER_PRODUCTS_SQL = """
+    SELECT DISTINCT oi.order_id, oi.product_id
+    FROM order_item AS oi
+    JOIN "order" AS o
+      ON o.order_id = oi.order_id
+    WHERE o.status = 'complete'
+      AND oi.is_return = 0;
+"""
+
+
+def ensure_related_schema(cur):
+    for statement in RELATED_SCHEMA.split(";"):
+        if statement.strip():
+            cur.execute(statement)
+
+
+def build_related(order_products, top_k: int) -> dict:
+    """
+    order_products: [(order_id, product_id)] without duplicates.
+
+    Returns { rows: [(product_id, rank, related_product_id, orders_together,
+    confidence)], orders, pairs } where confidence is the share of the
+    product's orders that also contain the related product. Neighbours
+    are ranked by orders_together, then product id.
+    """
+    # Only the batch job needs NumPy
+    import numpy as np
+
+    started = time.perf_counter()
+    if not order_products:
+        return {"rows": [], "orders": 0, "pairs": 0, "seconds": 0.0}
+
+    pairs = np.asarray(order_products, dtype=np.int64)
+    product_ids, products = np.unique(pairs[:, 1], return_inverse=True)
+    n = len(product_ids)
+
+    # Sort by order so each basket is a contiguous run
+    by_order = np.argsort(pairs[:, 0], kind="stable")
+    orders = pairs[by_order, 0]
+    products = products[by_order]
+    starts = np.flatnonzero(np.r_[True, orders[1:] != orders[:-1]])
+    sizes = np.diff(np.r_[starts, len(orders)])
+    position = np.arange(len(orders)) - np.repeat(starts, sizes)
+    remaining = np.repeat(sizes, sizes) - position
+
+    # Pair every line with the lines d places after it in the same basket,
+    # one vectorized step per distance d (at most the largest basket)
+    left, right = [], []
+    for d in range(1, int(sizes.max())):
+        i = np.flatnonzero(remaining > d)
+        left.append(products[i])
+        right.append(products[i + d])
+    if not left:
+        return {"rows": [], "orders": len(starts), "pairs": 0,
+                "seconds": round(time.perf_counter() - started, 3)}
+    a = np.concatenate(left + right)
+    b = np.concatenate(right + left)
+
+    # Sparse co-occurrence matrix as (a, b, count) triples
+    codes, together = np.unique(a * n + b, return_counts=True)
+    a, b = codes // n, codes % n
+    orders_with = np.bincount(products, minlength=n)
+    confidence = together / orders_with[a]
+
+    # Best top_k neighbours per product
+    order = np.lexsort((product_ids[b], -together, a))
+    a, b, together, confidence = a[order], b[order], together[order], confidence[order]
+    group_starts = np.flatnonzero(np.r_[True, a[1:] != a[:-1]])
+    rank = np.arange(len(a)) - np.repeat(group_starts, np.diff(np.r_[group_starts, len(a)]))
+    keep = rank < top_k
+
+    rows = list(zip(
+        product_ids[a[keep]].tolist(),
+        (rank[keep] + 1).tolist(),
+        product_ids[b[keep]].tolist(),
+        together[keep].tolist(),
+        np.round(confidence[keep], 4).tolist(),
+    ))
+    return {
+        "rows": rows,
+        "orders": len(starts),
+        "pairs": len(codes),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def replace_related(cur, result: dict):
+    """Swap in a build_related result. Run inside a write transaction."""
+    cur.execute("DELETE FROM product_related;")
+    cur.executemany(
+        """
+        INSERT INTO product_related
+            (product_id, rank, related_product_id, orders_together, confidence)
+        VALUES (?, ?, ?, ?, ?);
+        """,
+        result["rows"],
+    )
+    cur.execute(
+        """
+        INSERT INTO product_related_state (id, built_at, orders, pairs)
+        VALUES (1, datetime('now'), ?, ?)
+        ON CONFLICT (id) DO UPDATE SET
+            built_at = excluded.built_at,
+            orders = excluded.orders,
+            pairs = excluded.pairs;
+        """,
+        (result["orders"], result["pairs"]),
+    )
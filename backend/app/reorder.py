@@ -0,0 +1,166 @@
+"""
+Reorder suggestions from sales velocity (GET /api/stats/reorder).
+
+Every `interval` seconds ReorderPlanner runs one query (REORDER_SQL, on
+every shard with SHARDING=1) loading each Store_Inventory pair's stock
+and units sold in the trailing `days` (net of returns) into NumPy
+columns. It only reads sales_daily; TopSellerCache (app/sales.py) keeps
+it current. A request is
+then one vectorized pass over those columns (plan_reorders):
+
+  daily_velocity    = units sold / days
+  days_of_cover     = stock / daily_velocity (inf when nothing sold)
+  reorder_quantity  = ceil(daily_velocity * (lead_time_days + cover_days) - stock), at least 0
+
+so an order placed now arrives before the stock runs out and then covers
+cover_days more. Pairs are most urgent when their days of cover are
+lowest. Stock is as fresh as the last load, sales as the last
+sales_daily refresh before it.
+"""
+
+import threading
+import time
+
+from .sales import days_start
+
+REORDER_SORTS = ("urgency", "reorder_quantity", "velocity")
+
+REORDER_SQL = """
+    SELECT si.store_id, si.product_id, COALESCE(si.stock, 0), COALESCE(s.units, 0)
+    FROM Store_Inventory AS si
+    LEFT JOIN (
+        SELECT store_id, product_id, SUM(units) AS units
+        FROM sales_daily
+        WHERE day >= ?
+        GROUP BY store_id, product_id
+    ) AS s
+      ON s.store_id = si.store_id
+     AND s.product_id = si.product_id;
+"""
+
+
+def reorder_columns(rows) -> dict:
+    """{ store_id, product_id, stock, units_sold } arrays from REORDER_SQL rows."""
+    # Only the reorder planner needs NumPy
+    import numpy as np
+
+    return {
+        name: np.fromiter((row[i] for row in rows), dtype=np.int64, count=len(rows))
+        for i, name in enumerate(("store_id", "product_id", "stock", "units_sold"))
+    }
+
+
+def plan_reorders(columns: dict, days: int, lead_time_days: float, cover_days: float,
+                  sort: str = "urgency", store_id=None, include_all: bool = False) -> dict:
+    """
+    Returns the reorder_columns plus daily_velocity, days_of_cover and
+    reorder_quantity arrays, and `order`: indexes into them sorted by
+    `sort`, limited to store_id if given and, unless include_all, to
+    pairs that need a reorder.
+    """
+    import numpy as np
+
+    store_ids, product_ids = columns["store_id"], columns["product_id"]
+    on_hand = np.maximum(columns["stock"], 0)
+    velocity = np.maximum(columns["units_sold"], 0) / days
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cover = np.where(velocity > 0, on_hand / velocity, np.inf)
+    reorder = np.maximum(np.ceil(velocity * (lead_time_days + cover_days) - on_hand - 1e-9), 0)
+
+    # Filter first so only the kept pairs are sorted
+    keep = np.ones(len(store_ids), dtype=bool)
+    if store_id is not None:
+        keep &= store_ids == store_id
+    if not include_all:
+        keep &= reorder > 0
+    kept = np.flatnonzero(keep)
+
+    if sort == "reorder_quantity":
+        keys = (product_ids, store_ids, cover, -reorder)
+    elif sort == "velocity":
+        keys = (product_ids, store_ids, cover, -velocity)
+    else:
+        keys = (product_ids, store_ids, -velocity, cover)
+
+    return {
+        **columns,
+        "daily_velocity": velocity,
+        "days_of_cover": cover,
+        "reorder_quantity": reorder.astype(np.int64),
+        "order": kept[np.lexsort([key[kept] for key in keys])],
+    }
+
+
+class ReorderPlanner:
+    """
+    sales is the app's TopSellerCache, which owns the sales_daily
+    refresh; connections() opens [(key, read-only connection)] for every
+    file holding Store_Inventory.
+
+    start() launches the refresh thread, which waits for the cache's
+    first refresh (sales_daily built), loads the columns and reloads them
+    every `interval` seconds. plan() returns None until the first load.
+    """
+
+    def __init__(self, sales, connections, days: int = 28, interval: int = 60):
+        self._sales = sales
+        self._connections = connections
+        self.days = max(1, days)
+        self.interval = max(1, interval)
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._columns = None
+        self._error = None
+        self.refreshed_at = None
+
+    def start(self):
+        """Start the refresh thread (once)."""
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="reorder-refresh", daemon=True
+            )
+            self._thread.start()
+
+    def plan(self, lead_time_days: float, cover_days: float, sort: str = "urgency",
+             store_id=None, include_all: bool = False):
+        """plan_reorders over the loaded columns; None before the first load."""
+        columns = self._columns
+        if columns is None:
+            if self._error is not None:
+                raise self._error
+            return None
+        return plan_reorders(
+            columns, self.days, lead_time_days, cover_days,
+            sort=sort, store_id=store_id, include_all=include_all,
+        )
+
+    def refresh(self):
+        with self._lock:
+            rows = []
+            connections = self._connections()
+            try:
+                for _, conn in connections:
+                    rows.extend(conn.execute(REORDER_SQL, (days_start(self.days),)).fetchall())
+            finally:
+                for _, conn in connections:
+                    conn.close()
+
+            self._columns = reorder_columns(rows)
+            self.refreshed_at = time.time()
+
+    def _run(self):
+        self._sales.ready.wait()
+        while True:
+            try:
+                self.refresh()
+            except ImportError as e:
+                # No NumPy: nothing will ever load, plan() raises this
+                self._error = e
+                return
+            except Exception:
+                # Keep the previous columns; retry next interval
+                pass
+            time.sleep(self.interval)
@@ -0,0 +1,200 @@
+import sqlite3
+import threading
+import time
+
+from flask import current_app
+
+from .db import WriteAborted
+from .writer import WriteQueueFull
+
+
+def reservation_book():
+    """The app's ReservationBook (sweeper started), or None when STOCK_RESERVATIONS is off."""
+    book = current_app.extensions.get("reservation_book")
+    if book is not None:
+        book.ensure_started()
+    return book
+
+
+def available_stock(stock, held: dict, product_id):
+    """stock minus the live holds on product_id (from held_by_product)."""
+    if stock is None or product_id not in held:
+        return stock
+    return max(stock - held[product_id], 0)
+
+
+def hold_stock(cur, store_id: int, product_id: int, order_id: int, order_item_id: int,
+               quantity: int, expires_at: float):
+    """
+    Reserve `quantity` of a product for one cart line until expires_at
+    (unix time), replacing the line's previous hold. Runs inside the cart
+    write job.
+
+    Raises WriteAborted (409) if stock minus other live holds is too small.
+    """
+    cur.execute(
+        """
+        SELECT
+            COALESCE(si.stock, 0)
+            - COALESCE((
+                SELECT SUM(r.quantity)
+                FROM inventory_reservation AS r
+                WHERE r.store_id = si.store_id
+                  AND r.product_id = si.product_id
+                  AND r.expires_at > ?
+                  AND r.order_item_id != ?
+            ), 0) AS available
+        FROM store_inventory AS si
+        WHERE si.store_id = ?
+          AND si.product_id = ?;
+        """,
+        (time.time(), order_item_id, store_id, product_id),
+    )
+    row = cur.fetchone()
+    available = row[0] if row is not None else 0
+
+    if quantity > available:
+        raise WriteAborted(
+            f"only {max(available, 0)} left in stock for this product",
+            status_code=409,
+        )
+
+    cur.execute(
+        """
+        INSERT INTO inventory_reservation
+            (order_item_id, order_id, store_id, product_id, quantity, expires_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (order_item_id) DO UPDATE SET
+            quantity = excluded.quantity,
+            expires_at = excluded.expires_at;
+        """,
+        (order_item_id, order_id, store_id, product_id, quantity, expires_at),
+    )
+
+
+def release_hold(cur, order_item_id: int):
+    cur.execute("DELETE FROM inventory_reservation WHERE order_item_id = ?;", (order_item_id,))
+
+
+def release_expired(cur) -> list:
+    """Delete expired holds; returns the live ones to reload ReservationBook."""
+    cur.execute("DELETE FROM inventory_reservation WHERE expires_at <= ?;", (time.time(),))
+    cur.execute(
+        """
+        SELECT order_item_id, order_id, store_id, product_id, quantity, expires_at
+        FROM inventory_reservation;
+        """
+    )
+    return [tuple(row) for row in cur.fetchall()]
+
+
+class ReservationBook:
+    """
+    In-memory view of the live holds in inventory_reservation, used to
+    show available stock (stock - held) without touching the table on
+    every catalog read.
+
+    Cart writes in this process update it right after their commit. A
+    background thread releases expired holds in bulk every
+    sweep_interval seconds and reloads the book from the table, which
+    also picks up holds made by other processes.
+    """
+
+    def __init__(self, ttl: int, sweep_interval: int, sweep):
+        # sweep() deletes expired holds everywhere and returns the live rows
+        self.ttl = ttl
+        self.sweep_interval = max(1, sweep_interval)
+        self._sweep = sweep
+        self._lock = threading.Lock()
+        self._thread = None
+        # store_id -> product_id -> order_item_id -> (quantity, expires_at)
+        self._held = {}
+        # order_item_id -> (order_id, store_id, product_id)
+        self._items = {}
+        self._journal = None
+
+    def expires_at(self) -> float:
+        return time.time() + self.ttl
+
+    def ensure_started(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="reservation-sweeper", daemon=True
+            )
+            self._thread.start()
+
+    def hold(self, store_id, product_id, order_id, order_item_id, quantity, expires_at):
+        with self._lock:
+            self._log(self._hold_locked, store_id, product_id, order_id, order_item_id, quantity, expires_at)
+
+    def release(self, order_item_id):
+        with self._lock:
+            self._log(self._release_locked, order_item_id)
+
+    def release_order(self, order_id):
+        with self._lock:
+            for order_item_id in [i for i, v in self._items.items() if v[0] == order_id]:
+                self._log(self._release_locked, order_item_id)
+
+    def held_by_product(self, store_id) -> dict:
+        """{ product_id: live held quantity } for one store."""
+        now = time.time()
+        with self._lock:
+            return {
+                product_id: held
+                for product_id, lines in self._held.get(store_id, {}).items()
+                if (held := sum(q for q, expires_at in lines.values() if expires_at > now))
+            }
+
+    def _log(self, op, *args):
+        op(*args)
+        # Changes made while a sweep is reading the table are replayed on
+        # top of what it read, so a hold committed after the read survives
+        if self._journal is not None:
+            self._journal.append((op, args))
+
+    def _hold_locked(self, store_id, product_id, order_id, order_item_id, quantity, expires_at):
+        self._release_locked(order_item_id)
+        self._held.setdefault(store_id, {}).setdefault(product_id, {})[order_item_id] = (
+            quantity, expires_at,
+        )
+        self._items[order_item_id] = (order_id, store_id, product_id)
+
+    def _release_locked(self, order_item_id):
+        entry = self._items.pop(order_item_id, None)
+        if entry is None:
+            return
+        _, store_id, product_id = entry
+        lines = self._held.get(store_id, {}).get(product_id)
+        if lines is not None:
+            lines.pop(order_item_id, None)
+            if not lines:
+                del self._held[store_id][product_id]
+
+    def _reload(self):
+        with self._lock:
+            self._journal = []
+        try:
+            rows = self._sweep()
+        except BaseException:
+            with self._lock:
+                self._journal = None
+            raise
+        with self._lock:
+            journal, self._journal = self._journal, None
+            self._held, self._items = {}, {}
+            for order_item_id, order_id, store_id, product_id, quantity, expires_at in rows:
+                self._hold_locked(store_id, product_id, order_id, order_item_id, quantity, expires_at)
+            for op, args in journal:
+                op(*args)
+
+    def _run(self):
+        while True:
+            try:
+                self._reload()
+            except (sqlite3.Error, WriteQueueFull):
+                # Keep the current view; retry next interval
+                pass
+            time.sleep(self.sweep_interval)
@@ -0,0 +1,260 @@
+"""
+Per-day sales counters and cached top-seller rankings.
+
+sales_daily holds units sold per (order day, store, product), net of
+returns, next to the orders (in each shard with SHARDING=1).
+refresh_sales_daily keeps it current from the inventory ledger like
+refresh_health: checkout and return movements after the last refresh
+are added to the day of their order.
+
+TopSellerCache refreshes the counters every `interval` seconds (it is
+their only writer; ReorderPlanner just reads them) and precomputes the
+top `size` products for each window, globally and per store, so
+GET /api/stats/top-sellers?window=7d&store_id=7 is a dict lookup. The
+endpoint queries order_item directly until the first rankings exist.
+
+SERIES_PERIODS / series_periods back GET /api/stats/revenue/series:
+orders are selected with a range on the indexed order_datetime and
+bucketed by hour, day, week (starting Monday) or month.
+"""
+
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from .inventory import compacted_through, latest_movement_id, REASON_CHECKOUT, REASON_RETURN
+
+# window -> days back including today (None: all time)
+SALES_WINDOWS = {"1d": 1, "7d": 7, "30d": 30, "all": None}
+
+SALES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sales_daily (
+  day TEXT NOT NULL,
+  store_id INTEGER NOT NULL,
+  product_id INTEGER NOT NULL,
+  units INTEGER NOT NULL,
+  PRIMARY KEY (day, store_id, product_id)
+);
+
+CREATE TABLE IF NOT EXISTS sales_daily_state (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  through_movement_id INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_order_status_datetime ON "order" (status, order_datetime);
+CREATE INDEX IF NOT EXISTS idx_order_store_status_datetime ON "order" (store_id, status, order_datetime);
+CREATE INDEX IF NOT EXISTS idx_order_item_order ON order_item (order_id);
+"""
+
+# granularity -> SQL label of an order's period (order_datetime is UTC text)
+SERIES_PERIODS = {
+    "hour": "strftime('%Y-%m-%d %H:00', o.order_datetime)",
+    "day": "DATE(o.order_datetime)",
+    "week": "DATE(o.order_datetime, '-6 days', 'weekday 1')",
+    "month": "strftime('%Y-%m', o.order_datetime)",
+}
+
+_ORDER_DAY = "COALESCE(DATE(o.order_datetime), '1970-01-01')"
+
+
+def ensure_sales_schema(cur):
+    for statement in SALES_SCHEMA.split(";"):
+        if statement.strip():
+            cur.execute(statement)
+
+
+def refresh_sales_daily(cur) -> dict:
+    """
+    Bring sales_daily up to date. Adds only the ledger movements after the
+    last refresh; rebuilds from order_item the first time and when the
+    ledger was compacted past the last refresh. Run inside a write
+    transaction.
+
+    Returns: { mode: "full" | "incremental", through_movement_id }
+    """
+    latest = latest_movement_id(cur)
+    cur.execute("SELECT through_movement_id FROM sales_daily_state WHERE id = 1;")
+    state = cur.fetchone()
+
+    if state is None or state[0] < compacted_through(cur):
+        cur.execute("DELETE FROM sales_daily;")
+        cur.execute(
+            f"""
+            INSERT INTO sales_daily (day, store_id, product_id, units)
+            SELECT {_ORDER_DAY}, o.store_id, oi.product_id, SUM(oi.quantity)
+            FROM order_item AS oi
+            JOIN "order" AS o
+              ON o.order_id = oi.order_id
+            WHERE o.status = 'complete'
+              AND oi.is_return = 0
+            GROUP BY 1, 2, 3;
+            """
+        )
+        mode = "full"
+    else:
+        # A checkout moves stock down and a return moves it back up, so
+        # -delta is the change in units sold on the order's day
+        cur.execute(
+            f"""
+            INSERT INTO sales_daily (day, store_id, product_id, units)
+            SELECT {_ORDER_DAY}, m.store_id, m.product_id, SUM(-m.delta)
+            FROM inventory_movement AS m
+            JOIN "order" AS o
+              ON o.order_id = m.order_id
+            WHERE m.movement_id > ?
+              AND m.reason IN (?, ?)
+            GROUP BY 1, 2, 3
+            ON CONFLICT (day, store_id, product_id) DO UPDATE SET
+                units = units + excluded.units;
+            """,
+            (state[0], REASON_CHECKOUT, REASON_RETURN),
+        )
+        cur.execute("DELETE FROM sales_daily WHERE units = 0;")
+        mode = "incremental"
+
+    cur.execute(
+        """
+        INSERT INTO sales_daily_state (id, through_movement_id)
+        VALUES (1, ?)
+        ON CONFLICT (id) DO UPDATE SET through_movement_id = excluded.through_movement_id;
+        """,
+        (latest,),
+    )
+    return {"mode": mode, "through_movement_id": latest}
+
+
+def series_periods(start: datetime, end: datetime, granularity: str) -> list:
+    """
+    Labels of every period from the one holding start up to (excluding)
+    end, formatted like SERIES_PERIODS, for filling gaps with zeros.
+    """
+    if granularity == "hour":
+        current, step = start.replace(minute=0, second=0, microsecond=0), timedelta(hours=1)
+        fmt = "%Y-%m-%d %H:00"
+    elif granularity == "day":
+        current, step, fmt = start.replace(hour=0, minute=0, second=0, microsecond=0), timedelta(days=1), "%Y-%m-%d"
+    elif granularity == "week":
+        day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        current, step, fmt = day - timedelta(days=day.weekday()), timedelta(days=7), "%Y-%m-%d"
+    else:
+        current, step, fmt = start.replace(day=1, hour=0, minute=0, second=0, microsecond=0), None, "%Y-%m"
+
+    labels = []
+    while current < end:
+        labels.append(current.strftime(fmt))
+        if step is not None:
+            current += step
+        else:
+            current = current.replace(year=current.year + current.month // 12, month=current.month % 12 + 1)
+    return labels
+
+
+def days_start(days: int) -> str:
+    """First day ('YYYY-MM-DD', UTC like order_datetime) of the last `days` days, today included."""
+    return (datetime.now(timezone.utc).date() - timedelta(days=days - 1)).isoformat()
+
+
+def window_start(window: str):
+    """First day of a window, None for all."""
+    days = SALES_WINDOWS[window]
+    if days is None:
+        return None
+    return days_start(days)
+
+
+class TopSellerCache:
+    """
+    refresh(shard) must run refresh_sales_daily in a write transaction on
+    one shard (None without sharding); shards() lists them and
+    connections() opens [(key, read-only connection)] for the same files.
+
+    start() launches the refresh thread, which builds the first rankings
+    right away and then refreshes them every `interval` seconds. Requests
+    never refresh: top() returns None until the first rankings exist, and
+    `ready` is set from then on.
+    """
+
+    def __init__(self, refresh, shards, connections, interval: int = 60, size: int = 100):
+        self._refresh = refresh
+        self._shards = shards
+        self._connections = connections
+        self.interval = max(1, interval)
+        self.size = size
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        # (window, store_id or None) -> [(product_id, units)] best first
+        self._rankings = None
+        self.refreshed_at = None
+        self.ready = threading.Event()
+
+    def start(self):
+        """Start the refresh thread (once)."""
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="top-seller-refresh", daemon=True
+            )
+            self._thread.start()
+
+    def top(self, window: str, store_id=None, limit: int = 10):
+        """[(product_id, units)] for a window, globally or for one store; None before the first refresh."""
+        rankings = self._rankings
+        if rankings is None:
+            return None
+        return rankings.get((window, store_id), [])[:limit]
+
+    def refresh(self):
+        with self._lock:
+            self._refresh_locked()
+
+    def _refresh_locked(self):
+        for shard in self._shards():
+            self._refresh(shard)
+
+        starts = {window: window_start(window) for window in SALES_WINDOWS}
+        per_store = {window: {} for window in SALES_WINDOWS}
+        connections = self._connections()
+        try:
+            for _, conn in connections:
+                for window, start in starts.items():
+                    rows = conn.execute(
+                        """
+                        SELECT store_id, product_id, SUM(units)
+                        FROM sales_daily
+                        WHERE day >= ?
+                        GROUP BY store_id, product_id
+                        HAVING SUM(units) > 0;
+                        """,
+                        (start or "",),
+                    )
+                    for store_id, product_id, units in rows:
+                        per_store[window].setdefault(store_id, []).append((product_id, units))
+        finally:
+            for _, conn in connections:
+                conn.close()
+
+        rankings = {}
+        rank = lambda item: (-item[1], item[0])
+        for window, stores in per_store.items():
+            totals = {}
+            for store_id, items in stores.items():
+                rankings[(window, store_id)] = heapq.nsmallest(self.size, items, key=rank)
+                for product_id, units in items:
+                    totals[product_id] = totals.get(product_id, 0) + units
+            rankings[(window, None)] = heapq.nsmallest(self.size, totals.items(), key=rank)
+
+        self._rankings = rankings
+        self.refreshed_at = time.time()
+        self.ready.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                # Keep the previous rankings; retry next interval
+                pass
+            time.sleep(self.interval)
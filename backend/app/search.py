@@ -0,0 +1,414 @@
+"""
+In-memory product name indexes for search.
+
+TrigramIndex ranks product names by trigram similarity, so misspelled
+queries ("bodacous tucan") still find "Bodacious Beak Toucan".
+ProductSearchIndex holds the current index for the app: built at startup,
+rebuilt after in-process catalog changes (invalidate()) and when a cheap
+signature of the products table changes (checked at most every
+check_interval seconds, to catch imports run from other processes).
+
+AutocompleteIndex serves per-store prefix suggestions from sorted arrays
+(bisect), ranked by units sold. It catches up on stock and sales from
+the inventory ledger after commits instead of reloading everything;
+LedgerIndex holds that logic for it and AvailabilityIndex
+(app/availability.py).
+"""
+
+import bisect
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from .inventory import compacted_through, latest_movement_id, REASON_CHECKOUT, REASON_RETURN
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def trigrams(text: str) -> set:
+    """Trigrams of each lower-cased word, padded like pg_trgm ("  ow", " owl", "owl ")."""
+    grams = set()
+    for word in _WORD.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """Posting lists trigram -> product ids over product names."""
+
+    def __init__(self, products):
+        # products: iterable of (product_id, product_name)
+        self._postings = {}
+        self._sizes = {}
+        for product_id, name in products:
+            grams = trigrams(name or "")
+            self._sizes[product_id] = len(grams)
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(product_id)
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def search(self, query: str, threshold: float = 0.3, limit=100) -> list:
+        """
+        [(product_id, score)] best first, score in (0, 1]; at most limit
+        of them (None: every match).
+
+        score averages the Jaccard similarity of the two trigram sets with
+        the share of the query's trigrams found in the name, so a short
+        query matching one word of a long name still ranks well.
+        """
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self._postings.get(gram, ()))
+
+        n_query = len(query_grams)
+        results = []
+        for product_id, n in shared.items():
+            similarity = n / (n_query + self._sizes[product_id] - n)
+            score = (similarity + n / n_query) / 2
+            if score >= threshold:
+                results.append((product_id, round(score, 4)))
+        results.sort(key=lambda item: (-item[1], item[0]))
+        return results if limit is None else results[:limit]
+
+
+class ProductSearchIndex:
+    """The app's current TrigramIndex over Products, rebuilt when the catalog changes."""
+
+    def __init__(self, db_path: str, check_interval: float = 30):
+        self.db_path = db_path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._index = None
+        self._signature = None
+        self._checked_at = 0.0
+        # Bumped on every rebuild so other indexes know the catalog changed
+        self.version = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._signature = None
+
+    def get(self) -> TrigramIndex:
+        now = time.monotonic()
+        with self._lock:
+            if self._index is not None and self._signature is not None \
+                    and now - self._checked_at < self.check_interval:
+                return self._index
+
+            conn = sqlite3.connect(self.db_path)
+            try:
+                signature = _catalog_signature(conn)
+                if self._index is None or signature != self._signature:
+                    self._index = TrigramIndex(
+                        conn.execute("SELECT product_id, product_name FROM products;")
+                    )
+                    self._signature = signature
+                    self.version += 1
+            finally:
+                conn.close()
+            self._checked_at = now
+            return self._index
+
+
+def _catalog_signature(conn) -> tuple:
+    # Changes with any insert/delete and almost any rename
+    return conn.execute(
+        """
+        SELECT
+            COUNT(*),
+            COALESCE(MAX(product_id), 0),
+            COALESCE(SUM(product_id * (LENGTH(product_name) + 31 * UNICODE(product_name))), 0)
+        FROM products;
+        """
+    ).fetchone()
+
+
+def name_keys(name: str) -> list:
+    """Lower-cased name from each word on: "snoozling owl", "owl"."""
+    words = (name or "").lower().split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+class _StoreSuggestions:
+    """Sorted name keys of one store's products, plus their stock and sales."""
+
+    def __init__(self):
+        self.keys = []
+        self.ids = []
+        self.stock = {}
+        self.sold = {}
+
+    def copy(self):
+        other = _StoreSuggestions()
+        other.keys, other.ids = list(self.keys), list(self.ids)
+        other.stock, other.sold = dict(self.stock), dict(self.sold)
+        return other
+
+    def add(self, product_id, name):
+        for key in name_keys(name):
+            i = bisect.bisect_left(self.keys, key)
+            self.keys.insert(i, key)
+            self.ids.insert(i, product_id)
+
+
+class LedgerIndex:
+    """
+    Base for in-memory indexes that follow the inventory ledger.
+
+    connections() must return [(key, sqlite3.Connection)], one per database
+    file holding Store_Inventory (the main file, or every shard). A
+    background thread, started by the first read, does all the database
+    work: it loads the index, then after every commit_signal (or every
+    check_interval seconds) reads only the ledger rows after its
+    watermark. It reloads fully when search_index rebuilds (catalog
+    change) or the ledger was compacted past the watermark.
+
+    Each load or catch-up builds a new state, leaving the current one
+    untouched, and swaps it in when done. Readers call _current() and
+    only read the state it returns: no queries and no lock once the
+    first load finished, and a commit shows up as soon as the thread has
+    caught up with it.
+
+    Subclasses implement:
+      _new_state()                       empty state for a full reload
+      _load(state, conn)                 add one file's rows to state (inside
+                                         the read transaction the watermark
+                                         was taken in)
+      _finish(state, connections)        -> the loaded state, ready to read
+      _apply(state, cur, watermark)      -> (state, last movement_id) after
+                                         the movements past watermark; the
+                                         same state and None if there were
+                                         none. Must not change `state` itself.
+    """
+
+    def __init__(self, connections, search_index, commit_signal=None, check_interval: float = 30,
+                 load_timeout: float = 30):
+        self._connections = connections
+        self._search_index = search_index
+        self._signal = commit_signal
+        self.check_interval = check_interval
+        self.load_timeout = load_timeout
+        self._lock = threading.Lock()
+        self._thread = None
+        self._loaded = threading.Event()
+        self._state = None
+        self._error = None
+        self._watermarks = {}
+        self._catalog_version = None
+
+    def ensure_started(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name=f"{type(self).__name__}-catch-up", daemon=True
+            )
+            self._thread.start()
+
+    def _current(self):
+        """The current state; the first call waits for the initial load."""
+        state = self._state
+        if state is not None:
+            return state
+        self.ensure_started()
+        self._loaded.wait(self.load_timeout)
+        state = self._state
+        if state is None:
+            raise self._error or sqlite3.OperationalError(f"{type(self).__name__} is still loading")
+        return state
+
+    def _run(self):
+        while True:
+            # Read the version first: a commit landing mid-refresh triggers another
+            seen = self._signal.version if self._signal is not None else None
+            try:
+                self._refresh()
+                self._error = None
+            except Exception as e:
+                # Keep serving the current state; retry after the next commit
+                self._error = e
+            self._loaded.set()
+            if self._signal is not None:
+                self._signal.wait(seen, timeout=self.check_interval)
+            else:
+                time.sleep(self.check_interval)
+
+    def _refresh(self):
+        self._search_index.get()
+        catalog_version = self._search_index.version
+        connections = self._connections()
+        try:
+            state = None
+            if self._state is not None and catalog_version == self._catalog_version:
+                state = self._catch_up(connections)
+            if state is None:
+                state = self._reload(connections)
+        finally:
+            for _, conn in connections:
+                conn.close()
+        self._catalog_version = catalog_version
+        self._state = state
+
+    def _reload(self, connections):
+        state = self._new_state()
+        watermarks = {}
+        for key, conn in connections:
+            # One read transaction so the watermark matches the data read
+            conn.execute("BEGIN")
+            watermarks[key] = latest_movement_id(conn.cursor())
+            self._load(state, conn)
+            conn.execute("COMMIT")
+        state = self._finish(state, connections)
+        self._watermarks = watermarks
+        return state
+
+    def _catch_up(self, connections):
+        """State with the ledger rows after the watermarks; None if a full reload is needed."""
+        state = self._state
+        watermarks = dict(self._watermarks)
+        for key, conn in connections:
+            cur = conn.cursor()
+            watermark = watermarks.get(key)
+            if watermark is None or watermark < compacted_through(cur):
+                return None
+            state, last_id = self._apply(state, cur, watermark)
+            if last_id is not None:
+                watermarks[key] = max(watermark, last_id)
+        self._watermarks = watermarks
+        return state
+
+
+class AutocompleteIndex(LedgerIndex):
+    """
+    Prefix suggestions per store. For each store the product names (and
+    every word-start suffix of them, so "owl" finds "Snoozling Owl") are
+    kept in one sorted list; a prefix is a bisect range over it. Stock and
+    units sold follow the ledger (see LedgerIndex).
+    """
+
+    def suggest(self, store_id: int, prefix: str, limit: int = 10, in_stock: bool = False) -> list:
+        """[{ product_id, product_name, stock, total_sold }] best sellers first."""
+        stores, names = self._current()
+        prefix = " ".join(prefix.lower().split())
+        store = stores.get(store_id)
+        if store is None or not prefix:
+            return []
+        found = set()
+        i = bisect.bisect_left(store.keys, prefix)
+        while i < len(store.keys) and store.keys[i].startswith(prefix):
+            product_id = store.ids[i]
+            if not in_stock or (store.stock.get(product_id) or 0) > 0:
+                found.add(product_id)
+            i += 1
+        ranked = sorted(
+            found,
+            key=lambda pid: (-store.sold.get(pid, 0), names[pid].lower(), pid),
+        )[:limit]
+        return [
+            {
+                "product_id": pid,
+                "product_name": names[pid],
+                "stock": store.stock.get(pid),
+                "total_sold": store.sold.get(pid, 0),
+            }
+            for pid in ranked
+        ]
+
+    def _new_state(self):
+        # (stores, names)
+        return {}, {}
+
+    def _load(self, state, conn):
+        stores, names = state
+        rows = conn.execute(
+            """
+            SELECT si.store_id, si.product_id, p.product_name, si.stock AS stock
+            FROM Store_Inventory AS si
+            JOIN products AS p
+              ON p.product_id = si.product_id
+            ORDER BY si.store_id;
+            """
+        ).fetchall()
+        for store_id, product_id, name, stock in rows:
+            store = stores.setdefault(store_id, _StoreSuggestions())
+            store.stock[product_id] = stock
+            names[product_id] = name
+            for key_ in name_keys(name):
+                store.keys.append(key_)
+                store.ids.append(product_id)
+
+        for store_id, product_id, sold in conn.execute(
+            """
+            SELECT o.store_id, oi.product_id, SUM(oi.quantity)
+            FROM order_item AS oi
+            JOIN "order" AS o
+              ON o.order_id = oi.order_id
+            WHERE o.status = 'complete'
+              AND oi.is_return = 0
+            GROUP BY o.store_id, oi.product_id;
+            """
+        ):
+            if store_id in stores:
+                stores[store_id].sold[product_id] = sold or 0
+
+    def _finish(self, state, connections):
+        stores, names = state
+        for store in stores.values():
+            order = sorted(range(len(store.keys)), key=store.keys.__getitem__)
+            store.keys = [store.keys[i] for i in order]
+            store.ids = [store.ids[i] for i in order]
+        return state
+
+    def _apply(self, state, cur, watermark: int):
+        cur.execute(
+            """
+            SELECT
+                m.store_id,
+                m.product_id,
+                SUM(CASE WHEN m.reason IN (?, ?) THEN -m.delta ELSE 0 END) AS sold,
+                MAX(m.movement_id) AS last_id,
+                si.stock AS stock,
+                p.product_name
+            FROM inventory_movement AS m
+            LEFT JOIN Store_Inventory AS si
+              ON si.store_id = m.store_id
+             AND si.product_id = m.product_id
+            LEFT JOIN products AS p
+              ON p.product_id = m.product_id
+            WHERE m.movement_id > ?
+            GROUP BY m.store_id, m.product_id;
+            """,
+            (REASON_CHECKOUT, REASON_RETURN, watermark),
+        )
+        rows = cur.fetchall()
+        if not rows:
+            return state, None
+
+        # Copy what changes: the touched stores, and names if a product is new
+        stores, names = state
+        stores, copied = dict(stores), set()
+        last = None
+        for store_id, product_id, sold, last_id, stock, name in rows:
+            if store_id not in copied:
+                store = stores.get(store_id)
+                stores[store_id] = store.copy() if store is not None else _StoreSuggestions()
+                copied.add(store_id)
+            store = stores[store_id]
+            if product_id not in store.stock and name is not None:
+                # New Store_Inventory row (e.g. an import)
+                if names.get(product_id) != name:
+                    names = {**names, product_id: name}
+                store.add(product_id, name)
+            store.stock[product_id] = stock
+            store.sold[product_id] = store.sold.get(product_id, 0) + (sold or 0)
+            last = last_id if last is None else max(last, last_id)
+        return (stores, names), last
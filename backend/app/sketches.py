@@ -0,0 +1,279 @@
+"""
+Approximate order analytics: per (order day, store) sketches of distinct
+customers and order values, next to the orders (in each shard with
+SHARDING=1).
+
+  customers:    HyperLogLog, 2^12 registers (about 1.6% standard error),
+                zlib-compressed
+  order_values: log-bucketed quantile sketch (DDSketch-style), every
+                quantile within 1% of the true order value
+
+Both merge exactly (register max / bucket counts), so any range of days
+and stores is answered by merging its rows instead of COUNT(DISTINCT) or
+sorting the orders. The table is built from the existing orders when the
+schema is created (ensure_order_sketches, from ensure_schema and
+ShardRouter.ensure_shard), then perform_checkout adds each completed
+order with record_order, so reads never write. Returns do not change the
+sketches.
+"""
+
+import math
+import struct
+import zlib
+
+SKETCH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS order_sketch (
+  day TEXT NOT NULL,
+  store_id INTEGER NOT NULL,
+  orders INTEGER NOT NULL,
+  customers BLOB NOT NULL,
+  order_values BLOB NOT NULL,
+  PRIMARY KEY (day, store_id)
+);
+
+CREATE TABLE IF NOT EXISTS order_sketch_state (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  built_at TEXT NOT NULL
+);
+"""
+
+HLL_PRECISION = 12
+QUANTILE_ACCURACY = 0.01
+
+_ORDER_DAY = "COALESCE(DATE(o.order_datetime), '1970-01-01')"
+_MASK64 = (1 << 64) - 1
+
+
+def _hash64(value: int) -> int:
+    # splitmix64 finalizer: spreads sequential ids over all 64 bits
+    z = (value + 0x9E3779B97F4A7C15) & _MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
+
+
+class HyperLogLog:
+    """Distinct count of integer ids in 2^precision one-byte registers."""
+
+    def __init__(self, registers=None, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.registers = bytearray(registers if registers is not None else 1 << precision)
+
+    def add(self, value: int):
+        h = _hash64(value)
+        bits = 64 - self.precision
+        index = h >> bits
+        rank = bits - (h & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    @classmethod
+    def union(cls, sketches) -> "HyperLogLog":
+        """One sketch of everything counted by sketches (one pass per register)."""
+        sketches = list(sketches)
+        if not sketches:
+            return cls()
+        if len(sketches) == 1:
+            return cls(sketches[0].registers, sketches[0].precision)
+        return cls(bytes(map(max, *(s.registers for s in sketches))), sketches[0].precision)
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small sets
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def to_bytes(self) -> bytes:
+        return zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        registers = zlib.decompress(data)
+        return cls(registers, len(registers).bit_length() - 1)
+
+
+class QuantileSketch:
+    """
+    Counts of positive values per logarithmic bucket (bucket k holds
+    (gamma^(k-1), gamma^k]); non-positive values are counted as zero.
+    """
+
+    def __init__(self, accuracy: float = QUANTILE_ACCURACY):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zeros = 0
+
+    @property
+    def count(self) -> int:
+        return self.zeros + sum(self.buckets.values())
+
+    def add(self, value: float):
+        if value is None or value <= 0:
+            self.zeros += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        self.zeros += other.zeros
+        for key, n in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + n
+        return self
+
+    def quantile(self, q: float):
+        """Value at quantile q (0..1), None if empty."""
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                # Midpoint of the bucket in relative terms
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def to_bytes(self) -> bytes:
+        items = sorted(self.buckets.items())
+        return struct.pack(
+            f"<dI{2 * len(items)}i",
+            self.accuracy,
+            self.zeros,
+            *(x for item in items for x in item),
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "QuantileSketch":
+        accuracy, zeros = struct.unpack_from("<dI", data)
+        values = struct.unpack_from(f"<{(len(data) - 12) // 4}i", data, 12)
+        sketch = cls(accuracy)
+        sketch.zeros = zeros
+        sketch.buckets = dict(zip(values[::2], values[1::2]))
+        return sketch
+
+
+def ensure_sketch_schema(cur):
+    for statement in SKETCH_SCHEMA.split(";"):
+        if statement.strip():
+            cur.execute(statement)
+
+
+def _save(cur, day: str, store_id: int, orders: int, customers, order_values):
+    cur.execute(
+        """
+        INSERT INTO order_sketch (day, store_id, orders, customers, order_values)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (day, store_id) DO UPDATE SET
+            orders = excluded.orders,
+            customers = excluded.customers,
+            order_values = excluded.order_values;
+        """,
+        (day, store_id, orders, customers.to_bytes(), order_values.to_bytes()),
+    )
+
+
+def rebuild_order_sketches(cur) -> dict:
+    """
+    Rebuild order_sketch from every completed order. Run inside a write
+    transaction.
+
+    Returns: { rows, orders }
+    """
+    cur.execute("DELETE FROM order_sketch;")
+    cur.execute(
+        f"""
+        SELECT {_ORDER_DAY}, o.store_id, o.customer_id, o.total_price
+        FROM "order" AS o
+        WHERE o.status = 'complete'
+          AND o.store_id IS NOT NULL
+        ORDER BY 1, 2;
+        """
+    )
+    key, rows, orders = None, 0, 0
+    for day, store_id, customer_id, total_price in cur.fetchall():
+        if (day, store_id) != key:
+            if key is not None:
+                _save(cur, *key, count, customers, order_values)
+                rows += 1
+            key, count = (day, store_id), 0
+            customers, order_values = HyperLogLog(), QuantileSketch()
+        if customer_id is not None:
+            customers.add(customer_id)
+        order_values.add(total_price)
+        count += 1
+        orders += 1
+    if key is not None:
+        _save(cur, *key, count, customers, order_values)
+        rows += 1
+
+    cur.execute(
+        """
+        INSERT INTO order_sketch_state (id, built_at)
+        VALUES (1, datetime('now'))
+        ON CONFLICT (id) DO UPDATE SET built_at = excluded.built_at;
+        """
+    )
+    return {"rows": rows, "orders": orders}
+
+
+def ensure_order_sketches(cur) -> dict:
+    """Build order_sketch if it never was. Run inside a write transaction."""
+    cur.execute("SELECT 1 FROM order_sketch_state WHERE id = 1;")
+    if cur.fetchone() is not None:
+        return {"mode": "ready"}
+    return {"mode": "full", **rebuild_order_sketches(cur)}
+
+
+def record_order(cur, order_id: int):
+    """
+    Add a just-completed order to its day and store's sketches (on the
+    caller's transaction). Skipped until the table has been built, since
+    the first build reads every completed order anyway.
+    """
+    cur.execute("SELECT 1 FROM order_sketch_state WHERE id = 1;")
+    if cur.fetchone() is None:
+        return
+
+    cur.execute(
+        f"""
+        SELECT {_ORDER_DAY}, o.store_id, o.customer_id, o.total_price
+        FROM "order" AS o
+        WHERE o.order_id = ?
+          AND o.store_id IS NOT NULL;
+        """,
+        (order_id,),
+    )
+    order = cur.fetchone()
+    if order is None:
+        return
+    day, store_id, customer_id, total_price = order
+
+    cur.execute(
+        "SELECT orders, customers, order_values FROM order_sketch WHERE day = ? AND store_id = ?;",
+        (day, store_id),
+    )
+    row = cur.fetchone()
+    if row is None:
+        orders, customers, order_values = 0, HyperLogLog(), QuantileSketch()
+    else:
+        orders = row[0]
+        customers = HyperLogLog.from_bytes(row[1])
+        order_values = QuantileSketch.from_bytes(row[2])
+
+    if customer_id is not None:
+        customers.add(customer_id)
+    order_values.add(total_price)
+    _save(cur, day, store_id, orders + 1, customers, order_values)
@@ -0,0 +1,57 @@
+import os
+import sqlite3
+import threading
+import time
+
+from .backup import backup_database
+
+
+class SnapshotRefresher:
+    """
+    Keeps a read-only copy of the live database for analytics.
+
+    Every `interval` seconds the live file is copied with backup_database
+    (paged online backup, see backup.py), which atomically replaces
+    snapshot_path. Connections already open keep reading the old copy;
+    new connections see the new one.
+    """
+
+    def __init__(self, source_path: str, snapshot_path: str, interval: int = 300,
+                 pages: int = 256, sleep: float = 0.005):
+        self.source_path = source_path
+        self.snapshot_path = snapshot_path
+        self.interval = max(1, interval)
+        self.pages = pages
+        self.sleep = sleep
+        self.last_refresh = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def ensure_started(self):
+        """Make sure a snapshot exists and the refresh thread is running."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if not os.path.exists(self.snapshot_path):
+                self._refresh_locked()
+            self._thread = threading.Thread(
+                target=self._run, name="snapshot-refresher", daemon=True
+            )
+            self._thread.start()
+
+    def refresh(self):
+        with self._lock:
+            self._refresh_locked()
+
+    def _refresh_locked(self):
+        backup_database(self.source_path, self.snapshot_path, pages=self.pages, sleep=self.sleep)
+        self.last_refresh = time.time()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.refresh()
+            except (sqlite3.Error, OSError):
+                # Keep serving the previous snapshot; retry next interval
+                pass
@@ -0,0 +1,265 @@
+import collections
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+log = logging.getLogger(__name__)
+
+
+class WriteQueueFull(Exception):
+    """Raised when a write could not be started within the configured wait."""
+
+
+class CommitSignal:
+    """
+    Wakes threads waiting for "something was committed" (e.g. inventory
+    streams). Waiters remember version and wait for it to change.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._cond = threading.Condition()
+
+    def notify(self):
+        with self._cond:
+            self.version += 1
+            self._cond.notify_all()
+
+    def wait(self, seen: int, timeout: float) -> bool:
+        """Wait until version != seen; False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.version != seen, timeout=timeout)
+
+
+class WriteCoordinator:
+    """
+    Serializes all write transactions of this process through one writer
+    thread that owns its own SQLite connection.
+
+    Callers hand in a job: a function taking a cursor and returning a
+    result. The writer takes the next job plus whatever else is already
+    waiting (up to batch_size), runs them in one BEGIN IMMEDIATE ... COMMIT
+    with a SAVEPOINT per job, and resolves each job's Future. A job that
+    raises is rolled back to its savepoint only; the exception is handed
+    back to its caller.
+
+    The queue is bounded. run() waits at most wait_timeout for the job to
+    be picked up and raises WriteQueueFull otherwise, so callers get
+    backpressure instead of "database is locked".
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_queue: int = 256,
+        batch_size: int = 50,
+        wait_timeout: float = 5.0,
+        journal_mode: str = "wal",
+        attach=None,
+        on_commit=None,
+    ):
+        self.db_path = db_path
+        # Called on the writer thread after every successful COMMIT, once
+        # the batch's futures are resolved; exceptions are logged
+        self.on_commit = on_commit
+        # { alias: path or file: URI } attached to the writer's connection
+        self.attach = attach or {}
+        self.batch_size = max(1, batch_size)
+        self.wait_timeout = wait_timeout
+        self.journal_mode = journal_mode
+        self._queue = queue.Queue(maxsize=max(1, max_queue))
+        self._lock = threading.Lock()
+        self._thread = None
+
+        # Contention metrics
+        self._max_depth = 0
+        self._jobs = 0
+        self._failed = 0
+        self._rejected = 0
+        self._batches = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._recent_waits = collections.deque(maxlen=1000)
+
+    # ------------------------
+    # Public API
+    # ------------------------
+
+    def submit(self, fn, timeout=None) -> Future:
+        """
+        Queue fn(cur) and return its Future without waiting for it to run.
+        Blocks up to timeout for a free queue slot.
+        """
+        self._ensure_writer()
+        future = Future()
+        try:
+            self._queue.put((fn, future, time.monotonic()), timeout=timeout)
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            raise WriteQueueFull("write queue is full, try again later")
+
+        depth = self._queue.qsize()
+        with self._lock:
+            self._max_depth = max(self._max_depth, depth)
+        return future
+
+    def run(self, fn):
+        """
+        Run fn(cur) in a write transaction and return its result.
+        Re-raises whatever fn raised. Raises WriteQueueFull if the job
+        was not started within wait_timeout.
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        future = self.submit(fn, timeout=self.wait_timeout)
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            # Not started yet -> drop it; already running -> let it finish
+            if future.cancel():
+                with self._lock:
+                    self._rejected += 1
+                raise WriteQueueFull("timed out waiting for the database writer")
+            return future.result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self._recent_waits)
+            jobs = self._jobs
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self._max_depth,
+                "queue_capacity": self._queue.maxsize,
+                "jobs": jobs,
+                "failed_jobs": self._failed,
+                "rejected_jobs": self._rejected,
+                "batches": self._batches,
+                "avg_batch_size": round(jobs / self._batches, 2) if self._batches else 0,
+                "avg_wait_ms": round(self._wait_total / jobs * 1000, 3) if jobs else 0,
+                "max_wait_ms": round(self._wait_max * 1000, 3),
+                "p50_wait_ms": _percentile_ms(waits, 0.50),
+                "p95_wait_ms": _percentile_ms(waits, 0.95),
+            }
+
+    # ------------------------
+    # Writer thread
+    # ------------------------
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="db-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _connect(self):
+        # isolation_level=None: the writer issues BEGIN/COMMIT itself;
+        # uri=True so attach can name file: URIs (e.g. mode=ro)
+        conn = sqlite3.connect(self.db_path, isolation_level=None, uri=True)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute("PRAGMA busy_timeout = 5000")
+        if self.journal_mode:
+            conn.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+        for alias, path in self.attach.items():
+            conn.execute(f"ATTACH DATABASE ? AS {alias};", (path,))
+        return conn
+
+    def _run(self):
+        conn = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._process_batch(conn, batch)
+
+    def _process_batch(self, conn, batch):
+        started = time.monotonic()
+        jobs = []
+        for fn, future, enqueued_at in batch:
+            if future.set_running_or_notify_cancel():
+                jobs.append((fn, future, started - enqueued_at))
+        if not jobs:
+            return
+
+        outcomes = []
+        cur = conn.cursor()
+        try:
+            cur.execute("BEGIN IMMEDIATE")
+            for fn, future, _ in jobs:
+                cur.execute("SAVEPOINT job")
+                try:
+                    outcomes.append((future, fn(cur), None))
+                except Exception as e:
+                    cur.execute("ROLLBACK TO job")
+                    outcomes.append((future, None, e))
+                cur.execute("RELEASE job")
+            cur.execute("COMMIT")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.rollback()
+            outcomes = [(future, None, e) for _, future, _ in jobs]
+            committed = False
+        else:
+            committed = True
+
+        with self._lock:
+            self._batches += 1
+            self._jobs += len(jobs)
+            self._failed += sum(1 for _, _, error in outcomes if error is not None)
+            for _, _, waited in jobs:
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+                self._recent_waits.append(waited)
+
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        # After the futures: the batch is committed whatever the callback does
+        if committed and self.on_commit is not None:
+            try:
+                self.on_commit()
+            except Exception:
+                log.exception("on_commit callback failed")
+
+
+class WriterPool:
+    """
+    One WriteCoordinator per database file, created on first use.
+    Key None is the main database; other keys are shard numbers.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._writers = {}
+        self._lock = threading.Lock()
+
+    def get(self, key=None) -> WriteCoordinator:
+        with self._lock:
+            writer = self._writers.get(key)
+            if writer is None:
+                writer = self._factory(key)
+                self._writers[key] = writer
+            return writer
+
+    def stats(self) -> dict:
+        with self._lock:
+            writers = dict(self._writers)
+        return {key: writer.stats() for key, writer in writers.items()}
+
+
+def _percentile_ms(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return round(sorted_values[index] * 1000, 3)
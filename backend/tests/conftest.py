@@ -0,0 +1,42 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app import create_app
+from app.config import Config
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """A scratch copy of the sample database.db."""
+    path = tmp_path / "database.db"
+    shutil.copy(os.path.join(BACKEND_DIR, "database.db"), path)
+    return str(path)
+
+
+@pytest.fixture
+def make_app(db_path, tmp_path, monkeypatch):
+    """
+    create_app() on the scratch database, every runtime directory under
+    tmp_path. Keyword arguments override Config settings.
+    """
+
+    def make(**settings):
+        settings = {
+            "SQLITE_PATH": db_path,
+            "SHARD_DIR": str(tmp_path / "shards"),
+            "BACKUP_DIR": str(tmp_path / "backups"),
+            "IMAGE_CACHE_DIR": str(tmp_path / "image_cache"),
+            "ANALYTICS_DIR": str(tmp_path / "analytics"),
+            **settings,
+        }
+        for name, value in settings.items():
+            monkeypatch.setattr(Config, name, value)
+        return create_app()
+
+    return make
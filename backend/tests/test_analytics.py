@@ -0,0 +1,122 @@
+import json
+import os
+import sqlite3
+import time
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from app import analytics  # noqa: E402
+from app.analytics import AnalyticsEngine  # noqa: E402
+
+STATS_URLS = [
+    "/api/stats/top-sellers?limit=50",
+    "/api/stats/best-region",
+    "/api/stats/overview",
+    "/api/stats/revenue/daily?date_start=2000-01-01&date_end=2030-01-01",
+    "/api/stats/return-rate",
+]
+
+
+def stats(app):
+    client = app.test_client()
+    results = {}
+    for url in STATS_URLS:
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.get_json())
+        results[url] = response.get_json()
+    return results
+
+
+def columnar_app(make_app, **settings):
+    """An ANALYTICS_ENGINE app with its first generation exported."""
+    app = make_app(ANALYTICS_ENGINE=True, **settings)
+    app.extensions["analytics_engine"].refresh()
+    assert app.extensions["analytics_engine"].current() is not None
+    return app
+
+
+def generations(tmp_path):
+    return sorted(p.name for p in (tmp_path / "analytics").iterdir() if p.name.startswith("gen-"))
+
+
+def test_columnar_stats_match_sql(make_app, monkeypatch):
+    sql = stats(make_app())
+    assert stats(columnar_app(make_app)) == sql
+
+    # Streamed in chunks smaller than the tables
+    monkeypatch.setattr(analytics, "EXPORT_CHUNK_ROWS", 7)
+    app = make_app(ANALYTICS_ENGINE=True)
+    app.extensions["analytics_engine"].export()
+    assert stats(app) == sql
+
+
+def test_sql_answers_until_the_first_export(make_app, monkeypatch):
+    monkeypatch.setattr(AnalyticsEngine, "start", lambda self: None)
+    app = make_app(ANALYTICS_ENGINE=True)
+    assert app.extensions["analytics_engine"].current() is None
+    assert stats(app) == stats(make_app())
+
+
+def test_columnar_stats_match_sql_with_missing_values(make_app, db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        # A line that is neither sold nor returned, and an order with no store
+        conn.execute(
+            "UPDATE order_item SET is_return = NULL "
+            "WHERE order_item_id = (SELECT MIN(order_item_id) FROM order_item);"
+        )
+        conn.execute(
+            'UPDATE "order" SET store_id = NULL '
+            "WHERE order_id = (SELECT MAX(order_id) FROM \"order\" WHERE status = 'complete');"
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+    sql = stats(make_app())
+    columnar = stats(columnar_app(make_app))
+    assert columnar == sql
+
+
+def test_export_switches_generations_and_prunes_old_ones(make_app, tmp_path):
+    engine = columnar_app(make_app).extensions["analytics_engine"]
+    first = engine.current()
+    orders = len(first.orders["order_id"])
+    assert orders > 0
+
+    # Left over from long ago
+    old = tmp_path / "analytics" / "gen-1000000000"
+    old.mkdir()
+    engine.export()
+    engine.export()
+    assert engine.current().path != first.path
+    assert len(engine.current().orders["order_id"]) == orders
+    # Recent generations stay for other readers; the old one is gone
+    assert len(generations(tmp_path)) == 3
+    assert not old.exists()
+
+
+def test_fresh_generation_is_adopted_after_a_restart(make_app, tmp_path):
+    engine = columnar_app(make_app, ANALYTICS_EXPORT_INTERVAL=300).extensions["analytics_engine"]
+    path = engine.current().path
+
+    # Another process (or this one restarted) reuses it instead of exporting
+    other = AnalyticsEngine(lambda: [], str(tmp_path / "analytics"), interval=300)
+    other.refresh()
+    assert other.current().path == path
+    assert generations(tmp_path) == [os.path.basename(path)]
+
+
+def test_stale_generation_is_not_served(make_app, tmp_path):
+    engine = columnar_app(make_app, ANALYTICS_EXPORT_INTERVAL=300).extensions["analytics_engine"]
+    stale = engine.current().path
+    with open(os.path.join(stale, "meta.json"), "w") as f:
+        json.dump({"exported_at": time.time() - 301}, f)
+
+    app = make_app(ANALYTICS_ENGINE=True, ANALYTICS_EXPORT_INTERVAL=300)
+    restarted = app.extensions["analytics_engine"]
+    restarted.refresh()
+    assert restarted.current().path != stale
+    assert time.time() - restarted.current().exported_at < 300
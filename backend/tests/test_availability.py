@@ -0,0 +1,93 @@
+import io
+import sqlite3
+import time
+
+import pytest
+
+# Product 1 is stocked at stores 1 (Pittsburgh), 4 (Boston) and 5 (Washington)
+PRODUCT_ID = 1
+
+
+@pytest.fixture
+def stock(db_path):
+    """{ store_id: stock } of PRODUCT_ID."""
+    conn = sqlite3.connect(db_path)
+    try:
+        return dict(conn.execute(
+            "SELECT store_id, stock FROM store_inventory WHERE product_id = ?;", (PRODUCT_ID,)
+        ).fetchall())
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def client(make_app):
+    return make_app().test_client()
+
+
+def availability(client, **params):
+    response = client.get(f"/api/products/{PRODUCT_ID}/availability", query_string=params)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()["stores"]
+
+
+def eventually(read, expected, timeout=5):
+    deadline = time.monotonic() + timeout
+    value = read()
+    while value != expected and time.monotonic() < deadline:
+        time.sleep(0.01)
+        value = read()
+    return value
+
+
+def test_most_stock_first(client, stock):
+    stores = availability(client)
+    assert [(s["store_id"], s["stock"]) for s in stores] == sorted(stock.items(), key=lambda item: (-item[1], item[0]))
+    assert all(s["distance_miles"] is None for s in stores)
+
+    in_stock = availability(client, in_stock=1, limit=1)
+    assert [s["store_id"] for s in in_stock] == [max(stock, key=stock.get)]
+
+
+def test_nearest_first(client, stock):
+    assert [s["store_id"] for s in availability(client, zip="02116")] == [4, 5, 1]
+
+    stores = availability(client, zip="15213")
+    assert [s["store_id"] for s in stores] == [1, 5, 4]
+    assert stores[0]["distance_miles"] == 0
+    assert 150 < stores[1]["distance_miles"] < 250
+
+
+def test_follows_stock_changes_and_new_stores(client, db_path, stock):
+    response = client.post(
+        "/api/admin/inventory/adjust",
+        json={"store_id": 5, "product_id": PRODUCT_ID, "adjustment": -stock[5]},
+    )
+    assert response.status_code == 200
+    by_store = lambda: {s["store_id"]: s for s in availability(client)}
+    read = lambda: {store_id: s["stock"] for store_id, s in by_store().items()}
+    assert eventually(read, {**stock, 5: 0}) == {**stock, 5: 0}
+
+    # A store opened after the index loaded, stocked through an import
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute(
+            "INSERT INTO store (store_id, store_name, city, state, zip) "
+            "VALUES (6, 'Uptown', 'Seattle', 'WA', '98112');"
+        )
+    conn.close()
+    response = client.post(
+        "/api/admin/import?kind=inventory&format=csv",
+        data={"file": (io.BytesIO(f"store_id,product_id,stock\n6,{PRODUCT_ID},3\n".encode()), "stock.csv")},
+    )
+    assert response.get_json()["imported"] == 1
+
+    assert eventually(lambda: read().get(6), 3) == 3
+    store = by_store()[6]
+    assert (store["store_name"], store["city"], store["zip"]) == ("Uptown", "Seattle", "98112")
+
+
+def test_errors(client):
+    assert client.get("/api/products/999999/availability").status_code == 404
+    assert client.get(f"/api/products/{PRODUCT_ID}/availability?zip=00000").status_code == 400
+    assert client.get(f"/api/products/{PRODUCT_ID}/availability?limit=0").status_code == 400
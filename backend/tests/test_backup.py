@@ -0,0 +1,77 @@
+import gzip
+import os
+import sqlite3
+
+from app.backup import create_backup, list_backups
+from app.db import ShardRouter
+from test_sharding import split
+
+
+def rows(path, table):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f'SELECT COUNT(*) FROM "{table}";').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_backup_copies_and_prunes(db_path, tmp_path):
+    backup_dir = str(tmp_path / "backups")
+    for _ in range(3):
+        result = create_backup(db_path, backup_dir, keep=2)
+
+    assert [f["method"] for f in result["files"]] == ["backup"]
+    copy = os.path.join(backup_dir, result["files"][0]["file"])
+    assert rows(copy, "order") == rows(db_path, "order")
+    assert len(list_backups(backup_dir)) == 2
+    assert list_backups(backup_dir)[0]["name"] == result["name"]
+
+
+def test_compressed_backup(db_path, tmp_path):
+    result = create_backup(db_path, str(tmp_path / "backups"), compress=True)
+    path = os.path.join(tmp_path, "backups", result["files"][0]["file"])
+    assert path.endswith(".db.gz")
+    with gzip.open(path, "rb") as f:
+        assert f.read(16) == b"SQLite format 3\x00"
+
+
+def test_sharded_backup_is_one_point_in_time(db_path, tmp_path):
+    shard_dir = str(tmp_path / "shards")
+    split(db_path, shard_dir, str(tmp_path / "split-backup"))
+    router = ShardRouter(db_path, shard_dir)
+    paths = [router.shard_path(shard) for shard in router.shards()]
+    for path in [db_path] + paths:
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.close()
+    orders_before = rows(paths[-1], "order")
+
+    written = []
+
+    def write_during_copy(file_name, remaining, total):
+        # An order lands in the last shard while main is being copied
+        if not written:
+            conn = sqlite3.connect(paths[-1], timeout=0)
+            conn.execute("""INSERT INTO "order" (customer_id, status, store_id) VALUES (1, 'complete', 5);""")
+            conn.commit()
+            conn.close()
+            written.append(file_name)
+
+    result = create_backup(
+        db_path, str(tmp_path / "backups"), shard_paths=paths, pages=1, progress=write_during_copy,
+    )
+
+    assert written and written[0].endswith(f"{result['name']}.db")
+    assert {f["method"] for f in result["files"]} == {"snapshot"}
+    assert len(result["files"]) == 1 + len(paths)
+    shard_copy = os.path.join(tmp_path, "backups", result["files"][-1]["file"])
+    assert rows(shard_copy, "order") == orders_before
+    assert rows(paths[-1], "order") == orders_before + 1
+
+
+def test_backup_endpoint(make_app):
+    client = make_app().test_client()
+    response = client.post("/api/admin/backup", json={"keep": 1})
+    assert response.status_code == 201
+    assert client.get("/api/admin/backups").get_json()[0]["name"] == response.get_json()["name"]
+    assert client.post("/api/admin/backup", json={"compress": "yes"}).status_code == 400
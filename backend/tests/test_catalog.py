@@ -0,0 +1,126 @@
+import sqlite3
+
+import pytest
+
+STORE_ID = 1
+
+
+@pytest.fixture
+def products(db_path):
+    """Store 1's catalog as dicts, after giving it two categories and some empty stock."""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        ids = [row[0] for row in conn.execute(
+            "SELECT product_id FROM store_inventory WHERE store_id = ? ORDER BY product_id;", (STORE_ID,)
+        )]
+        conn.executemany("UPDATE products SET category = 'Fish' WHERE product_id = ?;", [(i,) for i in ids[::3]])
+        conn.executemany(
+            "UPDATE store_inventory SET stock = 0 WHERE store_id = ? AND product_id = ?;",
+            [(STORE_ID, i) for i in ids[1::4]],
+        )
+        conn.commit()
+        return [dict(row) for row in conn.execute(
+            """
+            SELECT p.product_id, p.product_name, p.category, p.price, si.stock
+            FROM store_inventory AS si JOIN products AS p ON p.product_id = si.product_id
+            WHERE si.store_id = ?;
+            """,
+            (STORE_ID,),
+        )]
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def client(make_app):
+    return make_app().test_client()
+
+
+def catalog(client, **params):
+    query = "&".join(f"{k}={v}" for k, v in {"store_id": STORE_ID, **params}.items())
+    response = client.get(f"/api/stores/products?{query}")
+    assert response.status_code == 200, response.get_json()
+    return response
+
+
+def test_filters_match_the_rows(client, products):
+    prices = sorted(p["price"] for p in products)
+    low, high = prices[2], prices[-3]
+    expected = sorted(
+        p["product_id"] for p in products
+        if p["category"] == "Fish" and p["stock"] > 0 and low <= p["price"] <= high
+    )
+    assert expected
+
+    response = catalog(client, category="Fish", in_stock=1, min_price=low, max_price=high)
+    assert [p["product_id"] for p in response.get_json()] == expected
+    assert response.headers["X-Total-Count"] == str(len(expected))
+
+    out = catalog(client, in_stock=0).get_json()
+    assert sorted(p["product_id"] for p in out) == sorted(p["product_id"] for p in products if p["stock"] <= 0)
+
+
+@pytest.mark.parametrize("sort, key", [
+    ("price", lambda p: (p["price"], p["product_id"])),
+    ("-price", lambda p: (-p["price"], p["product_id"])),
+    ("-stock", lambda p: (-p["stock"], p["product_id"])),
+    ("name", lambda p: (p["product_name"].lower(), p["product_id"])),
+])
+def test_sort_and_pages(client, products, sort, key):
+    expected = [p["product_id"] for p in sorted(products, key=key)]
+
+    pages = [
+        catalog(client, sort=sort, limit=4, offset=offset)
+        for offset in range(0, len(products), 4)
+    ]
+    assert [p["product_id"] for page in pages for p in page.get_json()] == expected
+    assert {page.headers["X-Total-Count"] for page in pages} == {str(len(products))}
+
+    past_the_end = catalog(client, sort=sort, limit=4, offset=len(products) + 10)
+    assert past_the_end.get_json() == []
+    assert past_the_end.headers["X-Total-Count"] == str(len(products))
+
+
+def test_facets_ignore_their_own_filter(client, products):
+    result = catalog(client, category="Fish", in_stock=1, facets=1).get_json()
+
+    in_stock = [p for p in products if p["stock"] > 0]
+    fish = [p for p in products if p["category"] == "Fish"]
+    assert result["total"] == len([p for p in fish if p["stock"] > 0])
+    # Category counts apply in_stock, stock counts apply category
+    assert result["facets"]["category"] == {
+        category: len([p for p in in_stock if p["category"] == category])
+        for category in {p["category"] for p in products}
+    }
+    assert result["facets"]["stock"] == {
+        "in_stock": len([p for p in fish if p["stock"] > 0]),
+        "out_of_stock": len([p for p in fish if p["stock"] <= 0]),
+    }
+
+
+def test_search_takes_the_same_filters(client, products):
+    fish = sorted((p for p in products if p["category"] == "Fish"), key=lambda p: (-p["price"], p["product_id"]))
+    term = fish[0]["product_name"][:3]
+    expected = [
+        p["product_id"] for p in fish if term.lower() in p["product_name"].lower()
+    ]
+
+    response = client.get(
+        "/api/products/search",
+        query_string={"q": term, "store_id": STORE_ID, "category": "Fish", "sort": "-price"},
+    )
+    assert response.status_code == 200
+    assert [p["product_id"] for p in response.get_json()] == expected
+
+
+@pytest.mark.parametrize("params", [
+    {"in_stock": "maybe"},
+    {"min_price": "cheap"},
+    {"sort": "color"},
+    {"limit": 0},
+    {"offset": -1},
+])
+def test_bad_filters_are_400(client, params):
+    query = "&".join(f"{k}={v}" for k, v in params.items())
+    assert client.get(f"/api/stores/products?store_id={STORE_ID}&{query}").status_code == 400
@@ -0,0 +1,108 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from app.writer import WriteCoordinator
+
+
+@pytest.fixture
+def stocked(db_path):
+    """(store_id, product_id, stock) of a stocked product."""
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(
+            "SELECT store_id, product_id, stock FROM store_inventory "
+            "WHERE stock >= 2 ORDER BY store_id, product_id LIMIT 1;"
+        ).fetchone()
+    finally:
+        conn.close()
+
+
+def add_to_cart(client, customer_id, store_id, product_id, quantity):
+    response = client.post(
+        "/api/cart/add_to_cart",
+        json={"customer_id": customer_id, "product_id": product_id, "quantity": quantity, "store_id": store_id},
+    )
+    assert response.status_code in (200, 201), response.get_json()
+
+
+def poll(client, location, timeout=5):
+    deadline = time.monotonic() + timeout
+    while True:
+        info = client.get(location).get_json()
+        if info["status"] != "pending" or time.monotonic() > deadline:
+            return info
+        time.sleep(0.01)
+
+
+def test_async_checkout_completes_through_a_ticket(make_app, db_path, stocked):
+    store_id, product_id, stock = stocked
+    client = make_app(CHECKOUT_MODE="async").test_client()
+    add_to_cart(client, 2, store_id, product_id, 2)
+
+    response = client.post("/api/orders/checkout", json={"customer_id": 2, "store_id": store_id})
+    assert response.status_code == 202
+    assert response.get_json()["status"] == "pending"
+
+    info = poll(client, response.headers["Location"])
+    assert info["status"] == "complete"
+    assert info["customer_id"] == 2 and info["store_id"] == store_id
+
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute(
+            'SELECT status FROM "order" WHERE order_id = ?;', (info["order_id"],)
+        ).fetchone()[0] == "complete"
+        assert conn.execute(
+            "SELECT stock FROM store_inventory WHERE store_id = ? AND product_id = ?;",
+            (store_id, product_id),
+        ).fetchone()[0] == stock - 2
+    finally:
+        conn.close()
+
+
+def test_async_checkout_reports_insufficient_stock(make_app, stocked):
+    store_id, product_id, stock = stocked
+    client = make_app(CHECKOUT_MODE="async").test_client()
+    add_to_cart(client, 2, store_id, product_id, 1)
+
+    # Someone else takes the stock before the cart is checked out
+    response = client.post(
+        "/api/admin/inventory/adjust",
+        json={"store_id": store_id, "product_id": product_id, "adjustment": -stock},
+    )
+    assert response.status_code == 200
+    response = client.post("/api/orders/checkout", json={"customer_id": 2, "store_id": store_id})
+
+    info = poll(client, response.headers["Location"])
+    assert info["status"] == "insufficient_stock"
+    assert "error" in info
+
+
+def test_unknown_ticket_is_404(make_app):
+    client = make_app(CHECKOUT_MODE="async").test_client()
+    assert client.get("/api/orders/checkout/nope").status_code == 404
+
+
+def test_waiting_jobs_are_committed_together(db_path):
+    writer = WriteCoordinator(db_path, batch_size=50, journal_mode="")
+    started, release = threading.Event(), threading.Event()
+
+    def blocker(cur):
+        started.set()
+        release.wait(5)
+
+    writer.submit(blocker)
+    started.wait(5)
+    futures = [
+        writer.submit(lambda cur, i=i: cur.execute("SELECT ?;", (i,)).fetchone()[0])
+        for i in range(10)
+    ]
+    release.set()
+
+    assert [future.result(timeout=5) for future in futures] == list(range(10))
+    stats = writer.stats()
+    assert stats["jobs"] == 11
+    assert stats["batches"] == 2
@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+from app.geo import haversine_miles, zip_location, KDTree
+
+
+def brute_force(points, location, k, max_miles=None):
+    ranked = sorted((haversine_miles(location, loc), item) for loc, item in points)
+    if max_miles is not None:
+        ranked = [(miles, item) for miles, item in ranked if miles <= max_miles]
+    return ranked[:k]
+
+
+@pytest.fixture
+def points():
+    rng = random.Random(44)
+    # Mostly the continental US, plus a few far away and across the antimeridian
+    points = [((rng.uniform(25, 49), rng.uniform(-125, -67)), i) for i in range(400)]
+    points += [((rng.uniform(-80, 80), rng.uniform(-180, 180)), 400 + i) for i in range(50)]
+    return points
+
+
+@pytest.mark.parametrize("k", [1, 5, 40])
+def test_kd_tree_matches_brute_force(points, k):
+    tree = KDTree(points)
+    rng = random.Random(k)
+    for _ in range(50):
+        location = (rng.uniform(-85, 85), rng.uniform(-180, 180))
+        found = tree.nearest(location, k)
+        expected = brute_force(points, location, k)
+        assert [item for _, item in found] == [item for _, item in expected]
+        for (miles, _), (true_miles, _) in zip(found, expected):
+            assert miles == pytest.approx(true_miles, abs=1e-6)
+
+
+def test_kd_tree_max_miles(points):
+    tree = KDTree(points)
+    location = (40.44, -79.95)
+    for max_miles in (0, 50, 300, 1500):
+        found = tree.nearest(location, 500, max_miles=max_miles)
+        expected = brute_force(points, location, 500, max_miles=max_miles)
+        assert [item for _, item in found] == [item for _, item in expected]
+
+
+def test_kd_tree_edge_cases():
+    assert KDTree([]).nearest((40.0, -80.0), 3) == []
+    assert KDTree([((40.0, -80.0), "a")]).nearest((40.0, -80.0), 0) == []
+    assert KDTree([((40.0, -80.0), "a")]).nearest((40.0, -80.0), 3) == [(0.0, "a")]
+
+
+def test_nearby_stores_endpoint(make_app):
+    client = make_app().test_client()
+
+    stores = client.get("/api/stores/nearby?zip=15213&limit=10").get_json()
+    assert stores[0]["zip"] == "15213"
+    assert stores[0]["distance_miles"] == 0
+    origin = zip_location("15213")
+    expected = sorted(round(haversine_miles(origin, zip_location(s["zip"])), 1) for s in stores)
+    assert [s["distance_miles"] for s in stores] == expected
+
+    near = client.get("/api/stores/nearby?zip=15213&max_miles=1").get_json()
+    assert [s["zip"] for s in near] == ["15213"]
+    assert client.get("/api/stores/nearby?zip=00000").status_code == 400
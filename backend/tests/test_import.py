@@ -0,0 +1,122 @@
+import json
+import sqlite3
+
+import pytest
+
+
+@pytest.fixture
+def pair(db_path):
+    """(store_id, product_id) of an existing inventory row."""
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(
+            "SELECT store_id, product_id FROM store_inventory ORDER BY store_id, product_id LIMIT 1;"
+        ).fetchone()
+    finally:
+        conn.close()
+
+
+def post(client, body, kind="inventory", fmt="ndjson", progress=False):
+    url = f"/api/admin/import?kind={kind}&format={fmt}" + ("&progress=1" if progress else "")
+    return client.post(url, data=body.encode(), content_type="application/octet-stream")
+
+
+def ndjson(*records):
+    return "".join(json.dumps(r) + "\n" for r in records)
+
+
+def stock(db_path, store_id, product_id):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(
+            "SELECT stock FROM store_inventory WHERE store_id = ? AND product_id = ?;",
+            (store_id, product_id),
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_inventory_rows_are_upserted_and_logged(make_app, db_path, pair):
+    store_id, product_id = pair
+    client = make_app().test_client()
+
+    body = f"store_id,product_id,stock\n{store_id},{product_id},77\n"
+    summary = post(client, body, fmt="csv").get_json()
+    assert (summary["rows"], summary["imported"], summary["rejected"], summary["done"]) == (1, 1, 0, True)
+    assert stock(db_path, store_id, product_id) == 77
+
+    ledger = client.get(f"/api/admin/inventory/ledger?store_id={store_id}&product_id={product_id}").get_json()
+    assert ledger["stock"] == 77
+    assert client.get("/api/admin/inventory/reconcile").get_json() == {"mismatches": []}
+
+
+@pytest.mark.parametrize("value", [3.7, True, "3.7", "x", None, -1])
+def test_bad_stock_values_are_row_errors(make_app, db_path, pair, value):
+    store_id, product_id = pair
+    before = stock(db_path, store_id, product_id)
+    client = make_app().test_client()
+
+    summary = post(client, ndjson({"store_id": store_id, "product_id": product_id, "stock": value})).get_json()
+    assert (summary["imported"], summary["rejected"]) == (0, 1)
+    assert summary["errors"][0]["line"] == 1
+    assert stock(db_path, store_id, product_id) == before
+
+
+def test_integral_floats_are_accepted(make_app, db_path, pair):
+    store_id, product_id = pair
+    client = make_app().test_client()
+
+    summary = post(client, ndjson({"store_id": float(store_id), "product_id": product_id, "stock": 12.0})).get_json()
+    assert summary["imported"] == 1
+    assert stock(db_path, store_id, product_id) == 12
+
+
+def test_rejected_rows_do_not_stop_the_import(make_app, db_path, pair):
+    store_id, product_id = pair
+    client = make_app().test_client()
+
+    body = ndjson({"store_id": 999, "product_id": product_id, "stock": 1}) + "not json\n" + ndjson(
+        {"store_id": store_id, "product_id": product_id, "stock": 5},
+    )
+    summary = post(client, body).get_json()
+    assert (summary["rows"], summary["imported"], summary["rejected"]) == (3, 1, 2)
+    assert [e["line"] for e in summary["errors"]] == [1, 2]
+    assert "unknown store_id" in summary["errors"][0]["error"]
+    assert stock(db_path, store_id, product_id) == 5
+
+
+def test_progress_streams_one_summary_per_chunk(make_app, db_path, pair):
+    store_id, product_id = pair
+    client = make_app(IMPORT_CHUNK_SIZE=2).test_client()
+
+    body = ndjson(*({"store_id": store_id, "product_id": product_id, "stock": n} for n in range(5)))
+    response = post(client, body, progress=True)
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert [line["imported"] for line in lines] == [2, 4, 5]
+    assert [line["done"] for line in lines] == [False, False, True]
+    assert stock(db_path, store_id, product_id) == 4
+
+
+def test_products_import(make_app, db_path):
+    client = make_app().test_client()
+    body = ndjson(
+        {"product_name": "Imported Pears", "price": 2.5, "category": "Fruit"},
+        {"product_name": "Bad", "price": "nan"},
+        {"product_name": "Bad", "price": 1, "product_id": 1.5},
+    )
+    summary = post(client, body, kind="products").get_json()
+    assert (summary["imported"], summary["rejected"]) == (1, 2)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute(
+            "SELECT price FROM products WHERE product_name = 'Imported Pears';"
+        ).fetchone()[0] == 2.5
+    finally:
+        conn.close()
+
+
+def test_unknown_kind_is_400(make_app):
+    client = make_app().test_client()
+    assert post(client, "", kind="stores").status_code == 400
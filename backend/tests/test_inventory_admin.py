@@ -0,0 +1,117 @@
+import sqlite3
+
+import pytest
+
+
+@pytest.fixture
+def client(make_app):
+    return make_app().test_client()
+
+
+@pytest.fixture
+def pairs(db_path):
+    """Two stocked (store_id, product_id, stock) rows."""
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(
+            "SELECT store_id, product_id, stock FROM store_inventory "
+            "WHERE stock >= 3 ORDER BY store_id, product_id LIMIT 2;"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def stock(db_path, store_id, product_id):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(
+            "SELECT stock FROM store_inventory WHERE store_id = ? AND product_id = ?;",
+            (store_id, product_id),
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def bulk(client, items, atomic=False):
+    response = client.post("/api/admin/inventory/bulk-adjust", json={"items": items, "atomic": atomic})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_bulk_adjust_applies_accepted_rows(client, db_path, pairs):
+    (s1, p1, stock1), (s2, p2, stock2) = pairs
+    result = bulk(client, [
+        {"store_id": s1, "product_id": p1, "adjustment": -2},
+        {"store_id": s2, "product_id": p2, "set": 40},
+        {"store_id": s1, "product_id": 999999, "adjustment": 1},
+        {"store_id": s2, "product_id": p2, "adjustment": -1000},
+    ])
+
+    # The last row repeats a pair already in the request
+    assert [r["status"] for r in result["results"]] == ["ok", "ok", "not_found", "invalid"]
+    assert result["applied"] == 2
+    assert stock(db_path, s1, p1) == stock1 - 2
+    assert stock(db_path, s2, p2) == 40
+
+
+def test_bulk_adjust_atomic_applies_nothing_on_rejection(client, db_path, pairs):
+    (s1, p1, stock1), (s2, p2, stock2) = pairs
+    result = bulk(client, [
+        {"store_id": s1, "product_id": p1, "adjustment": -1},
+        {"store_id": s2, "product_id": p2, "adjustment": -(stock2 + 1)},
+    ], atomic=True)
+
+    assert [r["status"] for r in result["results"]] == ["skipped", "negative_stock"]
+    assert result["applied"] == 0
+    assert stock(db_path, s1, p1) == stock1
+    assert stock(db_path, s2, p2) == stock2
+
+
+def test_bulk_adjust_counts_null_stock_as_zero(client, db_path, pairs):
+    s1, p1, _ = pairs[0]
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE store_inventory SET stock = NULL WHERE store_id = ? AND product_id = ?;", (s1, p1))
+    conn.commit()
+    conn.close()
+
+    result = bulk(client, [{"store_id": s1, "product_id": p1, "adjustment": 4}])
+    assert result["results"][0]["status"] == "ok"
+    assert result["results"][0]["new_stock"] == 4
+
+
+def test_ledger_lists_movements_newest_first(client, pairs):
+    s1, p1, _ = pairs[0]
+    for adjustment in (-1, 2, -1):
+        assert client.post(
+            "/api/admin/inventory/adjust",
+            json={"store_id": s1, "product_id": p1, "adjustment": adjustment},
+        ).status_code == 200
+
+    ledger = client.get(f"/api/admin/inventory/ledger?store_id={s1}&product_id={p1}").get_json()
+    assert [m["delta"] for m in ledger["movements"][:3]] == [-1, 2, -1]
+    assert ledger["stock"] == ledger["snapshot_stock"] + sum(m["delta"] for m in ledger["movements"])
+
+    limited = client.get(f"/api/admin/inventory/ledger?store_id={s1}&product_id={p1}&limit=2").get_json()
+    assert len(limited["movements"]) == 2
+
+
+@pytest.mark.parametrize("limit", ["0", "-1", "x"])
+def test_ledger_rejects_bad_limits(client, pairs, limit):
+    s1, p1, _ = pairs[0]
+    response = client.get(f"/api/admin/inventory/ledger?store_id={s1}&product_id={p1}&limit={limit}")
+    assert response.status_code == 400
+
+
+def test_reconcile_reports_writes_that_bypass_the_ledger(client, db_path, pairs):
+    s1, p1, stock1 = pairs[0]
+    assert client.get("/api/admin/inventory/reconcile").get_json() == {"mismatches": []}
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE store_inventory SET stock = stock + 5 WHERE store_id = ? AND product_id = ?;", (s1, p1))
+    conn.commit()
+    conn.close()
+
+    assert client.get("/api/admin/inventory/reconcile").get_json()["mismatches"] == [
+        {"store_id": s1, "product_id": p1, "stock": stock1 + 5, "ledger_stock": stock1}
+    ]
+    assert client.get(f"/api/admin/inventory/reconcile?store_id={s1 + 1000}").get_json() == {"mismatches": []}
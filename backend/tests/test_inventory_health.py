@@ -0,0 +1,109 @@
+import sqlite3
+
+import pytest
+
+
+@pytest.fixture
+def store_one(db_path):
+    """Store 1's products as [(product_id, category)], after setting every stock to 10."""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("UPDATE store_inventory SET stock = 10;")
+        conn.commit()
+        return conn.execute(
+            "SELECT si.product_id, p.category FROM store_inventory AS si "
+            "JOIN products AS p ON p.product_id = si.product_id "
+            "WHERE si.store_id = 1 ORDER BY si.product_id;"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def set_stock(db_path, stocks, store_id=1):
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executemany(
+            "UPDATE store_inventory SET stock = ? WHERE store_id = ? AND product_id = ?;",
+            [(stock, store_id, product_id) for product_id, stock in stocks.items()],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def buckets(app, **params):
+    """{ product_id: bucket } for store 1, and the response."""
+    refresher = app.extensions.get("health_refresher")
+    if refresher is not None:
+        refresher.refresh()
+    query = "&".join(f"{k}={v}" for k, v in params.items())
+    result = app.test_client().get(f"/api/stats/inventory-health?{query}").get_json()
+    found = {
+        row["product_id"]: name
+        for name in ("out_of_stock", "low_stock", "overstocked")
+        for row in result.get(name, [])
+        if row["store_id"] == 1
+    }
+    return found, result
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_default_threshold_boundaries(make_app, db_path, store_one, incremental):
+    ids = [product_id for product_id, _ in store_one[:6]]
+    # low_stock is stock < 5, overstocked is stock > 50
+    set_stock(db_path, dict(zip(ids, (0, -1, 4, 5, 50, 51))))
+    app = make_app(INVENTORY_LOW_STOCK=5, INVENTORY_OVERSTOCK=50, INVENTORY_HEALTH_INCREMENTAL=incremental)
+
+    found, result = buckets(app)
+    assert found == {
+        ids[0]: "out_of_stock",
+        ids[1]: "out_of_stock",
+        ids[2]: "low_stock",
+        ids[5]: "overstocked",
+    }
+    assert result["counts"] == {"out_of_stock": 2, "low_stock": 1, "overstocked": 1}
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_more_specific_thresholds_win(make_app, db_path, store_one, incremental):
+    (first, category), (other, _) = store_one[:2]
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("UPDATE products SET category = 'Other' WHERE product_id = ?;", (other,))
+    conn.close()
+    set_stock(db_path, {first: 8, other: 8})
+    app = make_app(INVENTORY_LOW_STOCK=5, INVENTORY_OVERSTOCK=50, INVENTORY_HEALTH_INCREMENTAL=incremental)
+    client = app.test_client()
+
+    # Category threshold: only that category's product is low
+    assert client.put("/api/admin/inventory/thresholds", json={"category": category, "low_stock": 9}).status_code == 200
+    found, _ = buckets(app)
+    assert (found.get(first), found.get(other)) == ("low_stock", None)
+
+    # A store threshold beats the category one, a store + category one beats both
+    client.put("/api/admin/inventory/thresholds", json={"store_id": 1, "low_stock": 7, "overstock": 7})
+    found, _ = buckets(app)
+    assert (found.get(first), found.get(other)) == ("overstocked", "overstocked")
+    client.put("/api/admin/inventory/thresholds", json={"store_id": 1, "category": category, "low_stock": 9})
+    found, _ = buckets(app)
+    assert (found.get(first), found.get(other)) == ("low_stock", "overstocked")
+
+    # Without the store row, other falls back to the config thresholds
+    assert client.delete("/api/admin/inventory/thresholds", json={"store_id": 1}).status_code == 200
+    found, _ = buckets(app)
+    assert (found.get(first), found.get(other)) == ("low_stock", None)
+
+
+def test_bucket_filter_and_paging_keep_every_count(make_app, db_path, store_one):
+    ids = [product_id for product_id, _ in store_one[:5]]
+    set_stock(db_path, dict(zip(ids, (1, 2, 3, 4, 0))))
+    app = make_app(INVENTORY_LOW_STOCK=5)
+
+    _, result = buckets(app, bucket="low_stock", limit=2, offset=1)
+    assert result["counts"] == {"out_of_stock": 1, "low_stock": 4, "overstocked": 0}
+    assert "out_of_stock" not in result
+    assert [row["stock"] for row in result["low_stock"]] == [2, 3]
+
+    client = app.test_client()
+    assert client.get("/api/stats/inventory-health?bucket=nope").status_code == 400
+    assert client.get("/api/stats/inventory-health?limit=0").status_code == 400
@@ -0,0 +1,155 @@
+import json
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from app.inventory import compact_ledger
+
+
+@pytest.fixture
+def stocked(db_path):
+    """Two (product_id, stock) rows of store 1."""
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(
+            "SELECT product_id, stock FROM store_inventory "
+            "WHERE store_id = 1 AND stock >= 3 ORDER BY product_id LIMIT 2;"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def last_movement(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        # Compacted movements are deleted, so read the id counter
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'inventory_movement';").fetchone()
+        return row[0] if row is not None else 0
+    finally:
+        conn.close()
+
+
+def store_products(db_path, store_id=1):
+    conn = sqlite3.connect(db_path)
+    try:
+        return [row[0] for row in conn.execute(
+            "SELECT product_id FROM store_inventory WHERE store_id = ? ORDER BY product_id;", (store_id,)
+        )]
+    finally:
+        conn.close()
+
+
+def adjust(client, product_id, adjustment, store_id=1):
+    response = client.post(
+        "/api/admin/inventory/adjust",
+        json={"store_id": store_id, "product_id": product_id, "adjustment": adjustment},
+    )
+    assert response.status_code == 200
+
+
+def events(response):
+    """Parsed SSE events ({id, event, data} or {comment}) from a streamed response."""
+    for chunk in response.response:
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        for block in text.split("\n\n"):
+            if not block:
+                continue
+            if block.startswith(":"):
+                yield {"comment": block[1:].strip()}
+                continue
+            fields = dict(line.split(": ", 1) for line in block.splitlines())
+            if "data" in fields:
+                fields["data"] = json.loads(fields["data"])
+            yield fields
+
+
+def stream(client, **params):
+    query = "&".join(f"{k}={v}" for k, v in params.items())
+    response = client.get(f"/api/stores/1/inventory/stream?{query}", buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    return response, events(response)
+
+
+def test_resume_sends_one_coalesced_event(make_app, db_path, stocked):
+    (p1, stock1), (p2, stock2) = stocked
+    client = make_app(INVENTORY_STREAM_POLL=0.1).test_client()
+    after = last_movement(db_path)
+    for product_id, adjustment in ((p1, -1), (p2, -2), (p1, -1)):
+        adjust(client, product_id, adjustment)
+    # Other stores' changes are not sent
+    adjust(client, store_products(db_path, store_id=2)[0], 1, store_id=2)
+
+    response, it = stream(client, last_event_id=after)
+    try:
+        assert next(it) == {"retry": "3000"}
+        event = next(it)
+        assert event["event"] == "stock"
+        assert int(event["id"]) == last_movement(db_path) - 1
+        assert event["data"] == [
+            {"product_id": p1, "stock": stock1 - 2},
+            {"product_id": p2, "stock": stock2 - 2},
+        ]
+    finally:
+        response.close()
+
+
+def test_live_changes_are_pushed(make_app, stocked):
+    (p1, stock1), _ = stocked
+    app = make_app(INVENTORY_STREAM_POLL=0.5, INVENTORY_STREAM_COALESCE=0.05)
+    client = app.test_client()
+    response, it = stream(client)
+    try:
+        assert next(it) == {"retry": "3000"}
+
+        def later():
+            time.sleep(0.2)
+            adjust(app.test_client(), p1, -1)
+
+        thread = threading.Thread(target=later)
+        thread.start()
+        event = next(it)
+        thread.join()
+        assert event["event"] == "stock"
+        assert event["data"] == [{"product_id": p1, "stock": stock1 - 1}]
+    finally:
+        response.close()
+
+
+def test_compacted_resume_gets_a_snapshot(make_app, db_path, stocked):
+    client = make_app(INVENTORY_STREAM_POLL=0.1).test_client()
+    (p1, _), _ = stocked
+    adjust(client, p1, -1)
+
+    conn = sqlite3.connect(db_path)
+    with conn:
+        compact_ledger(conn.cursor(), "9999-12-31 00:00:00")
+    conn.close()
+
+    response, it = stream(client, last_event_id=0)
+    try:
+        next(it)
+        event = next(it)
+        assert event["event"] == "snapshot"
+        assert int(event["id"]) == last_movement(db_path)
+        assert [p["product_id"] for p in event["data"]] == store_products(db_path)
+    finally:
+        response.close()
+
+
+def test_idle_streams_get_keepalives(make_app):
+    client = make_app(INVENTORY_STREAM_POLL=0.05, INVENTORY_STREAM_KEEPALIVE=0.1).test_client()
+    response, it = stream(client)
+    try:
+        next(it)
+        assert next(it) == {"comment": "keepalive"}
+    finally:
+        response.close()
+
+
+def test_unknown_store_and_bad_event_id(make_app):
+    client = make_app().test_client()
+    assert client.get("/api/stores/999/inventory/stream").status_code == 404
+    assert client.get("/api/stores/1/inventory/stream?last_event_id=x").status_code == 400
@@ -0,0 +1,169 @@
+import sqlite3
+import time
+
+import pytest
+
+from app.inventory import adjust_stock, compact_ledger, REASON_ADJUST
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def pair(db_path):
+    """(store_id, product_id, stock, product_name) of a stocked product."""
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(
+            """
+            SELECT si.store_id, si.product_id, si.stock, p.product_name
+            FROM store_inventory AS si
+            JOIN products AS p
+              ON p.product_id = si.product_id
+            WHERE si.stock >= 2
+            ORDER BY si.store_id, si.product_id
+            LIMIT 1;
+            """
+        ).fetchone()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def reloads(monkeypatch):
+    """Counts full reloads of every ledger index."""
+    from app.search import LedgerIndex
+
+    calls = []
+    reload = LedgerIndex._reload
+
+    def counting(self, connections):
+        calls.append(type(self).__name__)
+        return reload(self, connections)
+
+    monkeypatch.setattr(LedgerIndex, "_reload", counting)
+    return calls
+
+
+def adjust(client, store_id, product_id, adjustment):
+    response = client.post(
+        "/api/admin/inventory/adjust",
+        json={"store_id": store_id, "product_id": product_id, "adjustment": adjustment},
+    )
+    assert response.status_code == 200, response.get_json()
+
+
+def eventually(read, expected, timeout=5):
+    """read() once the index's background thread has caught up to expected."""
+    deadline = time.monotonic() + timeout
+    value = read()
+    while value != expected and time.monotonic() < deadline:
+        time.sleep(0.01)
+        value = read()
+    return value
+
+
+def stock_at(availability, store_id, product_id):
+    return {s["store_id"]: s["stock"] for s in availability.stores_for(product_id)}.get(store_id)
+
+
+def suggestion(autocomplete, store_id, name, **kwargs):
+    for item in autocomplete.suggest(store_id, name, limit=100, **kwargs):
+        if item["product_name"] == name:
+            return item
+    return None
+
+
+def test_availability_catches_up_without_reloading(app, pair, reloads):
+    store_id, product_id, stock, _ = pair
+    availability = app.extensions["availability_index"]
+    client = app.test_client()
+
+    assert stock_at(availability, store_id, product_id) == stock
+    assert reloads == ["AvailabilityIndex"]
+
+    adjust(client, store_id, product_id, -2)
+    assert eventually(lambda: stock_at(availability, store_id, product_id), stock - 2) == stock - 2
+    adjust(client, store_id, product_id, 5)
+    assert eventually(lambda: stock_at(availability, store_id, product_id), stock + 3) == stock + 3
+    assert reloads == ["AvailabilityIndex"]
+
+
+def test_autocomplete_follows_stock_and_sales(app, pair, reloads):
+    store_id, product_id, stock, name = pair
+    autocomplete = app.extensions["autocomplete_index"]
+    client = app.test_client()
+
+    before = suggestion(autocomplete, store_id, name)
+    assert before["stock"] == stock
+
+    customer_id = 2
+    response = client.post(
+        "/api/cart/add_to_cart",
+        json={"customer_id": customer_id, "product_id": product_id, "quantity": 2, "store_id": store_id},
+    )
+    assert response.status_code in (200, 201), response.get_json()
+    response = client.post("/api/orders/checkout", json={"customer_id": customer_id, "store_id": store_id})
+    assert response.status_code == 200, response.get_json()
+
+    expected = {**before, "stock": stock - 2, "total_sold": before["total_sold"] + 2}
+    assert eventually(lambda: suggestion(autocomplete, store_id, name), expected) == expected
+
+    adjust(client, store_id, product_id, -(stock - 2))
+    assert eventually(lambda: suggestion(autocomplete, store_id, name, in_stock=True), None) is None
+    assert reloads == ["AutocompleteIndex"]
+
+
+def test_compaction_past_the_watermark_forces_a_reload(app, pair, db_path, reloads):
+    store_id, product_id, stock, name = pair
+    availability = app.extensions["availability_index"]
+    autocomplete = app.extensions["autocomplete_index"]
+    client = app.test_client()
+
+    stock_at(availability, store_id, product_id)
+    suggestion(autocomplete, store_id, name)
+
+    # Another process changes stock (no commit signal here) and compacts
+    # the ledger past what the indexes have seen
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        adjust_stock(conn.cursor(), store_id, product_id, -1, REASON_ADJUST)
+        assert compact_ledger(conn.cursor(), "9999-12-31 00:00:00")["folded"] > 0
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    adjust(client, store_id, product_id, -1)
+
+    assert eventually(lambda: stock_at(availability, store_id, product_id), stock - 2) == stock - 2
+    assert eventually(lambda: suggestion(autocomplete, store_id, name)["stock"], stock - 2) == stock - 2
+    assert sorted(reloads) == ["AutocompleteIndex"] * 2 + ["AvailabilityIndex"] * 2
+
+
+def test_reads_do_not_query_the_database(app, pair):
+    store_id, product_id, stock, name = pair
+    availability = app.extensions["availability_index"]
+    autocomplete = app.extensions["autocomplete_index"]
+    assert stock_at(availability, store_id, product_id) == stock
+    assert suggestion(autocomplete, store_id, name)["stock"] == stock
+
+    def no_connections():
+        raise AssertionError("read path opened a connection")
+
+    availability._connections = autocomplete._connections = no_connections
+    assert stock_at(availability, store_id, product_id) == stock
+    assert suggestion(autocomplete, store_id, name)["stock"] == stock
+
+
+def test_catch_up_does_not_change_the_state_readers_hold(app, pair):
+    store_id, product_id, stock, _ = pair
+    availability = app.extensions["availability_index"]
+    held = availability._current()
+    assert held[0][product_id][store_id] == stock
+
+    adjust(app.test_client(), store_id, product_id, -1)
+    assert eventually(lambda: stock_at(availability, store_id, product_id), stock - 1) == stock - 1
+    assert availability._current() is not held
+    assert held[0][product_id][store_id] == stock
@@ -0,0 +1,51 @@
+import os
+import sqlite3
+
+import pytest
+
+from app.db import get_db
+
+
+def complete_orders(client):
+    response = client.get("/api/stats/overview")
+    assert response.status_code == 200
+    return response.get_json()["total_orders"]
+
+
+def test_readonly_connection_rejects_writes(make_app):
+    app = make_app()
+    with app.app_context():
+        conn = get_db(readonly=True)
+        assert conn is not get_db()
+        assert conn.execute("SELECT COUNT(*) FROM products;").fetchone()[0] > 0
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("UPDATE products SET price = price;")
+
+
+def test_catalog_reads_work_read_only(make_app):
+    client = make_app().test_client()
+    response = client.get("/api/stores/products?store_id=1")
+    assert response.status_code == 200
+    assert response.get_json()
+
+
+def test_stats_read_the_snapshot_until_it_is_refreshed(make_app, db_path, tmp_path):
+    snapshot_path = str(tmp_path / "snapshot.db")
+    app = make_app(READ_SNAPSHOT_PATH=snapshot_path)
+    client = app.test_client()
+
+    before = complete_orders(client)
+    assert os.path.exists(snapshot_path)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("""UPDATE "order" SET status = 'complete' WHERE status != 'complete';""")
+        changed = conn.total_changes
+        conn.commit()
+    finally:
+        conn.close()
+    assert changed > 0
+
+    assert complete_orders(client) == before
+    app.extensions["snapshot_refresher"].refresh()
+    assert complete_orders(client) == before + changed
@@ -0,0 +1,84 @@
+import random
+import sqlite3
+import sys
+from collections import Counter
+from itertools import permutations
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from app.recommendations import build_related, ORDER_PRODUCTS_SQL
+
+
+def brute_force(order_products, top_k):
+    baskets = {}
+    for order_id, product_id in order_products:
+        baskets.setdefault(order_id, set()).add(product_id)
+    orders_with = Counter(p for basket in baskets.values() for p in basket)
+    together = Counter(pair for basket in baskets.values() for pair in permutations(basket, 2))
+
+    rows = []
+    for product_id in sorted(orders_with):
+        neighbours = sorted(
+            ((b, n) for (a, b), n in together.items() if a == product_id),
+            key=lambda item: (-item[1], item[0]),
+        )[:top_k]
+        rows.extend(
+            (product_id, rank, b, n, round(n / orders_with[product_id], 4))
+            for rank, (b, n) in enumerate(neighbours, 1)
+        )
+    return rows, len(baskets), len(together)
+
+
+@pytest.mark.parametrize("top_k", [1, 3, 50])
+def test_build_related_matches_brute_force(top_k):
+    rng = random.Random(top_k)
+    order_products = []
+    for order_id in rng.sample(range(1, 10 ** 6), 300):
+        for product_id in rng.sample(range(1, 40), rng.randint(1, 8)):
+            order_products.append((order_id, product_id * 7))
+    rng.shuffle(order_products)
+
+    result = build_related(order_products, top_k)
+    rows, orders, pairs = brute_force(order_products, top_k)
+    assert sorted(result["rows"]) == rows
+    assert result["orders"] == orders
+    assert result["pairs"] == pairs
+
+
+def test_build_related_without_pairs():
+    assert build_related([], 5)["rows"] == []
+    result = build_related([(1, 10), (2, 11)], 5)
+    assert result["rows"] == [] and result["orders"] == 2
+
+
+def test_rebuild_endpoint_fills_product_related(make_app, db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        expected, _, _ = brute_force(conn.execute(ORDER_PRODUCTS_SQL).fetchall(), 10)
+    finally:
+        conn.close()
+    client = make_app(RELATED_TOP_K=10).test_client()
+
+    response = client.post("/api/admin/recommendations/rebuild")
+    assert response.status_code == 200
+
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT product_id, rank, related_product_id, orders_together, confidence "
+            "FROM product_related ORDER BY product_id, rank;"
+        ).fetchall()
+    finally:
+        conn.close()
+    assert rows == expected
+
+
+def test_rebuild_without_numpy_is_503(make_app, monkeypatch):
+    client = make_app().test_client()
+    monkeypatch.setitem(sys.modules, "numpy", None)
+
+    response = client.post("/api/admin/recommendations/rebuild")
+    assert response.status_code == 503
+    assert "NumPy" in response.get_json()["error"]
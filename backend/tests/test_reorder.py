@@ -0,0 +1,94 @@
+import sqlite3
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.reorder import plan_reorders, ReorderPlanner  # noqa: E402
+
+# (store_id, product_id, stock, units_sold) over 10 days, 2 days lead time + 3 of cover:
+#   0  velocity 2, cover 5,   reorder 0
+#   1  velocity 2, cover 1.5, reorder 7
+#   2  velocity 6, cover 0,   reorder 30 (negative stock counts as none)
+#   3  velocity 3, cover 0,   reorder 15
+#   4  velocity 0, cover inf, reorder 0
+#   5  velocity 5, cover 2,   reorder 15
+PAIRS = [(1, 1, 10, 20), (1, 2, 3, 20), (1, 3, -3, 60), (2, 1, 0, 30), (2, 3, 5, 0), (2, 2, 10, 50)]
+
+
+def plan(**options):
+    columns = {
+        name: np.array(values, dtype=np.int64)
+        for name, values in zip(("store_id", "product_id", "stock", "units_sold"), zip(*PAIRS))
+    }
+    return plan_reorders(columns, 10, 2, 3, **options)
+
+
+@pytest.mark.parametrize("sort, order", [
+    ("urgency", [2, 3, 1, 5]),
+    # Ties on quantity: fewer days of cover first
+    ("reorder_quantity", [2, 3, 5, 1]),
+    ("velocity", [2, 5, 3, 1]),
+])
+def test_sort_orders(sort, order):
+    result = plan(sort=sort)
+    assert result["order"].tolist() == order
+    assert result["reorder_quantity"].tolist() == [0, 7, 30, 15, 0, 15]
+
+
+def test_store_filter_and_include_all():
+    assert plan(store_id=2)["order"].tolist() == [3, 5]
+    everything = plan(include_all=True)
+    assert everything["order"].tolist() == [2, 3, 1, 5, 0, 4]
+    assert everything["days_of_cover"][4] == np.inf
+    assert plan(store_id=2, include_all=True)["order"].tolist() == [3, 5, 4]
+
+
+def reorder(client, **params):
+    response = client.get("/api/stats/reorder", query_string=params)
+    deadline = time.monotonic() + 5
+    while response.status_code == 503 and time.monotonic() < deadline:
+        time.sleep(0.01)
+        response = client.get("/api/stats/reorder", query_string=params)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_endpoint_orders_and_include_all(make_app, db_path):
+    # Velocity over every sample sale, and a lead time that needs reorders
+    client = make_app(REORDER_VELOCITY_DAYS=3650).test_client()
+    conn = sqlite3.connect(db_path)
+    try:
+        pairs = conn.execute("SELECT COUNT(*) FROM store_inventory;").fetchone()[0]
+    finally:
+        conn.close()
+
+    params = {"lead_time_days": 400, "cover_days": 0, "limit": 1000}
+    needed = reorder(client, **params)
+    assert needed["items"]
+    assert all(item["reorder_quantity"] > 0 for item in needed["items"])
+    covers = [item["days_of_cover"] if item["days_of_cover"] is not None else float("inf") for item in needed["items"]]
+    assert covers == sorted(covers)
+
+    everything = reorder(client, all=1, **params)
+    assert everything["total"] == len(everything["items"]) == pairs
+    assert any(item["reorder_quantity"] == 0 for item in everything["items"])
+    assert [item for item in everything["items"] if item["reorder_quantity"] > 0] == needed["items"]
+
+    page = reorder(client, all=1, limit=5, offset=5, lead_time_days=400, cover_days=0)
+    assert page["items"] == everything["items"][5:10]
+
+
+def test_loading_answers_503(make_app, monkeypatch):
+    monkeypatch.setattr(ReorderPlanner, "start", lambda self: None)
+    app = make_app()
+    client = app.test_client()
+
+    response = client.get("/api/stats/reorder")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+    assert app.extensions["top_seller_cache"].ready.wait(5)
+    app.extensions["reorder_planner"].refresh()
+    assert client.get("/api/stats/reorder").status_code == 200
@@ -0,0 +1,89 @@
+import sqlite3
+import time
+
+import pytest
+
+
+@pytest.fixture
+def stocked(db_path):
+    """(store_id, product_id, stock) of a stocked product in a store without open carts."""
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(
+            "SELECT store_id, product_id, stock FROM store_inventory "
+            "WHERE stock >= 4 AND store_id = 2 ORDER BY product_id LIMIT 1;"
+        ).fetchone()
+    finally:
+        conn.close()
+
+
+def add_to_cart(client, customer_id, store_id, product_id, quantity):
+    return client.post(
+        "/api/cart/add_to_cart",
+        json={"customer_id": customer_id, "product_id": product_id, "quantity": quantity, "store_id": store_id},
+    )
+
+
+def shown_stock(client, store_id, product_id):
+    products = client.get(f"/api/stores/products?store_id={store_id}").get_json()
+    return next(p["stock"] for p in products if p["product_id"] == product_id)
+
+
+def reservations(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM inventory_reservation;").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_cart_lines_hold_stock(make_app, stocked):
+    store_id, product_id, stock = stocked
+    client = make_app(STOCK_RESERVATIONS=True).test_client()
+
+    response = add_to_cart(client, 2, store_id, product_id, 2)
+    assert response.status_code in (200, 201)
+    line = response.get_json()
+    assert line["reserved_until"] > 0
+    assert shown_stock(client, store_id, product_id) == stock - 2
+
+    # Another customer can only take what is left
+    assert add_to_cart(client, 3, store_id, product_id, stock - 1).status_code == 409
+    assert add_to_cart(client, 3, store_id, product_id, stock - 2).status_code in (200, 201)
+    assert shown_stock(client, store_id, product_id) == 0
+
+    # Lowering the quantity lowers the hold, removing the line releases it
+    response = client.put(f"/api/cart/items/{line['order_item_id']}", json={"customer_id": 2, "quantity": 1})
+    assert response.status_code == 200
+    assert shown_stock(client, store_id, product_id) == 1
+    response = client.delete(f"/api/cart/items/{line['order_item_id']}", json={"customer_id": 2})
+    assert response.status_code == 200
+    assert shown_stock(client, store_id, product_id) == 2
+
+
+def test_checkout_converts_the_holds(make_app, db_path, stocked):
+    store_id, product_id, stock = stocked
+    client = make_app(STOCK_RESERVATIONS=True).test_client()
+    assert add_to_cart(client, 2, store_id, product_id, 3).status_code in (200, 201)
+
+    response = client.post("/api/orders/checkout", json={"customer_id": 2, "store_id": store_id})
+    assert response.status_code == 200, response.get_json()
+    assert reservations(db_path) == 0
+    assert shown_stock(client, store_id, product_id) == stock - 3
+
+
+def test_expired_holds_are_released_by_the_sweep(make_app, db_path, stocked):
+    store_id, product_id, stock = stocked
+    app = make_app(STOCK_RESERVATIONS=True, RESERVATION_TTL=0, RESERVATION_SWEEP_INTERVAL=1)
+    client = app.test_client()
+
+    assert add_to_cart(client, 2, store_id, product_id, stock).status_code in (200, 201)
+    # An expired hold no longer counts against the stock
+    assert shown_stock(client, store_id, product_id) == stock
+    assert add_to_cart(client, 3, store_id, product_id, stock).status_code in (200, 201)
+
+    # The sweeper started with the first cart write and deletes them within a second
+    deadline = time.monotonic() + 5
+    while reservations(db_path) and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert reservations(db_path) == 0
@@ -0,0 +1,137 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from app.sales import series_periods
+
+
+@pytest.fixture
+def orders(db_path):
+    """Every complete order as (order_datetime, store_id, revenue of its non-returned lines)."""
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(
+            """
+            SELECT o.order_datetime, o.store_id,
+                   COALESCE(SUM(CASE WHEN oi.is_return = 0 THEN oi.quantity * oi.unit_price END), 0)
+            FROM "order" AS o
+            LEFT JOIN order_item AS oi ON oi.order_id = o.order_id
+            WHERE o.status = 'complete'
+            GROUP BY o.order_id;
+            """
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def client(make_app):
+    return make_app().test_client()
+
+
+def series(client, **params):
+    response = client.get("/api/stats/revenue/series", query_string=params)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def expected(orders, start, end, label, store_id=None):
+    """{ period: [revenue, order_count] } computed from the rows."""
+    totals = {}
+    for when, store, revenue in orders:
+        if not start <= when < end or store_id not in (None, store):
+            continue
+        entry = totals.setdefault(label(when), [0.0, 0])
+        entry[0] += revenue
+        entry[1] += 1
+    return {period: [round(revenue, 2), count] for period, (revenue, count) in totals.items()}
+
+
+def observed(entry, periods):
+    return {
+        period: [revenue, count]
+        for period, revenue, count in zip(periods, entry["revenue"], entry["order_count"])
+        if count
+    }
+
+
+def test_series_periods():
+    assert series_periods(datetime(2025, 11, 30, 22, 30), datetime(2025, 12, 1, 1), "hour") == [
+        "2025-11-30 22:00", "2025-11-30 23:00", "2025-12-01 00:00",
+    ]
+    # Weeks start on Monday; 2025-11-24 is one
+    assert series_periods(datetime(2025, 11, 26), datetime(2025, 12, 2), "week") == ["2025-11-24", "2025-12-01"]
+    assert series_periods(datetime(2025, 11, 15), datetime(2026, 2, 1), "month") == [
+        "2025-11", "2025-12", "2026-01",
+    ]
+
+
+def test_days_match_the_orders_and_gaps_are_zero(client, orders):
+    result = series(client, date_start="2025-11-20", date_end="2025-12-02")
+    assert result["periods"] == [f"2025-11-{day}" for day in range(20, 31)] + ["2025-12-01", "2025-12-02"]
+    assert result["date_end"] == "2025-12-03 00:00:00"
+
+    (entry,) = result["series"]
+    assert entry["key"] is None
+    assert len(entry["revenue"]) == len(entry["order_count"]) == len(result["periods"])
+    assert observed(entry, result["periods"]) == expected(
+        orders, "2025-11-20", "2025-12-03", lambda when: when[:10],
+    )
+    # No orders on the 25th
+    assert entry["order_count"][5] == 0 and entry["revenue"][5] == 0
+
+
+def test_hours_weeks_and_months(client, orders):
+    hours = series(client, date_start="2025-11-30", date_end="2025-11-30", granularity="hour")
+    assert len(hours["periods"]) == 24
+    assert observed(hours["series"][0], hours["periods"]) == expected(
+        orders, "2025-11-30", "2025-12-01", lambda when: when[:13] + ":00",
+    )
+
+    weeks = series(client, date_start="2025-11-20", date_end="2025-12-02", granularity="week")
+    assert weeks["periods"] == ["2025-11-17", "2025-11-24", "2025-12-01"]
+    assert [datetime.strptime(p, "%Y-%m-%d").weekday() for p in weeks["periods"]] == [0, 0, 0]
+
+    months = series(client, date_start="2024-01-01", date_end="2025-12-31", granularity="month")
+    assert len(months["periods"]) == 24
+    assert observed(months["series"][0], months["periods"]) == expected(
+        orders, "2024-01-01", "2026-01-01", lambda when: when[:7],
+    )
+
+
+def test_group_by_store_adds_up_to_the_total(client, orders):
+    params = {"date_start": "2025-11-01", "date_end": "2025-12-31", "granularity": "week"}
+    total = series(client, **params)["series"][0]
+    grouped = series(client, group_by="store", **params)
+
+    keys = [entry["key"] for entry in grouped["series"]]
+    assert keys == sorted({store for when, store, _ in orders if when >= "2025-11-01"}, key=str)
+    for field in ("revenue", "order_count"):
+        assert [round(sum(values), 2) for values in zip(*(e[field] for e in grouped["series"]))] == total[field]
+
+    # store_id gives that store's series alone
+    one = series(client, store_id=5, **params)["series"][0]
+    assert one == dict(next(e for e in grouped["series"] if e["key"] == 5), key=None)
+
+
+def test_bounds_with_times_and_offsets(client, orders):
+    # 02:00 at +02:00 is midnight UTC: the day starts there
+    result = series(client, date_start="2025-11-30T02:00:00+02:00", date_end="2025-11-30 03:06:00", granularity="hour")
+    assert result["date_start"] == "2025-11-30 00:00:00"
+    assert observed(result["series"][0], result["periods"]) == expected(
+        orders, "2025-11-30 00:00:00", "2025-11-30 03:06:00", lambda when: when[:13] + ":00",
+    )
+
+
+@pytest.mark.parametrize("params", [
+    {"date_start": "2025-11-01"},
+    {"date_start": "2025-11-01", "date_end": "11/30/2025"},
+    {"date_start": "2025-11-30", "date_end": "2025-11-01"},
+    {"date_start": "2025-11-01", "date_end": "2025-11-30", "granularity": "year"},
+    {"date_start": "2025-11-01", "date_end": "2025-11-30", "group_by": "customer"},
+    {"date_start": "2025-11-01", "date_end": "2025-11-30", "store_id": "x"},
+    {"date_start": "2020-01-01", "date_end": "2025-12-31", "granularity": "hour"},
+])
+def test_bad_requests(client, params):
+    assert client.get("/api/stats/revenue/series", query_string=params).status_code == 400
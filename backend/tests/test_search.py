@@ -0,0 +1,75 @@
+import sqlite3
+
+from app.search import ProductSearchIndex, TrigramIndex, trigrams
+
+NAMES = [
+    (1, "Birding Swallow"),
+    (2, "Bodacious Beak Toucan"),
+    (3, "Snoozling Owl"),
+    (4, "Plum Robin"),
+]
+
+
+def test_trigrams_are_padded_per_word():
+    assert trigrams("Owl") == {"  o", " ow", "owl", "wl "}
+    assert trigrams("a-b") == trigrams("a b")
+    assert trigrams("!!") == set()
+
+
+def test_misspelled_queries_rank_the_right_name_first():
+    index = TrigramIndex(NAMES)
+
+    assert index.search("bodacous tucan")[0][0] == 2
+    assert index.search("snozling")[0][0] == 3
+    assert index.search("Plum Robin") == [(4, 1.0)]
+    assert index.search("zzzz") == []
+
+
+def test_threshold_and_limit():
+    index = TrigramIndex(NAMES)
+    everything = index.search("bird", threshold=0.01, limit=None)
+
+    assert [score for _, score in everything] == sorted((score for _, score in everything), reverse=True)
+    assert index.search("bird", threshold=0.01, limit=1) == everything[:1]
+    assert all(score >= 0.5 for _, score in index.search("bird", threshold=0.5, limit=None))
+
+
+def test_index_rebuilds_when_names_change_elsewhere(db_path):
+    search_index = ProductSearchIndex(db_path, check_interval=0)
+    assert search_index.get().search("snoozling")[0][0] == 7
+    version = search_index.version
+
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("UPDATE products SET product_name = 'Dozy Owl' WHERE product_id = 7;")
+    conn.close()
+
+    assert search_index.get().search("dozy")[0][0] == 7
+    assert search_index.version == version + 1
+    # Unchanged catalog: same index
+    index = search_index.get()
+    assert search_index.get() is index
+
+
+def test_fuzzy_search_endpoint(make_app):
+    client = make_app().test_client()
+    response = client.get("/api/products/search", query_string={"q": "bodacous tucan", "store_id": 1, "mode": "fuzzy"})
+    assert response.status_code == 200
+    items = response.get_json()
+    assert items[0]["product_id"] == 2
+    assert [item["score"] for item in items] == sorted((item["score"] for item in items), reverse=True)
+    assert response.headers["X-Total-Count"] == str(len(items))
+
+    # Filters apply before ranking and paging
+    paged = client.get(
+        "/api/products/search",
+        query_string={"q": "swallo robin", "store_id": 1, "mode": "fuzzy", "limit": 1, "offset": 1},
+    )
+    everything = client.get(
+        "/api/products/search", query_string={"q": "swallo robin", "store_id": 1, "mode": "fuzzy"},
+    ).get_json()
+    assert [item["product_id"] for item in everything] == [6, 1]
+    assert paged.get_json() == everything[1:2]
+    assert paged.headers["X-Total-Count"] == str(len(everything))
+
+    assert client.get("/api/products/search?q=owl&store_id=1&mode=regex").status_code == 400
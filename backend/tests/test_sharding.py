@@ -0,0 +1,177 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+from app.db import ShardRouter, SHARD_ID_SPAN
+from conftest import BACKEND_DIR
+
+
+def split(db_path, shard_dir, backup_dir, *args):
+    subprocess.run(
+        [sys.executable, os.path.join(BACKEND_DIR, "util", "shard_db.py"),
+         "--db", db_path, "--shard-dir", shard_dir, "--backup-dir", backup_dir, *args],
+        check=True, capture_output=True, cwd=BACKEND_DIR,
+    )
+
+
+def count(conn, sql, params=()):
+    return conn.execute(sql, params).fetchone()[0]
+
+
+@pytest.fixture
+def sharded(db_path, tmp_path):
+    """(main connection to the unsplit copy, router over the split database)."""
+    original = str(tmp_path / "original.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("VACUUM INTO ?;", (original,))
+    conn.close()
+
+    split(db_path, str(tmp_path / "shards"), str(tmp_path / "backups"))
+    main = sqlite3.connect(original)
+    yield main, ShardRouter(db_path, str(tmp_path / "shards"))
+    main.close()
+
+
+def test_router_maps_stores_and_ids(tmp_path):
+    router = ShardRouter(str(tmp_path / "database.db"), str(tmp_path / "shards"), group_size=2)
+
+    assert [router.shard_for_store(s) for s in (1, 2, 3, 4, 5)] == [1, 1, 2, 2, 3]
+    assert router.shard_for_id(3 * SHARD_ID_SPAN + 17) == 3
+    # Pre-sharding ids go to shard 1
+    assert router.shard_for_id(17) == 1
+
+
+def test_split_moves_every_store_into_its_shard(sharded, db_path, tmp_path):
+    main, router = sharded
+    store_ids = [row[0] for row in main.execute("SELECT store_id FROM store ORDER BY store_id;")]
+    assert router.shards() == store_ids
+
+    for store_id in store_ids:
+        conn = router.connect(router.shard_for_store(store_id), readonly=True)
+        try:
+            assert count(conn, "SELECT COUNT(DISTINCT store_id) FROM main.store_inventory;") <= 1
+            for table in ("store_inventory", '"order"'):
+                assert count(conn, f"SELECT COUNT(*) FROM main.{table};") == count(
+                    main, f"SELECT COUNT(*) FROM {table} WHERE store_id = ?;", (store_id,)
+                )
+            assert count(conn, "SELECT COALESCE(SUM(stock), 0) FROM main.store_inventory;") == count(
+                main, "SELECT COALESCE(SUM(stock), 0) FROM store_inventory WHERE store_id = ?;", (store_id,)
+            )
+            # Renumbered into the shard's id range, items still point at their orders
+            base = router.shard_for_store(store_id) * SHARD_ID_SPAN
+            assert count(conn, 'SELECT COUNT(*) FROM main."order" WHERE order_id < ?;', (base,)) == 0
+            assert count(
+                conn,
+                'SELECT COUNT(*) FROM main.order_item AS oi '
+                'LEFT JOIN main."order" AS o ON o.order_id = oi.order_id WHERE o.order_id IS NULL;',
+            ) == 0
+        finally:
+            conn.close()
+
+    # The main file keeps the shared tables only, and a backup of the rest
+    split_main = sqlite3.connect(db_path)
+    try:
+        for table in ("store_inventory", '"order"', "order_item"):
+            assert count(split_main, f"SELECT COUNT(*) FROM {table};") == 0
+        assert count(split_main, "SELECT COUNT(*) FROM products;") == count(
+            main, "SELECT COUNT(*) FROM products;"
+        )
+    finally:
+        split_main.close()
+    assert os.listdir(tmp_path / "backups")
+
+
+def test_keep_main_leaves_rows_in_place(db_path, tmp_path):
+    split(db_path, str(tmp_path / "shards"), str(tmp_path / "backups"), "--keep-main")
+
+    conn = sqlite3.connect(db_path)
+    try:
+        assert count(conn, "SELECT COUNT(*) FROM store_inventory;") > 0
+    finally:
+        conn.close()
+    assert not os.path.exists(tmp_path / "backups")
+
+
+def test_split_stops_when_a_shard_already_holds_orders(db_path, tmp_path):
+    shard_dir, backup_dir = str(tmp_path / "shards"), str(tmp_path / "backups")
+    split(db_path, shard_dir, backup_dir, "--keep-main")
+    os.remove(ShardRouter(db_path, shard_dir).shard_path(2))
+
+    with pytest.raises(subprocess.CalledProcessError):
+        split(db_path, shard_dir, backup_dir)
+    # Main still has every store's rows and the missing shard stays empty
+    conn = sqlite3.connect(db_path)
+    try:
+        assert count(conn, "SELECT COUNT(*) FROM store_inventory WHERE store_id = 2;") > 0
+    finally:
+        conn.close()
+    conn = ShardRouter(db_path, shard_dir).connect(2, readonly=True)
+    try:
+        assert count(conn, "SELECT COUNT(*) FROM main.store_inventory;") == 0
+    finally:
+        conn.close()
+
+    # --keep-main fills only the missing shard
+    split(db_path, shard_dir, backup_dir, "--keep-main")
+    conn = ShardRouter(db_path, shard_dir).connect(2, readonly=True)
+    try:
+        assert count(conn, "SELECT COUNT(*) FROM main.store_inventory;") > 0
+    finally:
+        conn.close()
+
+
+def test_shared_database_is_read_only(sharded):
+    _, router = sharded
+    conn = router.connect(1)
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("UPDATE shared.products SET price = price;")
+    finally:
+        conn.close()
+
+
+def test_shard_writers_do_not_block_each_other(sharded):
+    _, router = sharded
+    first, second = router.connect(1), router.connect(2)
+    first.isolation_level = second.isolation_level = None
+    try:
+        first.execute("BEGIN IMMEDIATE")
+        second.execute("PRAGMA busy_timeout = 0")
+        # Would fail with "database is locked" if `shared` were writable
+        second.execute("BEGIN IMMEDIATE")
+        second.execute("COMMIT")
+        first.execute("COMMIT")
+    finally:
+        first.close()
+        second.close()
+
+
+def test_sharded_app_reads_and_writes_shards(sharded, make_app, tmp_path):
+    main, router = sharded
+    store_id, product_id, stock = main.execute(
+        "SELECT store_id, product_id, stock FROM store_inventory WHERE stock > 0 ORDER BY store_id DESC LIMIT 1;"
+    ).fetchone()
+    client = make_app(SHARDING=True).test_client()
+
+    response = client.post(
+        "/api/admin/inventory/adjust",
+        json={"store_id": store_id, "product_id": product_id, "adjustment": -1},
+    )
+    assert response.status_code == 200
+    assert response.get_json()["new_stock"] == stock - 1
+
+    conn = router.connect(router.shard_for_store(store_id), readonly=True)
+    try:
+        assert count(
+            conn,
+            "SELECT stock FROM store_inventory WHERE store_id = ? AND product_id = ?;",
+            (store_id, product_id),
+        ) == stock - 1
+    finally:
+        conn.close()
+
+    overview = client.get("/api/stats/overview").get_json()
+    assert overview["total_orders"] == count(main, "SELECT COUNT(*) FROM \"order\" WHERE status = 'complete';")
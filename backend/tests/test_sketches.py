@@ -0,0 +1,145 @@
+import random
+import sqlite3
+
+import pytest
+
+from app.sketches import (
+    rebuild_order_sketches, HyperLogLog, QuantileSketch, HLL_PRECISION, QUANTILE_ACCURACY,
+)
+
+# Three standard errors
+HLL_TOLERANCE = 3 * 1.04 / (1 << HLL_PRECISION) ** 0.5
+
+
+def hll_of(values) -> HyperLogLog:
+    sketch = HyperLogLog()
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+def quantiles_of(values) -> QuantileSketch:
+    sketch = QuantileSketch()
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+def exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+@pytest.mark.parametrize("n", [10, 1000, 20000, 200000])
+def test_hll_count_is_within_error_bound(n):
+    rng = random.Random(n)
+    ids = rng.sample(range(1, 10 ** 9), n)
+    # Duplicates must not change the estimate
+    sketch = hll_of(ids + ids[: n // 2])
+    assert abs(sketch.count() - n) <= max(1, HLL_TOLERANCE * n)
+
+
+def test_hll_union_and_round_trip():
+    a = hll_of(range(0, 30000))
+    b = hll_of(range(20000, 50000))
+    union = HyperLogLog.union([a, b])
+
+    assert union.registers == hll_of(range(0, 50000)).registers
+    assert abs(union.count() - 50000) <= HLL_TOLERANCE * 50000
+    assert HyperLogLog().merge(a).merge(b).registers == union.registers
+    assert HyperLogLog.from_bytes(union.to_bytes()).registers == union.registers
+    assert HyperLogLog.union([]).count() == 0
+
+
+@pytest.mark.parametrize("q", [0, 0.01, 0.25, 0.5, 0.9, 0.99, 1])
+def test_quantile_is_within_relative_accuracy(q):
+    rng = random.Random(49)
+    values = [round(rng.lognormvariate(3, 1.5), 2) for _ in range(20000)]
+    expected = exact_quantile(values, q)
+    assert quantiles_of(values).quantile(q) == pytest.approx(expected, rel=QUANTILE_ACCURACY)
+
+
+def test_quantile_counts_non_positive_values_as_zero():
+    sketch = quantiles_of([None, 0, -5, 10.0])
+    assert sketch.count == 4
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1) == pytest.approx(10.0, rel=QUANTILE_ACCURACY)
+    assert QuantileSketch().quantile(0.5) is None
+
+
+def test_quantile_merge_and_round_trip():
+    rng = random.Random(7)
+    first = [rng.uniform(1, 500) for _ in range(3000)]
+    second = [rng.uniform(100, 5000) for _ in range(1000)] + [0]
+    merged = quantiles_of(first).merge(quantiles_of(second))
+
+    combined = quantiles_of(first + second)
+    assert (merged.buckets, merged.zeros) == (combined.buckets, combined.zeros)
+    restored = QuantileSketch.from_bytes(merged.to_bytes())
+    assert (restored.buckets, restored.zeros) == (merged.buckets, merged.zeros)
+    for q in (0.5, 0.9, 0.99):
+        assert restored.quantile(q) == pytest.approx(exact_quantile(first + second, q), rel=QUANTILE_ACCURACY)
+
+
+def sketch_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(
+            "SELECT day, store_id, orders, customers, order_values FROM order_sketch ORDER BY day, store_id;"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def test_sketches_are_built_at_startup(make_app, db_path):
+    # The sample database has no order_sketch table yet; no request is made
+    make_app()
+    built = sketch_rows(db_path)
+    assert built
+
+    conn = sqlite3.connect(db_path)
+    try:
+        rebuild_order_sketches(conn.cursor())
+        conn.commit()
+    finally:
+        conn.close()
+    assert sketch_rows(db_path) == built
+
+
+def test_checkout_keeps_sketches_equal_to_a_rebuild(make_app, db_path):
+    client = make_app().test_client()
+    before = client.get("/api/stats/distinct-customers").get_json()
+
+    conn = sqlite3.connect(db_path)
+    try:
+        assert before["orders"] == conn.execute(
+            "SELECT COUNT(*) FROM \"order\" WHERE status = 'complete' AND store_id IS NOT NULL;"
+        ).fetchone()[0]
+        # The sample data is small enough for linear counting to be exact
+        assert before["distinct_customers"] == conn.execute(
+            "SELECT COUNT(DISTINCT customer_id) FROM \"order\" WHERE status = 'complete' AND store_id IS NOT NULL;"
+        ).fetchone()[0]
+        store_id, product_id = conn.execute(
+            "SELECT store_id, product_id FROM store_inventory WHERE stock > 0 ORDER BY store_id LIMIT 1;"
+        ).fetchone()
+    finally:
+        conn.close()
+
+    customer_id = 2
+    response = client.post(
+        "/api/cart/add_to_cart",
+        json={"customer_id": customer_id, "product_id": product_id, "quantity": 1, "store_id": store_id},
+    )
+    assert response.status_code in (200, 201), response.get_json()
+    response = client.post("/api/orders/checkout", json={"customer_id": customer_id, "store_id": store_id})
+    assert response.status_code == 200, response.get_json()
+    assert client.get("/api/stats/distinct-customers").get_json()["orders"] == before["orders"] + 1
+
+    incremental = sketch_rows(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        rebuild_order_sketches(conn.cursor())
+        conn.commit()
+    finally:
+        conn.close()
+    assert sketch_rows(db_path) == incremental
@@ -0,0 +1,67 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.sales import TopSellerCache
+
+QUERIES = [
+    {"limit": 50},
+    {"window": "all", "store_id": 1},
+    {"window": "1d", "limit": 50},
+    {"window": "7d", "store_id": 2},
+    {"window": "30d"},
+]
+
+
+@pytest.fixture
+def recent_orders(db_path):
+    """Two complete orders at store 2: 5 units of product 3 today, 2 of product 4 three days ago."""
+    now = datetime.now(timezone.utc)
+    conn = sqlite3.connect(db_path)
+    with conn:
+        for days_ago, product_id, quantity in ((0, 3, 5), (3, 4, 2)):
+            cur = conn.execute(
+                "INSERT INTO \"order\" (customer_id, order_datetime, total_price, status, store_id) "
+                "VALUES (2, ?, 10, 'complete', 2);",
+                ((now - timedelta(days=days_ago)).strftime("%Y-%m-%d %H:%M:%S"),),
+            )
+            conn.execute(
+                "INSERT INTO order_item (order_id, product_id, unit_price, quantity, is_return) "
+                "VALUES (?, ?, 2, ?, 0);",
+                (cur.lastrowid, product_id, quantity),
+            )
+    conn.close()
+
+
+def top_sellers(app):
+    client = app.test_client()
+    results = []
+    for params in QUERIES:
+        response = client.get("/api/stats/top-sellers", query_string=params)
+        assert response.status_code == 200, (params, response.get_json())
+        results.append([(p["product_id"], p["total_sold"]) for p in response.get_json()])
+    return results
+
+
+def test_sql_answers_until_the_first_refresh(make_app, monkeypatch, recent_orders):
+    monkeypatch.setattr(TopSellerCache, "start", lambda self: None)
+    app = make_app()
+    cache = app.extensions["top_seller_cache"]
+    assert cache.top("7d") is None
+
+    before = top_sellers(app)
+    assert before[2] == [(3, 5)]
+    assert before[3] == [(3, 5), (4, 2)]
+
+    cache.refresh()
+    assert cache.top("7d", 2) == [(3, 5), (4, 2)]
+    assert top_sellers(app) == before
+
+
+def test_rankings_are_built_in_the_background(make_app, recent_orders):
+    app = make_app()
+    cache = app.extensions["top_seller_cache"]
+    assert cache.ready.wait(5)
+    assert cache.top("1d") == [(3, 5)]
+    assert cache.refreshed_at is not None
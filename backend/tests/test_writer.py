@@ -0,0 +1,51 @@
+import sqlite3
+
+import pytest
+
+from app.writer import WriteCoordinator
+
+
+@pytest.fixture
+def counter_db(tmp_path):
+    path = str(tmp_path / "counter.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE counter (n INTEGER NOT NULL);")
+    conn.execute("INSERT INTO counter VALUES (0);")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def increment(cur):
+    cur.execute("UPDATE counter SET n = n + 1;")
+    return cur.execute("SELECT n FROM counter;").fetchone()[0]
+
+
+def test_failed_job_only_rolls_back_itself(counter_db):
+    writer = WriteCoordinator(counter_db)
+
+    def fail(cur):
+        increment(cur)
+        raise ValueError("nope")
+
+    assert writer.run(increment) == 1
+    with pytest.raises(ValueError):
+        writer.run(fail)
+    assert writer.run(increment) == 2
+    assert writer.stats()["failed_jobs"] == 1
+
+
+def test_failing_on_commit_does_not_stop_the_writer(counter_db):
+    calls = []
+
+    def on_commit():
+        calls.append(1)
+        raise RuntimeError("listener is broken")
+
+    writer = WriteCoordinator(counter_db, on_commit=on_commit)
+
+    # Timeouts so a dead writer thread fails the test instead of hanging it
+    assert writer.submit(increment).result(timeout=2) == 1
+    assert writer.submit(increment).result(timeout=2) == 2
+    assert writer.submit(increment).result(timeout=2) == 3
+    assert len(calls) == 3
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Take an online backup of the database while the backend keeps running.
+Run this from the backend directory:
+    python util/backup_db.py [--compress] [--keep N] [--dest DIR]
+    python util/backup_db.py --list
+
+Uses the same paged backup as POST /api/admin/backup (app/backup.py), so
+checkout and other writes are not stalled while it runs. With SHARDING=1
+the shard files are backed up alongside database.db, all from the same
+moment: writes briefly wait while the snapshots are taken, and in
+rollback-journal mode (the default without WRITE_COORDINATOR) cannot
+commit until the copy is done.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.backup import create_backup, list_backups
+from app.config import Config
+from app.db import ShardRouter
+
+
+parser = argparse.ArgumentParser(description="Online backup of database.db")
+parser.add_argument("--db", default=Config.SQLITE_PATH)
+parser.add_argument("--dest", default=Config.BACKUP_DIR)
+parser.add_argument("--keep", type=int, default=Config.BACKUP_KEEP, help="backups to keep (0 = all)")
+parser.add_argument("--compress", action="store_true", default=Config.BACKUP_COMPRESS)
+parser.add_argument("--pages", type=int, default=Config.BACKUP_PAGES, help="pages copied per step")
+parser.add_argument("--sleep", type=float, default=Config.BACKUP_SLEEP, help="seconds between steps")
+parser.add_argument("--list", action="store_true", help="list existing backups and exit")
+args = parser.parse_args()
+
+if args.list:
+    for backup in list_backups(args.dest):
+        print(f"{backup['name']}  {backup['size']:>12,} bytes  {', '.join(backup['files'])}")
+    sys.exit(0)
+
+shard_paths = []
+if Config.SHARDING:
+    router = ShardRouter(args.db, Config.SHARD_DIR, group_size=Config.SHARD_GROUP_SIZE)
+    shard_paths = [router.shard_path(shard) for shard in router.shards()]
+
+
+def report(file_name, remaining, total):
+    done = total - remaining
+    print(f"\r{file_name}: {done}/{total} pages", end="", flush=True)
+
+
+result = create_backup(
+    args.db,
+    args.dest,
+    keep=args.keep,
+    compress=args.compress,
+    shard_paths=shard_paths,
+    pages=args.pages,
+    sleep=args.sleep,
+    progress=report,
+)
+print()
+
+for f in result["files"]:
+    print(f"✅ {f['file']} ({f['size']:,} bytes, {f['method']})")
+print(f"Backup {result['name']} written to {args.dest} in {result['seconds']}s")
+if result["pruned"]:
+    print(f"Removed old backups: {', '.join(result['pruned'])}")
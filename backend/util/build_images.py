@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Pre-generate the product image variants served by
+GET /api/products/<product_id>/image (thumb/card/full, JPEG and WebP).
+Run this from the backend directory after adding or changing images:
+    python util/build_images.py [--workers N] [--force] [--prune]
+
+Needs Pillow (pip install -r requirements.txt). Sources are hashed and only images
+whose hash has no complete set of variants are encoded, in parallel
+worker processes. --prune deletes variants no source uses any more.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import PIL  # noqa: F401
+except ImportError:
+    sys.exit("build_images.py needs Pillow: pip install -r requirements.txt")
+
+from app.config import Config
+from app.images import (
+    build_variants, content_hash, variant_dir, variants_built, write_manifest,
+    SOURCE_EXTENSIONS, VARIANTS_VERSION,
+)
+
+
+parser = argparse.ArgumentParser(description="Build product image variants")
+parser.add_argument("--source", default=Config.IMAGE_SOURCE_DIR)
+parser.add_argument("--cache", default=Config.IMAGE_CACHE_DIR)
+parser.add_argument("--workers", type=int, default=os.cpu_count())
+parser.add_argument("--force", action="store_true", help="re-encode images that are already built")
+parser.add_argument("--prune", action="store_true", help="delete variants of images no longer present")
+args = parser.parse_args()
+
+manifest = {}
+for root, _, files in os.walk(args.source):
+    for name in sorted(files):
+        if name.lower().endswith(SOURCE_EXTENSIONS):
+            path = os.path.join(root, name)
+            key = os.path.relpath(path, args.source).replace(os.sep, "/")
+            manifest[key] = content_hash(path)
+
+# One job per distinct image, however many names point at it
+todo = {}
+for key, digest in manifest.items():
+    if args.force or not variants_built(args.cache, digest):
+        todo.setdefault(digest, os.path.join(args.source, key))
+
+print(f"{len(manifest)} images, {len(todo)} to build")
+
+failed = 0
+with ProcessPoolExecutor(max_workers=args.workers) as pool:
+    futures = {
+        pool.submit(build_variants, path, args.cache, digest): path
+        for digest, path in todo.items()
+    }
+    for future in as_completed(futures):
+        try:
+            future.result()
+        except Exception as e:
+            failed += 1
+            print(f"❌ {futures[future]}: {e}")
+
+# Only list images whose variants exist, so the server never points at a
+# failed build
+write_manifest(args.cache, {
+    key: digest for key, digest in manifest.items() if variants_built(args.cache, digest)
+})
+print(f"✅ built {len(todo) - failed}, failed {failed}")
+
+if args.prune:
+    keep = set(manifest.values())
+    version_dir = os.path.join(args.cache, f"v{VARIANTS_VERSION}")
+    pruned = 0
+    for digest in os.listdir(version_dir) if os.path.isdir(version_dir) else []:
+        if digest not in keep:
+            shutil.rmtree(variant_dir(args.cache, digest))
+            pruned += 1
+    print(f"🧹 pruned {pruned}")
+
+sys.exit(1 if failed else 0)
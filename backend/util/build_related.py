@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Rebuild the "frequently bought together" table (product_related) from
+completed orders. Run this from the backend directory (e.g. nightly from cron):
+    python util/build_related.py [--top-k N]
+
+Needs NumPy (pip install -r requirements.txt). With SHARDING=1 order lines are read from every shard.
+Same as POST /api/admin/recommendations/rebuild.
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import numpy  # noqa: F401
+except ImportError:
+    sys.exit("build_related.py needs NumPy: pip install -r requirements.txt")
+
+from app.config import Config
+from app.db import connect_inventory_dbs, ensure_schema, ShardRouter
+from app.recommendations import build_related, replace_related, ORDER_PRODUCTS_SQL
+
+
+parser = argparse.ArgumentParser(description="Rebuild related-product recommendations")
+parser.add_argument("--db", default=Config.SQLITE_PATH)
+parser.add_argument("--top-k", type=int, default=Config.RELATED_TOP_K)
+args = parser.parse_args()
+
+ensure_schema(args.db)
+router = None
+if Config.SHARDING:
+    router = ShardRouter(args.db, Config.SHARD_DIR, group_size=Config.SHARD_GROUP_SIZE)
+
+order_products = []
+for _, conn in connect_inventory_dbs(args.db, router):
+    try:
+        order_products.extend(conn.execute(ORDER_PRODUCTS_SQL).fetchall())
+    finally:
+        conn.close()
+
+result = build_related(order_products, args.top_k)
+
+conn = sqlite3.connect(args.db, isolation_level=None)
+try:
+    conn.execute("PRAGMA busy_timeout = 5000")
+    conn.execute("BEGIN IMMEDIATE")
+    replace_related(conn.cursor(), result)
+    conn.execute("COMMIT")
+finally:
+    conn.close()
+
+print(
+    f"✅ {len(result['rows'])} related rows from {result['orders']} orders "
+    f"({result['pairs']} product pairs) in {result['seconds']}s"
+)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Fold old inventory ledger movements into inventory_snapshot.
+Run this from the backend directory (e.g. nightly from cron):
+    python util/compact_ledger.py [--days N] [--reconcile]
+
+Movements older than N days (default LEDGER_RETENTION_DAYS) are summed
+into the per-(store, product) snapshot and deleted. With SHARDING=1 every
+shard is compacted. --reconcile also lists stock rows that no longer match
+snapshot + ledger.
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import Config
+from app.db import ensure_schema, ShardRouter
+from app.inventory import compact_ledger, reconcile
+
+
+parser = argparse.ArgumentParser(description="Compact the inventory ledger")
+parser.add_argument("--db", default=Config.SQLITE_PATH)
+parser.add_argument("--days", type=int, default=Config.LEDGER_RETENTION_DAYS)
+parser.add_argument("--reconcile", action="store_true", help="also report stock/ledger mismatches")
+args = parser.parse_args()
+
+ensure_schema(args.db)
+targets = [("main", args.db)]
+if Config.SHARDING:
+    router = ShardRouter(args.db, Config.SHARD_DIR, group_size=Config.SHARD_GROUP_SIZE)
+    targets = [(f"shard {shard}", router.shard_path(shard)) for shard in router.shards()]
+
+before = (datetime.now(timezone.utc) - timedelta(days=args.days)).strftime("%Y-%m-%d %H:%M:%S")
+print(f"Compacting movements before {before} (UTC)")
+
+for label, path in targets:
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA busy_timeout = 5000")
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        result = compact_ledger(cur, before)
+        cur.execute("COMMIT")
+        print(f"✅ {label}: folded {result['folded']} movements")
+
+        if args.reconcile:
+            for row in reconcile(cur):
+                print(
+                    f"   ⚠️  store {row['store_id']} product {row['product_id']}: "
+                    f"stock {row['stock']} != ledger {row['ledger_stock']}"
+                )
+    finally:
+        conn.close()
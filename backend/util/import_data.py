@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Bulk-load products or per-store stock from CSV / NDJSON.
+Run this from the backend directory:
+    python util/import_data.py products catalog.csv
+    python util/import_data.py inventory stock.ndjson
+    python util/import_data.py inventory - < stock.csv      (stdin, --format required)
+
+products columns:  product_id (optional), product_name, category, price, img_url
+inventory columns: store_id, product_id, stock
+
+Existing rows are updated (upsert). The file is streamed and written in
+batched transactions, so it may be much larger than memory. Same pipeline
+as POST /api/admin/import (app/importer.py).
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import Config
+from app.db import ensure_schema, ShardRouter
+from app.importer import load_reference_ids, run_import, ImportRequestError
+
+
+parser = argparse.ArgumentParser(description="Import products or inventory")
+parser.add_argument("kind", choices=["products", "inventory"])
+parser.add_argument("file", help="CSV / NDJSON file, or - for stdin")
+parser.add_argument("--format", choices=["csv", "ndjson"], help="default: from the file extension")
+parser.add_argument("--db", default=Config.SQLITE_PATH)
+parser.add_argument("--chunk-size", type=int, default=Config.IMPORT_CHUNK_SIZE)
+args = parser.parse_args()
+
+fmt = args.format
+if fmt is None:
+    ext = os.path.splitext(args.file)[1].lower()
+    fmt = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}.get(ext)
+    if fmt is None:
+        parser.error("cannot tell the format from the file name; pass --format")
+
+ensure_schema(args.db)
+router = None
+if Config.SHARDING:
+    router = ShardRouter(args.db, Config.SHARD_DIR, group_size=Config.SHARD_GROUP_SIZE)
+
+connections = {}
+
+
+def connect(shard):
+    if shard not in connections:
+        if shard is None:
+            conn = sqlite3.connect(args.db, isolation_level=None)
+            conn.execute("PRAGMA foreign_keys = ON")
+        else:
+            conn = router.connect(shard)
+            conn.isolation_level = None
+        conn.execute("PRAGMA busy_timeout = 5000")
+        connections[shard] = conn
+    return connections[shard]
+
+
+def write(fn, shard):
+    conn = connect(shard)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        fn(conn.cursor())
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def report(summary):
+    print(
+        f"\r{summary['rows']:,} rows read, {summary['imported']:,} imported, "
+        f"{summary['rejected']:,} rejected ({summary['seconds']}s)",
+        end="",
+        flush=True,
+    )
+
+
+stream = sys.stdin.buffer if args.file == "-" else open(args.file, "rb")
+try:
+    store_ids, product_ids = load_reference_ids(connect(None))
+    summary = run_import(
+        stream,
+        args.kind,
+        fmt,
+        write,
+        store_ids,
+        product_ids,
+        shard_for_store=router.shard_for_store if router else None,
+        chunk_size=args.chunk_size,
+        progress=report,
+    )
+except (ImportRequestError, sqlite3.Error) as e:
+    print(f"\n❌ Import failed: {e}")
+    sys.exit(1)
+finally:
+    stream.close()
+    for conn in connections.values():
+        conn.close()
+
+report(summary)
+print()
+for error in summary["errors"][:20]:
+    print(f"  line {error['line']}: {error['error']}")
+if summary["rejected"] > 20:
+    print(f"  ... and {summary['rejected'] - 20:,} more")
+print(f"✅ Imported {summary['imported']:,} {args.kind} rows in {summary['seconds']}s")
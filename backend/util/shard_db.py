@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Split the single database into per-store shards for SHARDING=1.
+Run this from the backend directory:
+    python util/shard_db.py [--group-size N] [--shard-dir DIR]
+
+Store_Inventory, "order", order_item and inventory ledger rows are copied into
+shards/shard_XXXX.db. order_id / order_item_id are renumbered into the
+shard's id range (see SHARD_ID_SPAN in app/db.py), so URLs containing old
+order ids stop working after the switch.
+
+Once every store's shard has its rows, the per-store tables in database.db
+are emptied so no stale copies stay behind: an online backup of the
+pre-split database.db is taken first (into BACKUP_DIR); restore it to go
+back to SHARDING=0. --keep-main skips both steps and leaves the original
+rows in place.
+
+Shards that already hold orders are never copied into again. Without
+--keep-main the script then stops before changing anything; with it,
+those shards are skipped and only the others are filled.
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.backup import create_backup
+from app.config import Config
+from app.db import ensure_schema, ShardRouter, SHARD_ID_SPAN
+
+
+parser = argparse.ArgumentParser(description="Split database.db into per-store shards")
+parser.add_argument("--db", default=Config.SQLITE_PATH)
+parser.add_argument("--shard-dir", default=Config.SHARD_DIR)
+parser.add_argument("--group-size", type=int, default=Config.SHARD_GROUP_SIZE)
+parser.add_argument("--backup-dir", default=Config.BACKUP_DIR)
+parser.add_argument("--keep-main", action="store_true",
+                    help="leave the per-store rows in database.db (no backup)")
+args = parser.parse_args()
+
+ensure_schema(args.db)
+router = ShardRouter(args.db, args.shard_dir, group_size=args.group_size)
+
+# Group stores by shard
+main = router.connect(router.shard_for_store(1), readonly=True)
+store_ids = [row[0] for row in main.execute("SELECT store_id FROM shared.store ORDER BY store_id;")]
+main.close()
+
+shards = {}
+for store_id in store_ids:
+    shards.setdefault(router.shard_for_store(store_id), []).append(store_id)
+
+# Shards that already hold orders are not copied into again. Emptying
+# main would then lose whatever of their stores' rows was never copied,
+# so that is only allowed with --keep-main.
+filled = set()
+for shard in shards:
+    conn = router.connect(shard, readonly=True)
+    if conn.execute('SELECT COUNT(*) FROM main."order";').fetchone()[0] > 0:
+        filled.add(shard)
+    conn.close()
+if filled and not args.keep_main:
+    sys.exit(
+        f"❌ shards {sorted(filled)} already hold orders; nothing was changed. "
+        "Remove them to split again, or rerun with --keep-main to fill only the other shards."
+    )
+
+for shard, shard_store_ids in sorted(shards.items()):
+    if shard in filled:
+        print(f"⏭️  shard {shard} already has orders, skipping (stores {shard_store_ids})")
+        continue
+
+    conn = router.connect(shard)
+    cur = conn.cursor()
+
+    base = shard * SHARD_ID_SPAN
+    placeholders = ",".join(["?"] * len(shard_store_ids))
+
+    cur.execute(
+        f"""
+        INSERT OR REPLACE INTO main.store_inventory (store_id, product_id, stock)
+        SELECT store_id, product_id, stock
+        FROM shared.store_inventory
+        WHERE store_id IN ({placeholders});
+        """,
+        shard_store_ids,
+    )
+    inventory_rows = cur.rowcount
+
+    cur.execute(
+        f"""
+        INSERT INTO main."order" (order_id, customer_id, order_datetime, total_price, status, store_id)
+        SELECT order_id + ?, customer_id, order_datetime, total_price, status, store_id
+        FROM shared."order"
+        WHERE store_id IN ({placeholders});
+        """,
+        [base] + shard_store_ids,
+    )
+    order_rows = cur.rowcount
+
+    cur.execute(
+        f"""
+        INSERT INTO main.order_item (order_item_id, order_id, product_id, unit_price, quantity, is_return)
+        SELECT oi.order_item_id + ?, oi.order_id + ?, oi.product_id, oi.unit_price, oi.quantity, oi.is_return
+        FROM shared.order_item AS oi
+        JOIN shared."order" AS o
+          ON oi.order_id = o.order_id
+        WHERE o.store_id IN ({placeholders});
+        """,
+        [base, base] + shard_store_ids,
+    )
+    item_rows = cur.rowcount
+
+    cur.execute(
+        f"""
+        INSERT OR REPLACE INTO main.inventory_snapshot (store_id, product_id, stock, through_movement_id)
+        SELECT store_id, product_id, stock, 0
+        FROM shared.inventory_snapshot
+        WHERE store_id IN ({placeholders});
+        """,
+        shard_store_ids,
+    )
+    cur.execute(
+        f"""
+        INSERT INTO main.inventory_movement (store_id, product_id, delta, reason, order_id, movement_datetime)
+        SELECT store_id, product_id, delta, reason, order_id + ?, movement_datetime
+        FROM shared.inventory_movement
+        WHERE store_id IN ({placeholders})
+        ORDER BY movement_id;
+        """,
+        [base] + shard_store_ids,
+    )
+
+    conn.commit()
+    conn.close()
+    print(
+        f"✅ shard {shard} (stores {shard_store_ids}): "
+        f"{inventory_rows} inventory rows, {order_rows} orders, {item_rows} order items"
+    )
+
+if not args.keep_main:
+    backup = create_backup(args.db, args.backup_dir, keep=0)
+    print(f"\n💾 pre-split backup: {os.path.join(args.backup_dir, backup['files'][0]['file'])}")
+
+    # Every table a shard holds now lives in the shards only
+    conn = router.connect(min(shards), readonly=True)
+    tables = [
+        row[0] for row in conn.execute(
+            "SELECT name FROM main.sqlite_master WHERE type = 'table' AND name != 'sqlite_sequence';"
+        )
+    ]
+    conn.close()
+
+    main = sqlite3.connect(args.db, isolation_level=None)
+    main.execute("BEGIN IMMEDIATE")
+    # Children first: order_item references "order"
+    for table in sorted(tables, key=lambda name: name != "order_item"):
+        main.execute(f'DELETE FROM "{table}";')
+    main.execute("COMMIT")
+    main.close()
+    print(f"🧹 emptied in {args.db}: {', '.join(tables)}")
+
+print(f"\nShards written to {args.shard_dir}. Start the backend with SHARDING=1 to use them.")
@@ -51,7 +51,7 @@ const HomePage = () => {
         // Use search endpoint if search query exists
         if (searchQuery.trim()) {
           const response = await fetch(
-            `${API_BASE_URL}/products/search?store_id=${selectedStore.store_id}&q=${encodeURIComponent(searchQuery)}`
+            `${API_BASE_URL}/products/search?store_id=${selectedStore.store_id}&q=${encodeURIComponent(searchQuery)}&mode=fuzzy`
           );
           
           if (!response.ok) {
@@ -60,9 +60,12 @@ const HomePage = () => {
           
           productsData = await response.json();
         } else {
-          // Regular product fetch
+          // Regular product fetch, filtered by category on the server
+          const categoryParam = selectedCategories.length
+            ? `&category=${encodeURIComponent(selectedCategories.join(','))}`
+            : '';
           const response = await fetch(
-            `${API_BASE_URL}/stores/products?store_id=${selectedStore.store_id}`
+            `${API_BASE_URL}/stores/products?store_id=${selectedStore.store_id}${categoryParam}`
           );
           
           if (!response.ok) {
@@ -72,14 +75,8 @@ const HomePage = () => {
           productsData = await response.json();
         }
         
-        // Filter by selected categories on the frontend (only if not searching)
-        const filteredProducts = searchQuery.trim() 
-          ? productsData // Show all search results regardless of category
-          : selectedCategories.length === 0
-            ? productsData
-            : productsData.filter((p: ProductWithStock) => selectedCategories.includes(p.category));
-        
-        setProducts(filteredProducts);
+        // Search results are shown regardless of category
+        setProducts(productsData);
       } catch (err: any) {
         console.error('Error fetching products:', err);
         setError(err.message || 'Failed to load products');
@@ -91,6 +88,28 @@ const HomePage = () => {
     fetchProducts();
   }, [selectedStore, selectedCategories, searchQuery]);
 
+  // Live stock updates: the stream only sends products whose stock changed
+  useEffect(() => {
+    if (!selectedStore) return;
+
+    const source = new EventSource(
+      `${API_BASE_URL}/stores/${selectedStore.store_id}/inventory/stream`
+    );
+    const applyStock = (e: MessageEvent) => {
+      const changes: { product_id: number; stock: number }[] = JSON.parse(e.data);
+      const stockById = new Map(changes.map((c) => [c.product_id, c.stock]));
+      setProducts((prev) =>
+        prev.map((p) =>
+          stockById.has(p.product_id) ? { ...p, stock: stockById.get(p.product_id)! } : p
+        )
+      );
+    };
+    source.addEventListener('stock', applyStock);
+    source.addEventListener('snapshot', applyStock);
+
+    return () => source.close();
+  }, [selectedStore]);
+
   const handleCategoryToggle = (categoryName: string) => {
     setSelectedCategories((prev) => {
       if (prev.includes(categoryName)) {
@@ -249,13 +268,19 @@ const HomePage = () => {
                       {/* Product Image */}
                       <div className="relative">
                         <img
-                          src={product.img_url}
+                          src={`${API_BASE_URL}/products/${product.product_id}/image?size=card`}
                           alt={product.product_name}
+                          loading="lazy"
                           className={`w-full h-64 object-cover ${
                             isOutOfStock ? 'opacity-40 grayscale' : ''
                           }`}
                           onError={(e) => {
-                            // Fallback if image doesn't load
+                            // Variant not built: try the original, then a placeholder
+                            if (e.currentTarget.src !== product.img_url) {
+                              e.currentTarget.src = product.img_url;
+                              return;
+                            }
+                            e.currentTarget.onerror = null;
                             e.currentTarget.src = `https://via.placeholder.com/300x300/cccccc/666666?text=${encodeURIComponent(
                               product.product_name
                             )}`;